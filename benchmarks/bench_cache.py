@@ -0,0 +1,48 @@
+"""
+Compare reopening a recording and reading a channel from the IDE file with
+reading it from a columnar cache (see `endaq.ide.cache`).
+
+Usage::
+
+    python benchmarks/bench_cache.py [IDE_FILE] [CHANNEL_ID]
+"""
+import os.path
+import sys
+import time
+
+from endaq.ide import cache, files, info
+
+DEFAULT_FILE = os.path.join(os.path.dirname(__file__), "..", "tests", "test.ide")
+
+
+def timed(func, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(filename=DEFAULT_FILE, channel_id=32):
+    channel_id = int(channel_id)
+
+    def from_ide():
+        doc = files.get_doc(filename)
+        info.to_pandas(doc.channels[channel_id])
+        doc.close()
+
+    def from_cache():
+        doc = files.get_doc(filename, parsed=False)
+        info.to_pandas(doc.channels[channel_id])
+        doc.close()
+
+    t0 = time.perf_counter()
+    cache.build_cache(filename)
+    print(f"build_cache():        {time.perf_counter() - t0:8.4f} s")
+    print(f"get_doc + to_pandas:  {timed(from_ide):8.4f} s")
+    print(f"cached reopen + read: {timed(from_cache):8.4f} s")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,50 @@
+"""
+Compare exporting a channel to CSV with `export_csv()` and with
+``to_pandas(channel).to_csv()``.
+
+Usage::
+
+    python benchmarks/bench_export.py [IDE_FILE] [CHANNEL_ID]
+"""
+import os.path
+import sys
+import tempfile
+import time
+
+from endaq.ide import export, files, info
+
+DEFAULT_FILE = os.path.join(os.path.dirname(__file__), "..", "tests", "test.ide")
+
+
+def timed(func, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(filename=DEFAULT_FILE, channel_id=32):
+    channel_id = int(channel_id)
+    outdir = tempfile.mkdtemp()
+    out = os.path.join(outdir, "export.csv")
+
+    def with_pandas(compression=None):
+        doc = files.get_doc(filename)
+        info.to_pandas(doc.channels[channel_id]).to_csv(out, compression=compression)
+        doc.close()
+
+    def with_export(compression=None):
+        doc = files.get_doc(filename, parsed=False)
+        export.export_csv(doc.channels[channel_id], out, compression=compression)
+        doc.close()
+
+    print(f"to_pandas().to_csv():        {timed(with_pandas):8.4f} s")
+    print(f"export_csv():                {timed(with_export):8.4f} s")
+    print(f"to_pandas().to_csv(), gzip:  {timed(lambda: with_pandas('gzip')):8.4f} s")
+    print(f"export_csv(), gzip:          {timed(lambda: with_export('gzip')):8.4f} s")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,48 @@
+"""
+Compare importing a recording and reading all of its channels with decoding
+it in several processes (see `get_doc()`'s `workers` argument). The
+speedup with more workers depends on the number of CPU cores; use a large
+recording with several high-rate channels.
+
+Usage::
+
+    python benchmarks/bench_get_doc.py [IDE_FILE] [WORKERS ...]
+"""
+import os
+import os.path
+import sys
+import time
+
+from endaq.ide import files, info
+
+DEFAULT_FILE = os.path.join(os.path.dirname(__file__), "..", "tests", "test.ide")
+
+
+def timed(func, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(filename=DEFAULT_FILE, *workers):
+    workers = [int(w) for w in workers] or [1, 2, 4, os.cpu_count() or 1]
+
+    def read(**kwargs):
+        doc = files.get_doc(filename, **kwargs)
+        for channel in doc.channels.values():
+            info.to_pandas(channel)
+        doc.close()
+
+    print(f"{os.path.getsize(filename) / 2**20:.1f} MiB, {os.cpu_count()} CPU(s)")
+    serial = timed(read)
+    print(f"get_doc + to_pandas:      {serial:8.4f} s")
+    for count in sorted(set(workers)):
+        t = timed(lambda: read(workers=count))
+        print(f"workers={count:<3} + to_pandas: {t:8.4f} s  ({serial / t:.2f}x)")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,64 @@
+"""
+Benchmark of `endaq.ide` import times. Each import is timed in a fresh
+interpreter, so nothing is already cached in `sys.modules`.
+
+Usage::
+
+    python benchmarks/bench_import.py [--runs N]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+STATEMENTS = [
+    "import endaq.ide",
+    "from endaq.ide import get_doc",
+    "from endaq.ide import to_pandas",
+    "from endaq.ide import *",
+]
+
+SCRIPT = """
+import time
+t0 = time.perf_counter()
+{statement}
+t1 = time.perf_counter()
+import sys
+heavy = [m for m in ('numpy', 'pandas', 'requests', 'idelib') if m in sys.modules]
+print(t1 - t0, ','.join(heavy))
+"""
+
+
+def time_import(statement, runs=10):
+    """ Time an import statement in several new interpreters.
+
+        :param statement: The import statement.
+        :param runs: The number of times to run it.
+        :return: A list of times (seconds), and the heavy dependencies that
+            were imported.
+    """
+    times = []
+    heavy = ''
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", SCRIPT.format(statement=statement)],
+                             check=True, capture_output=True, text=True).stdout.split()
+        times.append(float(out[0]))
+        heavy = out[1] if len(out) > 1 else ''
+    return times, heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10,
+                        help="Number of runs per statement (default: 10)")
+    args = parser.parse_args()
+
+    print(f"{'statement':<36} {'median':>9} {'min':>9}  imported")
+    for statement in STATEMENTS:
+        times, heavy = time_import(statement, args.runs)
+        print(f"{statement:<36} {statistics.median(times) * 1000:8.1f}ms "
+              f"{min(times) * 1000:8.1f}ms  {heavy or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,87 @@
-from .files import *
-from .info import *
+"""
+endaq.ide: High-level utility functions for importing and inspecting enDAQ
+IDE recording files.
+
+To keep `import endaq.ide` fast, the modules with heavy dependencies
+(`pandas`, `requests`, etc.) are imported the first time one of their
+functions is used.
+"""
+import importlib
+
 from .measurement import *
+from .measurement import __all__ as _measurement_all
+
+# Lazily-imported public functions and classes, and the modules that contain
+# them. Every name in a submodule's `__all__` is listed here, except:
+#   * names that would shadow a submodule (`follow.follow()`; use `Follower`
+#     or `endaq.ide.follow.follow()`);
+#   * module settings, which only take effect when set on their module
+#     (e.g., `aio.MAX_CONCURRENT`);
+#   * the contents of `aio`, `blocks`, `cli`, and `profiling` (asynchronous
+#     variants, low-level block access, the command-line interface, and
+#     generically-named profiling controls), which are used via their
+#     modules.
+_LAZY = {
+    'get_doc': 'files',
+    'extract_time': 'files',
+    'extract_windows': 'files',
+    'BlockStats': 'stats',
+    'Catalog': 'catalog',
+    'ChannelHandle': 'handles',
+    'DataCache': 'cache',
+    'Follower': 'follow',
+    'IntegrityReport': 'integrity',
+    'MultiDataset': 'concat',
+    'SharedFile': 'util',
+    'align_docs': 'align',
+    'build_cache': 'cache',
+    'build_catalog': 'catalog',
+    'check_file': 'integrity',
+    'check_files': 'integrity',
+    'close_files': 'lazy',
+    'concat_docs': 'concat',
+    'export_csv': 'export',
+    'expand_paths': 'util',
+    'find_events': 'events',
+    'get_cache': 'cache',
+    'get_calibration': 'info',
+    'get_channel_handles': 'handles',
+    'get_channel_table': 'info',
+    'get_channel_tables': 'info',
+    'get_interval': 'catalog',
+    'get_offsets': 'align',
+    'get_stats': 'stats',
+    'parse_time': 'util',
+    'parse_times': 'util',
+    'spectrogram': 'spectral',
+    'to_dask': 'lazy',
+    'to_numpy': 'info',
+    'to_pandas': 'info',
+    'to_xarray': 'lazy',
+    'validate': 'util',
+    'welch': 'spectral',
+}
+
+# Submodules that can be accessed as attributes without being explicitly
+# imported (all of them).
+_SUBMODULES = ('aio', 'align', 'blocks', 'cache', 'catalog', 'cli', 'concat',
+               'events', 'export', 'files', 'follow', 'gdrive', 'handles', 'info',
+               'integrity', 'lazy', 'measurement', 'profiling', 'spectral',
+               'stats', 'util')
+
+__all__ = list(_LAZY) + _measurement_all
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is not None:
+        value = getattr(importlib.import_module(f".{module}", __name__), name)
+        globals()[name] = value
+        return value
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
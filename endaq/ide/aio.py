@@ -0,0 +1,235 @@
+"""
+aio.py: `asyncio` versions of the data retrieval functions, for use in
+asynchronous applications (e.g., web services).
+
+HTTP(S) downloads use `aiohttp` if it is installed; otherwise, they are
+run in an executor thread. Parsing is always run in an executor, so it
+does not block the event loop.
+"""
+import asyncio
+from functools import partial
+import threading
+from urllib.parse import urlparse
+import warnings
+import weakref
+
+from .files import _discard_localfile, _get_url, _open_localfile, _read_doc, _resolve_source
+from .info import to_pandas
+from .util import SharedFile
+
+__all__ = ['get_doc_async', 'to_pandas_async', 'MAX_CONCURRENT', 'WRITE_SIZE']
+
+
+# ============================================================================
+#
+# ============================================================================
+
+""" The default maximum number of concurrent `get_doc_async()` calls (per
+    event loop). Additional calls wait until others have finished. Changes
+    take effect only for event loops that have not yet called
+    `get_doc_async()`.
+"""
+MAX_CONCURRENT = 8
+
+""" The number of downloaded bytes buffered before writing them to the
+    file (in an executor, so the event loop isn't blocked).
+"""
+WRITE_SIZE = 2**20
+
+# Default semaphores, one per event loop.
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def _get_semaphore():
+    """ Get the default concurrency-limiting semaphore for the running event
+        loop.
+    """
+    loop = asyncio.get_running_loop()
+    sem = _semaphores.get(loop)
+    if sem is None:
+        sem = _semaphores[loop] = asyncio.Semaphore(MAX_CONCURRENT)
+    return sem
+
+
+class _CancelUpdater:
+    """ A minimal `idelib` progress updater, used to stop an import running
+        in another thread when its task is cancelled.
+    """
+    paused = False
+
+    def __init__(self):
+        self.cancelled = False
+
+    def __call__(self, *args, error=None, **kwargs):
+        if error is not None:
+            raise error
+
+
+def _close_result(stream, localfile, future):
+    """ Callback to close the `Dataset` produced by an abandoned (cancelled)
+        import, and discard its stream (and downloaded local file, if any).
+    """
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+    _discard_localfile(stream, localfile)
+
+
+def _close_download(future):
+    """ Callback to close the stream produced by an abandoned (cancelled)
+        download that finished anyway.
+    """
+    if not future.cancelled() and future.exception() is None:
+        future.result()[0].close()
+
+
+async def _get_url_async(url, localfile=None, params=None, cookies=None,
+                         chunk_size=2**15, executor=None):
+    """
+    Retrieve an IDE from a (HTTP/HTTPS) URL, without blocking the event
+    loop. Arguments are the same as `files._get_url()`, plus the
+    `executor` in which to write the file.
+
+    :return: An open file stream containing the IDE data and the number of
+        bytes downloaded.
+    """
+    parsed_url = urlparse(url)
+    netloc = parsed_url.netloc.lower()
+
+    try:
+        import aiohttp
+    except ImportError:
+        aiohttp = None
+
+    if aiohttp is None or netloc.endswith('.google.com') or netloc == "google.com":
+        # The download thread can't be interrupted; it stops (and removes
+        # any partial file) at its next chunk after the event is set.
+        loop = asyncio.get_running_loop()
+        cancel = threading.Event()
+        future = loop.run_in_executor(
+            None, partial(_get_url, url, localfile=localfile, params=params,
+                          cookies=cookies, cancel=cancel))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            cancel.set()
+            future.add_done_callback(_close_download)
+            raise
+
+    loop = asyncio.get_running_loop()
+    stream, localfile = _open_localfile(url, localfile)
+
+    total = 0
+    buffer = bytearray()
+    try:
+        async with aiohttp.ClientSession(cookies=cookies) as session:
+            async with session.get(url, params=params) as response:
+                if not response.ok:
+                    raise ValueError(f"Could not retrieve data from URL {url} "
+                                     f"({response.status}: {response.reason})")
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    buffer += chunk
+                    total += len(chunk)
+                    if len(buffer) >= WRITE_SIZE:
+                        await loop.run_in_executor(executor, stream.write, bytes(buffer))
+                        buffer.clear()
+                    # Already-buffered chunks are read without suspending;
+                    # yield so a pending cancellation isn't delayed.
+                    await asyncio.sleep(0)
+        if buffer:
+            await loop.run_in_executor(executor, stream.write, bytes(buffer))
+    except BaseException:
+        # Including cancellation
+        _discard_localfile(stream, localfile)
+        raise
+
+    stream.seek(0)
+    return stream, total
+
+
+async def get_doc_async(name=None, filename=None, url=None, parsed=True,
+                        start=0, end=None, localfile=None, params=None,
+                        cookies=None, shared=False, executor=None, limit=None,
+                        **kwargs):
+    """
+    Retrieve an IDE file from either a file or URL, without blocking the
+    event loop. The asynchronous version of `get_doc()`; see it for details
+    of the arguments shared by both.
+
+    Downloads are done asynchronously (using `aiohttp`, if installed), and
+    the file is parsed in an executor. If the task is cancelled, or the
+    import fails, the download or import is stopped and the downloaded
+    data is discarded (including any `localfile`).
+
+    Example usage::
+
+        doc = await get_doc_async("https://example.com/remote_recording.ide")
+
+    :param executor: The `concurrent.futures.Executor` in which to parse
+        the file. Defaults to the event loop's default executor. Note that
+        a `Dataset` cannot be transferred between processes, so this
+        should not be a `ProcessPoolExecutor`.
+    :param limit: An `asyncio.Semaphore` limiting the number of concurrent
+        retrievals. Defaults to one shared by all calls on the event loop,
+        allowing `MAX_CONCURRENT` at once.
+    :return: The fetched IDE data.
+
+    Additionally, `get_doc_async()` will accept the keyword arguments for
+    `get_doc()`.
+    """
+    filename, url, original = _resolve_source(name, filename, url)
+    loop = asyncio.get_running_loop()
+    limit = limit or _get_semaphore()
+
+    async with limit:
+        if filename:
+            localfile = None
+            stream = await loop.run_in_executor(
+                executor, partial(SharedFile, filename) if shared else partial(open, filename, 'rb'))
+        else:
+            kwargs.setdefault('name', url)
+            stream, _total = await _get_url_async(url, localfile=localfile, params=params,
+                                                  cookies=cookies, executor=executor)
+            localfile = stream.name if localfile else None
+            if shared:
+                if localfile:
+                    stream.close()
+                    stream = await loop.run_in_executor(executor, SharedFile, localfile)
+                else:
+                    warnings.warn("get_doc_async(): shared reading requires a local file; "
+                                  "use `localfile` to save the downloaded file")
+
+        updater = kwargs.get('updater')
+        if updater is None:
+            updater = kwargs['updater'] = _CancelUpdater()
+
+        future = loop.run_in_executor(
+            executor, partial(_read_doc, stream, original, parsed=parsed,
+                              start=start, end=end, **kwargs))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The executor can't be interrupted; tell the import to stop,
+            # then clean up once it has.
+            updater.cancelled = True
+            future.add_done_callback(partial(_close_result, stream, localfile))
+            raise
+        except BaseException:
+            _discard_localfile(stream, localfile)
+            raise
+
+
+async def to_pandas_async(channel, time_mode="datetime", executor=None, **kwargs):
+    """ Read IDE data into a pandas DataFrame, without blocking the event
+        loop. The asynchronous version of `to_pandas()`; see it for details.
+
+        :param channel: a `Channel` object, as produced from `Dataset.channels`
+            or `endaq.ide.get_channels`
+        :param time_mode: how to temporally index samples (see `to_pandas()`).
+        :param executor: The `concurrent.futures.Executor` in which to read
+            the data. Defaults to the event loop's default executor.
+        :param kwargs: Other keyword arguments for `to_pandas()`, e.g.,
+            `raw` or `dtype`.
+        :return: a `pandas.DataFrame` containing the channel's data
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(to_pandas, channel, time_mode, **kwargs))
@@ -0,0 +1,296 @@
+"""
+align.py: Putting the data of several recorders, recording at the same time
+(e.g., on one test article), on one timeline.
+
+The recorders' clocks are related by their recordings' UTC start times,
+optionally refined by cross-correlating a reference channel. Only the
+requested window of each recording is decoded::
+
+    offsets = get_offsets(docs, refine=True)
+    df = align_docs(docs, start="1:00", end="1:10", rate=2000, offsets=offsets)
+"""
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+
+from .blocks import BlockIndex
+from .export import _Aligned, _sample_rate
+from .info import _time_index
+from .measurement import ACCELERATION, get_channels
+from .util import parse_time
+
+__all__ = ['align_docs', 'get_offsets']
+
+
+# ============================================================================
+#
+# ============================================================================
+
+def _indexes(docs, indexes=None):
+    """ Get a `BlockIndex` for each recording, reusing any given. """
+    if indexes is None:
+        indexes = [None] * len(docs)
+    return [index or BlockIndex(doc) for doc, index in zip(docs, indexes)]
+
+
+def _utc_offsets(docs):
+    """ Get the start time of each recording relative to the first, from
+        their UTC start times (microseconds).
+    """
+    for doc in docs:
+        if not doc.lastSession.utcStartTime:
+            raise ValueError(f"{doc.filename} has no UTC start time")
+    first = docs[0].lastSession.utcStartTime
+    return [(doc.lastSession.utcStartTime - first) * 10**6 for doc in docs]
+
+
+def _window(docs, start, end):
+    """ Parse a window's `start` and `end`, relative to the first
+        recording's start.
+    """
+    session_start = datetime.datetime.utcfromtimestamp(docs[0].lastSession.utcStartTime)
+    return parse_time(start, session_start), parse_time(end, session_start)
+
+
+def _channels(doc, measurement_type, index):
+    """ Get a recording's parent channels of a type that have data. """
+    channels = get_channels(doc, measurement_type, subchannels=False)
+    return [ch for ch in channels if len(index[ch.id])]
+
+
+def _decimate(channel, index, start, end, rate):
+    """ Read a channel's data within a window and reduce it to a single
+        signal (the magnitude of its subchannels, less the mean) at a lower
+        sample rate, by averaging the samples in each period.
+
+        :param channel: A `Channel`.
+        :param index: The recording's `BlockIndex`.
+        :param start: The start of the window, in the recording's time
+            (microseconds).
+        :param end: The end of the window.
+        :param rate: The decimated sample rate (Hz).
+        :return: An array of decimated values.
+    """
+    t, values = index.read(channel, index.find(channel.id, start, end))
+    keep = (t >= start) & (t < end)
+    t, values = t[keep], values[:, keep]
+
+    size = int((end - start) * rate / 10**6)
+    result = np.zeros(size)
+    if not len(t) or not size:
+        return result
+
+    signal = np.sqrt((values ** 2).sum(axis=0))
+    bins = np.minimum(((t - start) * rate / 10**6).astype(np.int64), size - 1)
+    counts = np.bincount(bins, minlength=size)
+    sums = np.bincount(bins, weights=signal, minlength=size)
+    filled = counts > 0
+    result[filled] = sums[filled] / counts[filled]
+
+    # Fill empty periods (e.g., a lower original sample rate) by interpolation
+    if not filled.all():
+        idx = np.arange(size)
+        result = np.interp(idx, idx[filled], result[filled])
+    return result - result.mean()
+
+
+def _lag(x, y, max_lag):
+    """ Find the delay of signal `y` relative to `x` (in samples, with
+        sub-sample precision) that maximizes their cross-correlation.
+
+        :param max_lag: The largest delay considered, in samples. Only
+            positive delays are considered.
+    """
+    n = len(x) + len(y)
+    corr = np.fft.irfft(np.conj(np.fft.rfft(x, n)) * np.fft.rfft(y, n), n)
+    lags = np.arange(min(max_lag, len(y) - 1) + 1)
+    corr = corr[lags]
+    peak = int(np.argmax(corr))
+
+    # Parabolic interpolation around the peak
+    shift = 0.0
+    if 0 < peak < len(corr) - 1:
+        a, b, c = corr[peak - 1:peak + 2]
+        if a - 2 * b + c:
+            shift = 0.5 * (a - c) / (a - 2 * b + c)
+    return lags[peak] + shift
+
+
+def get_offsets(docs, reference=ACCELERATION, refine=False, start=None, end=None,
+                max_lag=1.0, rate=200.0, indexes=None):
+    """ Get the time offsets between several recordings made at the same
+        time (e.g., by several recorders on one test article), for putting
+        their data on one timeline. The offsets are computed from the
+        recordings' UTC start times and can optionally be refined by
+        cross-correlating a reference channel, since device clocks are only
+        synchronized to the nearest second (or worse).
+
+        The cross-correlation is computed on a decimated version of the
+        reference channel, read only from the given window of each file.
+        The recordings should contain a common event (e.g., an impact) in
+        the window.
+
+        :param docs: A list of `Dataset` objects (which do not have to be
+            imported). The first is the timebase; the others' offsets are
+            relative to it.
+        :param reference: A `MeasurementType` (or measurement type 'key'
+            string) selecting the reference channel in each recording. The
+            first matching channel is used.
+        :param refine: If `True`, refine the offsets by cross-correlation.
+        :param start: The start of the window used for refinement, in any
+            of the forms accepted by `get_doc()` (relative to the first
+            recording). Defaults to the start of the first recording.
+        :param end: The end of the window used for refinement. Defaults to
+            the end of the first recording.
+        :param max_lag: The largest correction to the UTC-based offsets
+            considered when refining, in seconds.
+        :param rate: The sample rate (Hz) to which reference channels are
+            decimated for cross-correlation.
+        :param indexes: A list of existing `BlockIndex` objects for the
+            recordings, to avoid indexing them again.
+        :return: A list of offsets (microseconds): a time in recording `i`
+            plus ``offsets[i]`` is the corresponding time in the first
+            recording.
+    """
+    offsets = _utc_offsets(docs)
+    if not refine or len(docs) < 2:
+        return offsets
+
+    indexes = _indexes(docs, indexes)
+    references = []
+    for doc, index in zip(docs, indexes):
+        channels = _channels(doc, reference, index)
+        if not channels:
+            raise ValueError(f"{doc.filename} has no reference channel with data")
+        references.append(channels[0])
+
+    start, end = _window(docs, start, end)
+    entries = indexes[0][references[0].id]
+    if start is None:
+        start = entries['start'][0]
+    if end is None:
+        end = entries['end'][-1]
+
+    # Each recording's window is widened by `max_lag` to include the
+    # possible positions of the common event.
+    margin = max_lag * 10**6
+    base = _decimate(references[0], indexes[0], start, end, rate)
+    for i in range(1, len(docs)):
+        signal = _decimate(references[i], indexes[i],
+                           start - offsets[i] - margin, end - offsets[i] + margin, rate)
+        lag = _lag(base, signal, int(np.ceil(2 * max_lag * rate)))
+        offsets[i] += margin - lag / rate * 10**6
+
+    return offsets
+
+
+# ============================================================================
+#
+# ============================================================================
+
+def _device_names(docs):
+    """ Generate names for recordings' columns: their filenames, or their
+        recorders' serial numbers if the filenames aren't unique.
+    """
+    names = [os.path.basename(doc.filename or "") for doc in docs]
+    if all(names) and len(set(names)) == len(names):
+        return names
+    names = [str(doc.recorderInfo.get('RecorderSerial', "")) for doc in docs]
+    if all(names) and len(set(names)) == len(names):
+        return names
+    return [str(i) for i in range(len(docs))]
+
+
+def align_docs(docs, start=None, end=None, measurement_type=ACCELERATION, rate=None,
+               method="linear", offsets=None, refine=False, names=None,
+               time_mode="datetime", indexes=None):
+    """ Get the data of several recordings made at the same time (e.g., by
+        several recorders on one test article), resampled to one timeline.
+        Only the data in the requested window is read from each file.
+
+        The `start` and `end` times may be specified in any of the forms
+        accepted by `get_doc()`, relative to the first recording.
+
+        :param docs: A list of `Dataset` objects (which do not have to be
+            imported). The first is the timebase.
+        :param start: The start of the window. Defaults to the start of the
+            first recording (or, if it has no channels to align, the
+            earliest start of the others).
+        :param end: The end of the window. Defaults to the end of the first
+            recording (or, if it has no channels to align, the latest end
+            of the others).
+        :param measurement_type: A `MeasurementType`, a measurement type
+            'key' string, or a string of multiple keys generated by adding
+            and/or subtracting `MeasurementType` objects to filter the
+            channels.
+        :param rate: The sample rate of the result (Hz). Defaults to the
+            highest sample rate of the channels.
+        :param method: How the data is resampled: ``"linear"``
+            (interpolated) or ``"previous"`` (the most recent sample at or
+            before each time).
+        :param offsets: The recordings' time offsets, as returned by
+            `get_offsets()`. Computed if not provided.
+        :param refine: If `True` and `offsets` is not provided, refine the
+            offsets by cross-correlation (see `get_offsets()`).
+        :param names: The names used for the recordings in the result's
+            columns. Defaults to the filenames (or the recorders' serial
+            numbers, if the filenames aren't unique).
+        :param time_mode: How to temporally index samples (see
+            `to_pandas()`). Relative times are relative to the start of the
+            first recording.
+        :param indexes: A list of existing `BlockIndex` objects for the
+            recordings, to avoid indexing them again.
+        :return: A `pandas.DataFrame` with a column for each subchannel,
+            labeled with 2-level (recording name, subchannel name) column
+            names. Times outside a recording's data have no value (NaN).
+    """
+    if method not in ("previous", "linear"):
+        raise ValueError(f"method must be 'previous' or 'linear', not {method!r}")
+    if not docs:
+        raise ValueError("No recordings to align")
+
+    indexes = _indexes(docs, indexes)
+    if offsets is None:
+        offsets = get_offsets(docs, refine=refine, start=start, end=end, indexes=indexes)
+    if names is None:
+        names = _device_names(docs)
+
+    channels = [_channels(doc, measurement_type, index) for doc, index in zip(docs, indexes)]
+    if not any(channels):
+        raise ValueError("No channels with data to align")
+
+    start, end = _window(docs, start, end)
+    if start is None or end is None:
+        # The first recording's extent, or all the others' (in the first's
+        # time) if it has no channels to align
+        extents = [(index[ch.id]['start'][0] + offset, index[ch.id]['end'][-1] + offset)
+                   for index, offset, chs in zip(indexes, offsets, channels)
+                   for ch in chs if chs is channels[0] or not channels[0]]
+        if start is None:
+            start = min(first for first, _last in extents)
+        if end is None:
+            end = max(last for _first, last in extents)
+    if rate is None:
+        rate = max(_sample_rate(index[ch.id]) * 10**6
+                   for index, chs in zip(indexes, channels) for ch in chs)
+
+    t = start + np.arange(int(np.ceil((end - start) * rate / 10**6))) * (10**6 / rate)
+
+    values = []
+    columns = []
+    for name, index, offset, chs in zip(names, indexes, offsets, channels):
+        for ch in chs:
+            aligned = _Aligned(ch, index, start - offset, end - offset, method)
+            if len(t):
+                sampled = aligned.sample(t - offset)
+                sampled[:, t - offset > index[ch.id]['end'][-1]] = np.nan
+                values.append(sampled)
+            columns.extend((name, sch.name) for sch in ch.subchannels)
+
+    data = np.concatenate(values).T if values else np.empty((0, len(columns)))
+
+    t = _time_index(t, time_mode, docs[0].lastSession.utcStartTime)
+    return pd.DataFrame(data, index=pd.Series(t, name="timestamp"),
+                        columns=pd.MultiIndex.from_tuples(columns))
@@ -0,0 +1,533 @@
+"""
+blocks.py: Block-by-block access to IDE sample data. The classes and
+functions here read and decode individual `ChannelDataBlock` elements
+directly, without importing the whole file into a `Dataset`.
+"""
+from collections import defaultdict
+import os
+import threading
+
+from ebmlite import loadSchema
+import numpy as np
+from numpy.lib import recfunctions as np_recfunctions
+from idelib.parsers import ChannelDataBlock, ChannelDataBlockParser
+
+from .util import walk_elements
+
+__all__ = ['BlockIndex', 'calibrate']
+
+
+# ============================================================================
+#
+# ============================================================================
+
+""" The fields of each `ChannelDataBlock` index entry. Times are in
+    microseconds, offsets and sizes in bytes.
+"""
+BLOCK_DTYPE = np.dtype([
+    ('offset', np.int64),     # Offset of the ChannelDataBlock element
+    ('payload', np.int64),    # Offset of the ChannelDataPayload's payload
+    ('size', np.int64),       # Size of the payload
+    ('start', np.float64),    # Block start time
+    ('end', np.float64),      # Block end time
+    ('samples', np.int64),    # Number of samples in the block
+])
+
+
+class _BlockHeader:
+    """ Minimal stand-in for a `ChannelDataBlock`, just enough for
+        `ChannelDataBlockParser.fixOverflow()`.
+    """
+    maxTimestamp = ChannelDataBlock.maxTimestamp
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def getHeader(self):
+        return None, self.channel
+
+
+# ============================================================================
+# Calibration
+# ============================================================================
+
+def _parent(channel):
+    """ Get a `Channel`, given either a `Channel` or a `SubChannel`. """
+    if hasattr(channel, 'subchannels'):
+        return channel
+    return channel.parent
+
+
+def calibrate(channel, raw, reference=None, subchannels=None, out=None):
+    """ Apply a channel's calibration polynomials to raw sample data. Linear
+        and bivariate polynomials are applied directly as a vectorized
+        operation per subchannel; other transforms fall back to `idelib`.
+
+        :param channel: The `Channel` that produced the data.
+        :param raw: A structured array of raw data (i.e., a block payload
+            viewed as the `Channel`'s NumPy dtype), or a 2D array of raw
+            values with one row per subchannel.
+        :param reference: A dictionary of mean values for bivariate
+            polynomials' secondary subchannels, keyed by (channel ID,
+            subchannel ID). Required only if the channel uses bivariate
+            calibration.
+        :param subchannels: A list of subchannel IDs to calibrate. Defaults
+            to all subchannels.
+        :param out: An optional output array, shaped (subchannels, samples).
+        :return: A 2D array of calibrated values, one row per subchannel.
+    """
+    if raw.dtype.names:
+        raw = np_recfunctions.structured_to_unstructured(raw).T
+    if subchannels is None:
+        subchannels = range(len(raw))
+    if out is None:
+        out = np.empty((len(subchannels), raw.shape[-1]), dtype=np.float64)
+
+    polys = channel.getSession()._fullXform.polys
+    for row, sch in enumerate(subchannels):
+        poly = polys[sch]
+        values = raw[sch]
+        coeffs = getattr(poly, '_fastCoeffs', None)
+        variables = getattr(poly, 'variables', None)
+
+        if poly is None or variables is None:
+            out[row] = values
+        elif coeffs and len(coeffs) == 2 and len(variables) == 1:
+            np.multiply(values, np.float64(coeffs[0]), out=out[row], casting='unsafe')
+            out[row] += coeffs[1]
+        elif coeffs and len(coeffs) == 4 and reference is not None:
+            y = reference.get((poly.channelId, poly.subchannelId), 0)
+            scale = np.float64(coeffs[0] * y + coeffs[1])
+            np.multiply(values, scale, out=out[row], casting='unsafe')
+            out[row] += coeffs[2] * y + coeffs[3]
+        else:
+            poly.inplace(values, out=out[row])
+
+    return out
+
+
+def get_reference_ids(channel):
+    """ Get the IDs of the secondary subchannels used by a `Channel`'s
+        bivariate calibration polynomials (if any).
+
+        :param channel: A `Channel` or `SubChannel`.
+        :return: A set of (channel ID, subchannel ID) tuples.
+    """
+    refs = set()
+    for poly in _parent(channel).getSession()._fullXform.polys:
+        if getattr(poly, '_noY', None) is False:
+            refs.add((poly.channelId, poly.subchannelId))
+    return refs
+
+
+""" The maximum number of blocks per channel whose data is checked against
+    the minimums and maximums written by the recorder (see
+    `BlockIndex.read_min_max()`).
+"""
+MINMAX_CHECKS = 8
+
+
+# ============================================================================
+#
+# ============================================================================
+
+class BlockIndex:
+    """ An index of the `ChannelDataBlock` elements in an IDE file, built
+        by reading only the element headers and timestamps. Data can then be
+        decoded for specific blocks, without importing the entire file.
+
+        The index can be updated as more data is written to the file; only
+        complete elements are indexed, so a partially-written final element
+        is picked up by a later update.
+    """
+
+    # EBML ID of `ChannelDataBlock` elements
+    BLOCK_ID = loadSchema('mide_ide.xml')['ChannelDataBlock'].id
+
+    def __init__(self, doc, update=True):
+        """ Constructor.
+
+            :param doc: A `Dataset`, opened (but not necessarily imported)
+                by `idelib.importer.openFile()` or `endaq.ide.get_doc()`.
+            :param update: If `True`, index the data immediately.
+        """
+        self.doc = doc
+        self.stream = doc.ebmldoc.stream
+        self.offset = doc.ebmldoc.payloadOffset  # Start of next unread element
+        self.damaged = False
+
+        # A separate parser, so its overflow-correction state isn't shared.
+        self._timing = ChannelDataBlockParser(doc)
+        self._timing.timeScalars.update(doc._parsers['ChannelDataBlock'].timeScalars)
+
+        self._entries = defaultdict(list)
+        self._arrays = {}
+        self._means = {}
+        self._minmax = defaultdict(list)  # ChannelDataMinMeanMax offsets
+        self._minmax_valid = {}
+        self._lock = threading.RLock()
+
+        if update:
+            self.update()
+
+
+    def __getitem__(self, channel_id):
+        """ Get the index entries for a channel, as a structured array (see
+            `BLOCK_DTYPE`).
+        """
+        arr = self._arrays.get(channel_id)
+        if arr is None or len(arr) != len(self._entries[channel_id]):
+            arr = np.array(self._entries[channel_id], dtype=BLOCK_DTYPE)
+            self._arrays[channel_id] = arr
+        return arr
+
+
+    @property
+    def channels(self):
+        """ The IDs of all channels with indexed data. """
+        return [k for k, v in self._entries.items() if v]
+
+
+    def _read_header(self, offset):
+        """ Read a `ChannelDataBlock`'s channel ID, timestamps, and the
+            locations of its payload and (device-written) minimum/mean/
+            maximum, without reading the payload itself.
+        """
+        self.stream.seek(offset)
+        el, _next = self.doc.ebmldoc.parseElement(self.stream)
+        ch = t0 = t1 = payload = minmeanmax = None
+        for sub in el:
+            name = sub.name
+            if name == "ChannelIDRef":
+                ch = sub.value
+            elif name in ("StartTimeCodeAbs", "StartTimeCodeAbsMod"):
+                t0 = sub.value
+            elif name in ("EndTimeCodeAbs", "EndTimeCodeAbsMod"):
+                t1 = sub.value
+            elif name == "ChannelDataPayload":
+                payload = sub
+            elif name == "ChannelDataMinMeanMax":
+                minmeanmax = sub
+        return ch, t0, t1, payload, minmeanmax
+
+
+    def update(self, limit=None):
+        """ Index any complete `ChannelDataBlock` elements added to the file
+            since the last update.
+
+            :param limit: The maximum number of blocks to index. Indexing
+                resumes where it left off in the next update.
+            :return: A dictionary of new index entries (structured arrays),
+                keyed by channel ID.
+        """
+        new = defaultdict(list)
+        count = 0
+
+        with self._lock:
+            if limit is not None and limit < 1:
+                return {}
+            for offset in self._walk():
+                header = self._read_block(offset)
+                if header is None:
+                    continue
+                entry = self._add_block(*header)
+                new[header[0]].append(entry)
+                count += 1
+                if limit is not None and count >= limit:
+                    break
+
+        return {k: np.array(v, dtype=BLOCK_DTYPE) for k, v in new.items()}
+
+
+    def _walk(self):
+        """ Generate the offsets of the complete `ChannelDataBlock` elements
+            after the last indexed one. `BlockIndex.offset` is advanced past
+            each element as it is generated. Call with the lock held.
+        """
+        length = self.stream.seek(0, os.SEEK_END)
+        for eid, offset, payload, size in walk_elements(self.stream, self.offset):
+            if payload + size > length:
+                # Incomplete element (still being written, or truncated)
+                self.damaged = True
+                return
+            self.damaged = False
+            self.offset = payload + size
+            if eid == self.BLOCK_ID:
+                yield offset
+
+
+    def _read_block(self, offset):
+        """ Read a `ChannelDataBlock`'s header, for indexing.
+
+            :return: The block's channel ID, element offset, payload offset
+                and size, raw (uncorrected) start and end timestamps, and
+                the offset of its minimum/mean/maximum (-1 if it has none);
+                `None` if the block has no usable data.
+        """
+        ch, t0, t1, data, minmeanmax = self._read_header(offset)
+        if ch not in self.doc.channels or t0 is None or data is None:
+            return None
+        if data.size < self.doc.channels[ch].parser.size:
+            return None
+        return (ch, offset, data.payloadOffset, data.size, t0, t1,
+                -1 if minmeanmax is None else minmeanmax.payloadOffset)
+
+
+    def _fix_times(self, ch, t0, t1):
+        """ Convert a block's raw timestamps to microseconds, correcting
+            them for rollover. Blocks must be processed in file order.
+
+            :return: The start and end times.
+        """
+        header = _BlockHeader(ch)
+        start = self._timing.fixOverflow(header, t0)
+        end = start if t1 is None else self._timing.fixOverflow(header, t1)
+        return start, end
+
+
+    def _add_block(self, ch, offset, payload, size, t0, t1, minmeanmax):
+        """ Add a block (from `_read_block()`) to the index, correcting its
+            timestamps for rollover. Blocks must be added in file order.
+
+            :return: The block's index entry.
+        """
+        start, end = self._fix_times(ch, t0, t1)
+        start, end = int(start), int(end)
+        entry = (offset, payload, size, start, end, size // self.doc.channels[ch].parser.size)
+        self._entries[ch].append(entry)
+        self._minmax[ch].append(minmeanmax)
+        return entry
+
+
+    def read_timing(self, offset):
+        """ Read a `ChannelDataBlock`'s channel and timing, without reading
+            its payload or adding it to the index (e.g., to check a file's
+            timing). Like indexing, this corrects the timestamps for
+            rollover, so each channel's blocks must be read in file order,
+            and not mixed with `update()`.
+
+            :param offset: The offset of the `ChannelDataBlock` element.
+            :return: The block's channel ID, its payload size (bytes), its
+                start and end times (microseconds), and whether its
+                timestamp rolled over since the channel's previous block.
+                The size is `None` if the block has no payload; the times
+                are `None` if it has no timestamp or its channel is not
+                defined.
+        """
+        ch, t0, t1, data, _minmeanmax = self._read_header(offset)
+        size = None if data is None else data.size
+        if t0 is None or ch not in self.doc.channels:
+            return ch, size, None, None, False
+
+        rollovers = self._timing.timestampOffset.get(ch, 0)
+        start, end = self._fix_times(ch, t0, t1)
+        return ch, size, start, end, self._timing.timestampOffset.get(ch, 0) != rollovers
+
+
+    def time_modulus(self, channel_id):
+        """ Get the span of a channel's timestamps, after which they roll
+            over (microseconds).
+        """
+        scalar = self._timing.timeScalars.get(channel_id, self._timing.timeScalar)
+        return ChannelDataBlock.maxTimestamp * scalar
+
+
+    def find(self, channel_id, start=None, end=None):
+        """ Get the indices of the blocks in a channel that overlap an
+            interval.
+
+            :param channel_id: The channel ID.
+            :param start: The start of the interval (microseconds).
+            :param end: The end of the interval (microseconds).
+            :return: A `slice` of the channel's index entries.
+        """
+        entries = self[channel_id]
+        first = 0 if start is None else np.searchsorted(entries['end'], start, side='left')
+        last = len(entries) if end is None else np.searchsorted(entries['start'], end, side='right')
+        return slice(int(first), int(max(first, last)))
+
+
+    def read_raw(self, channel_id, entries):
+        """ Read the raw payload data from a set of blocks.
+
+            :param channel_id: The blocks' channel ID.
+            :param entries: Index entries (e.g., a slice of the array
+                returned by `BlockIndex[channel_id]`).
+            :return: A structured array of raw values.
+        """
+        dtype = self.doc.channels[channel_id].getSession()._npType
+        buf = bytearray(int(entries['size'].sum()))
+        view = memoryview(buf)
+        pos = 0
+        blocks = zip(entries['payload'].tolist(), entries['size'].tolist())
+
+        # Positional reads (e.g., a `SharedFile`) don't need the lock.
+        pread = getattr(self.stream, 'pread', None)
+        if pread is not None:
+            for offset, size in blocks:
+                view[pos:pos + size] = pread(size, offset)
+                pos += size
+            return np.frombuffer(buf, dtype=dtype)
+
+        with self._lock:
+            for offset, size in blocks:
+                self.stream.seek(offset)
+                view[pos:pos + size] = self.stream.read(size)
+                pos += size
+        return np.frombuffer(buf, dtype=dtype)
+
+
+    def _read_at(self, offset, size):
+        """ Read bytes from the file, without disturbing other readers. """
+        pread = getattr(self.stream, 'pread', None)
+        if pread is not None:
+            return pread(size, offset)
+        with self._lock:
+            self.stream.seek(offset)
+            return self.stream.read(size)
+
+
+    def read_min_max(self, channel_id, blocks=None):
+        """ Get the raw minimum and maximum of each subchannel in a set of
+            blocks, as written by the recorder (in `ChannelDataMinMeanMax`
+            elements), without reading the blocks' data.
+
+            Not all blocks have these, and some recorders write values that
+            don't bound the data (e.g., the 8g DC accelerometer of some
+            models). The values are checked against the data of up to
+            `MINMAX_CHECKS` blocks of the channel that have them, spread
+            evenly across the file (including the first and last), and are
+            only used if they all match.
+
+            :param channel_id: The channel ID.
+            :param blocks: A `slice` of the channel's index entries (e.g.,
+                from `BlockIndex.find()`). Defaults to all blocks.
+            :return: Two 2D arrays of raw values (minimums and maximums),
+                shaped (subchannels, blocks), and a boolean array indicating
+                which blocks have (valid) values.
+        """
+        offsets = np.array(self._minmax[channel_id], dtype=np.int64)
+        if blocks is not None:
+            offsets = offsets[blocks]
+        nsub = len(self.doc.channels[channel_id].subchannels)
+        lows = np.zeros((nsub, len(offsets)))
+        highs = np.zeros((nsub, len(offsets)))
+        present = offsets >= 0
+
+        valid = self._minmax_valid.get(channel_id)
+        if valid is None and present.any():
+            have = np.flatnonzero(np.array(self._minmax[channel_id]) >= 0)
+            checks = np.unique(np.linspace(0, len(have) - 1, min(len(have), MINMAX_CHECKS))
+                               .round().astype(np.int64))
+            valid = True
+            for i in have[checks].tolist():
+                raw = self._read_minmeanmax(channel_id, self._minmax[channel_id][i])
+                data = self.read_raw(channel_id, self[channel_id][i:i + 1])
+                data = np_recfunctions.structured_to_unstructured(data).reshape(len(data), -1)
+                if not ((raw[0] <= data.min(axis=0)).all() and (raw[2] >= data.max(axis=0)).all()):
+                    valid = False
+                    break
+            self._minmax_valid[channel_id] = valid
+        if not valid:
+            return lows, highs, np.zeros(len(offsets), dtype=bool)
+
+        for i in np.flatnonzero(present).tolist():
+            raw = self._read_minmeanmax(channel_id, int(offsets[i]))
+            lows[:, i] = raw[0]
+            highs[:, i] = raw[2]
+        return lows, highs, present
+
+
+    def _read_minmeanmax(self, channel_id, offset):
+        """ Read the raw values of a `ChannelDataMinMeanMax` element.
+
+            :return: A 2D array: rows of minimums, means, and maximums, with
+                one column per subchannel.
+        """
+        dtype = self.doc.channels[channel_id].getSession()._npType
+        raw = np.frombuffer(self._read_at(offset, 3 * dtype.itemsize), dtype=dtype)
+        return np_recfunctions.structured_to_unstructured(raw).reshape(3, -1).astype(np.float64)
+
+
+    @staticmethod
+    def get_times(entries):
+        """ Generate the timestamps for each sample in a set of blocks. Like
+            `idelib`, the samples are assumed to be evenly spaced within
+            each block.
+
+            :param entries: Index entries.
+            :return: An array of times (microseconds).
+        """
+        samples = entries['samples']
+        starts = entries['start']
+        periods = entries['end'] - starts
+        multi = samples > 1
+        periods[multi] /= samples[multi] - 1
+
+        firsts = np.cumsum(samples) - samples
+        idx = np.arange(samples.sum(), dtype=np.float64)
+        idx -= np.repeat(firsts, samples)
+        idx *= np.repeat(periods, samples)
+        idx += np.repeat(starts, samples)
+        return idx
+
+
+    def get_references(self, channel):
+        """ Get the mean values of the subchannels used as the secondary
+            input to a channel's bivariate calibration polynomials (if any).
+            Means are computed from the currently indexed data. Like
+            `idelib` (whose bivariate polynomials use the mean of their
+            secondary channel by default), each reference is the mean of
+            the whole recording, not of the time near each sample.
+
+            :param channel: A `Channel` or `SubChannel`.
+            :return: A dictionary of means, keyed by (channel ID,
+                subchannel ID).
+        """
+        means = {}
+        for ref in get_reference_ids(channel):
+            chid, schid = ref
+            count = len(self._entries[chid])
+            cached = self._means.get(ref)
+            if cached is None or cached[0] != count:
+                if count:
+                    _t, values = self.read(self.doc.channels[chid][schid])
+                    cached = (count, values[0].mean())
+                else:
+                    cached = (0, 0)
+                self._means[ref] = cached
+            means[ref] = cached[1]
+        return means
+
+
+    def read(self, channel, blocks=None, raw=False):
+        """ Read and decode data from a set of a channel's blocks.
+
+            :param channel: A `Channel` or `SubChannel`.
+            :param blocks: A `slice` (e.g., from `BlockIndex.find()`) or an
+                array of index entries. Defaults to all blocks.
+            :param raw: If `True`, return the uncalibrated values.
+            :return: An array of sample times (microseconds) and a 2D array
+                of values, with one row per subchannel.
+        """
+        parent = _parent(channel)
+        entries = self[parent.id]
+        if blocks is None:
+            blocks = slice(None)
+        if isinstance(blocks, slice):
+            entries = entries[blocks]
+        else:
+            entries = blocks
+
+        subchannels = None if parent is channel else [channel.id]
+        times = self.get_times(entries)
+        data = self.read_raw(parent.id, entries)
+        data = np_recfunctions.structured_to_unstructured(data).T
+
+        if raw:
+            if subchannels:
+                data = data[subchannels]
+            return times, data
+
+        return times, calibrate(parent, data, reference=self.get_references(parent),
+                                subchannels=subchannels)
@@ -0,0 +1,340 @@
+"""
+cache.py: A compact on-disk cache of IDE channel data, for fast repeated
+analysis of the same recordings.
+
+Each channel's raw (uncalibrated) samples are stored in a NumPy ``.npy``
+file, with its block timing in another, and a small JSON file holds the
+metadata. Data is calibrated when read, using the `Dataset`'s calibration. The data is memory-mapped when read, so opening a
+cached recording is nearly instant, and reading part of a channel only
+touches the part of the file containing it.
+
+`to_pandas()` and `get_channel_table()` use the cache automatically for
+channels whose data has not been imported, so a cached recording can be
+opened with ``get_doc(filename, parsed=False)``::
+
+    build_cache("recording.ide")
+    ...
+    doc = get_doc("recording.ide", parsed=False)
+    df = to_pandas(doc.channels[8])
+"""
+import json
+import os
+from pathlib import Path
+import shutil
+import tempfile
+
+import numpy as np
+from numpy.lib import recfunctions as np_recfunctions
+
+from .blocks import BLOCK_DTYPE, BlockIndex, _parent, calibrate, get_reference_ids
+
+__all__ = ['DataCache', 'build_cache', 'get_cache']
+
+
+# ============================================================================
+#
+# ============================================================================
+
+""" The version of the cache format. Caches with a different version are
+    ignored.
+"""
+CACHE_VERSION = 1
+
+""" The suffix added to an IDE filename to produce its cache directory's
+    name.
+"""
+CACHE_SUFFIX = ".cache"
+
+""" The name of the cache's metadata file. """
+METADATA_NAME = "metadata.json"
+
+""" The maximum number of blocks to read at once while building a cache. """
+BATCH_BLOCKS = 256
+
+
+def _cache_path(filename, directory=None):
+    """ Get the name of the cache directory for an IDE file. """
+    name = os.path.basename(filename) + CACHE_SUFFIX
+    return os.path.join(directory or os.path.dirname(os.path.abspath(filename)), name)
+
+
+def _source_info(filename):
+    """ Get the size and modification time of an IDE file, used to check if
+        a cache is current.
+    """
+    stat = os.stat(filename)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def build_cache(doc, directory=None, channels=None):
+    """ Convert a recording's data into a cache, for fast access later. The
+        data is read and written one batch of blocks at a time, so memory use
+        is bounded. An existing cache for the file is replaced.
+
+        :param doc: A `Dataset` (which does not have to be imported) or the
+            name of a local IDE file.
+        :param directory: The directory in which to create the cache. The
+            cache is named after the IDE file, with the suffix ``.cache``.
+            Defaults to the IDE file's directory.
+        :param channels: A list of channel IDs to cache. Defaults to all
+            channels.
+        :return: The path of the cache directory.
+    """
+    if isinstance(doc, (str, Path)):
+        from .files import get_doc
+        doc = get_doc(doc, parsed=False)
+        try:
+            return build_cache(doc, directory, channels)
+        finally:
+            doc.close()
+
+    if not doc.filename or not os.path.isfile(doc.filename):
+        raise ValueError("Only a Dataset read from a local file can be cached")
+
+    path = _cache_path(doc.filename, directory)
+    index = BlockIndex(doc)
+    metadata = {
+        'version': CACHE_VERSION,
+        'source': _source_info(doc.filename),
+        'utc_start': doc.lastSession.utcStartTime,
+        'channels': {},
+    }
+
+    parent_dir = os.path.dirname(path)
+    tmp = tempfile.mkdtemp(prefix=os.path.basename(path) + ".", dir=parent_dir)
+    try:
+        for chid in sorted(index.channels):
+            if channels is not None and chid not in channels:
+                continue
+            channel = doc.channels[chid]
+            entries = index[chid]
+            dtype = channel.getSession()._npType
+
+            np.save(os.path.join(tmp, f"ch{chid}_blocks.npy"), entries)
+            values = np.lib.format.open_memmap(os.path.join(tmp, f"ch{chid}.npy"), mode='w+',
+                                               dtype=dtype, shape=(int(entries['samples'].sum()),))
+            pos = 0
+            for first in range(0, len(entries), BATCH_BLOCKS):
+                raw = index.read_raw(chid, entries[first:first + BATCH_BLOCKS])
+                values[pos:pos + len(raw)] = raw
+                pos += len(raw)
+            values.flush()
+            del values
+
+            references = index.get_references(channel)
+            metadata['channels'][str(chid)] = {
+                'name': channel.name,
+                'samples': pos,
+                'subchannels': [{'name': sch.name, 'units': list(sch.units)}
+                                for sch in channel.subchannels],
+                'references': [[c, s, float(v)] for (c, s), v in references.items()],
+            }
+
+        with open(os.path.join(tmp, METADATA_NAME), 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=1)
+
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.replace(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    getattr(doc, '_endaq_caches', {}).pop(path, None)
+    return path
+
+
+class DataCache:
+    """ A cache of a recording's channel data, created by `build_cache()`.
+        Channel data is memory-mapped, and only read as needed.
+    """
+
+    def __init__(self, path, metadata=None):
+        """ Constructor.
+
+            :param path: The cache directory, or `None` for a cache held in
+                memory (see `DataCache.from_arrays()`).
+            :param metadata: The cache's metadata. Read from the cache
+                directory if not provided.
+        """
+        self.path = path
+        if metadata is None:
+            with open(os.path.join(path, METADATA_NAME), 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+        self.metadata = metadata
+        if self.metadata.get('version') != CACHE_VERSION:
+            raise ValueError(f"Unsupported cache version: {self.metadata.get('version')!r}")
+        self._values = {}
+        self._blocks = {}
+
+
+    @classmethod
+    def from_arrays(cls, doc, blocks, values):
+        """ Create a cache held in memory, from already-decoded data (e.g.,
+            by `get_doc()` with `workers`).
+
+            :param doc: The recording's `Dataset`.
+            :param blocks: A dictionary of each channel's block index
+                entries (see `BlockIndex`), keyed by channel ID.
+            :param values: A dictionary of each channel's raw data, as
+                structured arrays, keyed by channel ID.
+            :return: A `DataCache`.
+        """
+        metadata = {
+            'version': CACHE_VERSION,
+            'source': None,
+            'utc_start': doc.lastSession.utcStartTime,
+            'channels': {},
+        }
+        for chid in blocks:
+            channel = doc.channels[chid]
+            metadata['channels'][str(chid)] = {
+                'name': channel.name,
+                'samples': len(values[chid]),
+                'subchannels': [{'name': sch.name, 'units': list(sch.units)}
+                                for sch in channel.subchannels],
+                'references': [],
+            }
+
+        cache = cls(None, metadata)
+        cache._blocks = {chid: np.asarray(b, dtype=BLOCK_DTYPE) for chid, b in blocks.items()}
+        cache._values = dict(values)
+
+        # Bivariate references are the means of the (cached) data, like
+        # `BlockIndex.get_references()`
+        for chid in blocks:
+            references = []
+            for c, sc in sorted(get_reference_ids(doc.channels[chid])):
+                mean = 0.0
+                if c in cache and len(cache.values(c)):
+                    mean = float(cache.read(doc.channels[c][sc])[1][0].mean())
+                references.append([c, sc, mean])
+            metadata['channels'][str(chid)]['references'] = references
+        return cache
+
+
+    def __contains__(self, channel_id):
+        return str(channel_id) in self.metadata['channels']
+
+
+    @property
+    def channels(self):
+        """ The IDs of the cached channels. """
+        return [int(chid) for chid in self.metadata['channels']]
+
+
+    def is_current(self, filename):
+        """ Check if the cache matches an IDE file (i.e., the file hasn't
+            changed since the cache was built).
+        """
+        try:
+            return self.metadata['source'] == _source_info(filename)
+        except OSError:
+            return False
+
+
+    def blocks(self, channel_id):
+        """ Get a channel's block index entries (see `BlockIndex`). """
+        blocks = self._blocks.get(channel_id)
+        if blocks is None:
+            blocks = np.load(os.path.join(self.path, f"ch{channel_id}_blocks.npy"))
+            self._blocks[channel_id] = blocks.astype(BLOCK_DTYPE, copy=False)
+        return self._blocks[channel_id]
+
+
+    def values(self, channel_id):
+        """ Get a channel's raw data, as a memory-mapped structured array. """
+        values = self._values.get(channel_id)
+        if values is None:
+            values = np.load(os.path.join(self.path, f"ch{channel_id}.npy"), mmap_mode='r')
+            self._values[channel_id] = values
+        return values
+
+
+    def times(self, channel_id):
+        """ Get the time of every sample in a channel (microseconds). """
+        return BlockIndex.get_times(self.blocks(channel_id))
+
+
+    def read(self, channel, start=None, end=None, raw=False, dtype=None):
+        """ Read a channel's data from the cache. Only the blocks that
+            overlap the interval are read.
+
+            :param channel: A `Channel` or `SubChannel`.
+            :param start: The start of the interval (microseconds). Samples
+                at or after `start` are included.
+            :param end: The end of the interval (microseconds). Samples
+                before `end` are included.
+            :param raw: If `True`, return the uncalibrated values.
+            :param dtype: The NumPy dtype of the values. Defaults to the
+                raw data's type if `raw`, otherwise `float64`.
+            :return: An array of sample times (microseconds) and a 2D array
+                of values, with one row per subchannel.
+        """
+        parent = _parent(channel)
+        blocks = self.blocks(parent.id)
+        firsts = np.cumsum(blocks['samples']) - blocks['samples']
+
+        first = 0 if start is None else int(np.searchsorted(blocks['end'], start, side='left'))
+        last = len(blocks) if end is None else int(np.searchsorted(blocks['start'], end, side='left'))
+        last = max(first, last)
+
+        times = BlockIndex.get_times(blocks[first:last])
+        i0 = int(firsts[first]) if first < len(blocks) else int(blocks['samples'].sum())
+        data = self.values(parent.id)[i0:i0 + len(times)]
+
+        if start is not None or end is not None:
+            lo = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+            hi = len(times) if end is None else int(np.searchsorted(times, end, side='left'))
+            times = times[lo:hi]
+            data = data[lo:hi]
+
+        subchannels = None if parent is channel else [channel.id]
+        if raw:
+            data = np_recfunctions.structured_to_unstructured(data).T
+            if subchannels:
+                data = data[subchannels]
+            if dtype is not None:
+                data = data.astype(dtype, copy=False)
+            return times, data
+
+        references = {(c, s): v for c, s, v in self.metadata['channels'][str(parent.id)]['references']}
+        out = None
+        if dtype is not None:
+            out = np.empty((len(subchannels or parent.subchannels), len(data)), dtype=dtype)
+        return times, calibrate(parent, data, reference=references, subchannels=subchannels,
+                                out=out)
+
+
+def get_cache(doc, directory=None):
+    """ Get the cache of a recording's data, if one exists and matches the
+        IDE file. The cache is kept with the `Dataset`, so subsequent calls
+        are fast.
+
+        :param doc: A `Dataset`.
+        :param directory: The directory containing the cache, if not the IDE
+            file's directory.
+        :return: A `DataCache`, or `None` if there is no (current) cache.
+    """
+    filename = getattr(doc, 'filename', None)
+    if not filename or not os.path.isfile(filename):
+        return None
+
+    path = _cache_path(filename, directory)
+    caches = getattr(doc, '_endaq_caches', None)
+    if caches is None:
+        caches = doc._endaq_caches = {}
+    if path in caches:
+        return caches[path]
+
+    cache = None
+    if os.path.isfile(os.path.join(path, METADATA_NAME)):
+        try:
+            cache = DataCache(path)
+            if not cache.is_current(filename):
+                cache = None
+        except (OSError, ValueError, KeyError):
+            cache = None
+
+    caches[path] = cache
+    return cache
@@ -0,0 +1,544 @@
+"""
+catalog.py: Building and querying a database of IDE recording metadata.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import glob
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+from idelib.importer import openFile
+from idelib.util import getLength
+
+from .blocks import BlockIndex
+from .info import _make_frame, format_channel_id
+from .measurement import ANY, get_channels, get_measurement_type, split_types
+from .util import validate
+
+__all__ = ['Catalog', 'build_catalog', 'get_interval']
+
+
+# ============================================================================
+#
+# ============================================================================
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    path TEXT PRIMARY KEY,
+    mtime REAL,
+    size INTEGER,
+    valid INTEGER,
+    damaged INTEGER,
+    serial TEXT,
+    product TEXT,
+    part_number TEXT,
+    firmware TEXT,
+    utc_start REAL,
+    utc_end REAL,
+    start REAL,
+    end REAL,
+    duration REAL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS channels (
+    path TEXT REFERENCES recordings(path) ON DELETE CASCADE,
+    channel INTEGER,
+    subchannel INTEGER,
+    name TEXT,
+    measurement_type TEXT,
+    units TEXT,
+    rate REAL
+);
+CREATE INDEX IF NOT EXISTS recordings_serial ON recordings(serial);
+CREATE INDEX IF NOT EXISTS recordings_utc ON recordings(utc_start, utc_end);
+CREATE INDEX IF NOT EXISTS channels_path ON channels(path);
+CREATE INDEX IF NOT EXISTS channels_type ON channels(measurement_type, rate);
+"""
+
+RECORDING_FIELDS = ('path', 'mtime', 'size', 'valid', 'damaged', 'serial',
+                    'product', 'part_number', 'firmware', 'utc_start',
+                    'utc_end', 'start', 'end', 'duration', 'error')
+
+CHANNEL_FIELDS = ('path', 'channel', 'subchannel', 'name',
+                  'measurement_type', 'units', 'rate')
+
+
+def _estimate_rates(doc, blocks=3, limit=500):
+    """ Estimate each channel's sample rate from its first few data blocks.
+        Only block headers are read.
+
+        :param doc: An opened (but not imported) `Dataset`.
+        :param blocks: The number of blocks to read per channel.
+        :param limit: The maximum total number of blocks to read.
+        :return: A dictionary of sample rates (Hz), keyed by channel ID.
+    """
+    index = BlockIndex(doc, update=False)
+    channels = set(doc.channels)
+    for _ in range(limit // 50):
+        if not index.update(limit=50):
+            break
+        if all(len(index[ch]) >= blocks for ch in channels):
+            break
+
+    rates = {}
+    for chid in index.channels:
+        entries = index[chid][:blocks]
+        if len(entries) > 1 and entries['start'][-1] > entries['start'][0]:
+            span = entries['start'][-1] - entries['start'][0]
+            rates[chid] = float(entries['samples'][:-1].sum() / span * 10**6)
+        elif entries['end'][0] > entries['start'][0]:
+            span = entries['end'][0] - entries['start'][0]
+            rates[chid] = float((entries['samples'][0] - 1) / span * 10**6)
+    return rates
+
+
+def _scan_file(path):
+    """ Read the metadata from an IDE file. Only the file's header and a
+        small amount of its data are read. Runs in worker processes.
+
+        :param path: The full path of the IDE file.
+        :return: A dictionary of recording information, and a list of
+            dictionaries of channel information.
+    """
+    stat = os.stat(path)
+    record = dict.fromkeys(RECORDING_FIELDS)
+    record.update(path=path, mtime=stat.st_mtime, size=stat.st_size, valid=0)
+    channels = []
+
+    try:
+        with open(path, 'rb') as fs:
+            if not validate(fs):
+                return record, channels
+
+            doc = openFile(fs)
+            info = doc.recorderInfo
+            start, end = getLength(doc)
+            if start == float('inf'):
+                start = end = None
+            utc = doc.lastSession.utcStartTime
+
+            record.update(
+                valid=1,
+                damaged=int(doc.fileDamaged),
+                serial=str(info['RecorderSerial']) if 'RecorderSerial' in info else None,
+                product=info.get('ProductName'),
+                part_number=info.get('PartNumber'),
+                firmware=info.get('FwRevStr', info.get('FwRev')),
+                utc_start=utc,
+                start=start,
+                end=end,
+                duration=(end - start) if start is not None else None,
+            )
+            if utc and end is not None:
+                record['utc_end'] = utc + end / 10**6
+
+            rates = _estimate_rates(doc)
+            for chid, ch in doc.channels.items():
+                for sch in ch.subchannels:
+                    mtype = get_measurement_type(sch)
+                    channels.append(dict(
+                        path=path,
+                        channel=chid,
+                        subchannel=sch.id,
+                        name=sch.name,
+                        measurement_type=mtype.key if mtype else None,
+                        units=sch.units[1],
+                        rate=rates.get(chid)
+                    ))
+
+    except Exception as err:
+        # Damaged or unreadable file. Record it as invalid (and why), so it
+        # will not be re-scanned unless it changes.
+        record['valid'] = 0
+        record['error'] = f"{type(err).__name__}: {err}"
+        channels = []
+
+    return record, channels
+
+
+def _epoch(t):
+    """ Convert a `datetime.datetime` (naive datetimes are assumed to be UTC)
+        to an epoch timestamp. Numbers are returned as-is.
+    """
+    if isinstance(t, datetime.datetime):
+        if t.tzinfo is None:
+            t = t.replace(tzinfo=datetime.timezone.utc)
+        return t.timestamp()
+    return t
+
+
+def _type_condition(measurement_type):
+    """ Build the SQL condition on a channel's measurement type, the same
+        way `get_channels()` filters by type.
+
+        :param measurement_type: A `MeasurementType`, a measurement type
+            'key' string, or a string of multiple keys generated by adding
+            and/or subtracting `MeasurementType` objects.
+        :return: The condition (using the ``channels`` table alias ``c``)
+            and a list of its arguments, or `None` and an empty list if all
+            types match.
+    """
+    if measurement_type == ANY:
+        return None, []
+
+    inc, exc = split_types(measurement_type)
+    conditions = []
+    args = []
+    if inc:
+        conditions.append(f"c.measurement_type IN ({', '.join('?' * len(inc))})")
+        args.extend(sorted(t.key for t in inc))
+    if exc:
+        conditions.append(f"(c.measurement_type IS NULL OR c.measurement_type "
+                          f"NOT IN ({', '.join('?' * len(exc))}))")
+        args.extend(sorted(t.key for t in exc))
+    if not conditions:
+        return None, []
+    return " AND ".join(conditions), args
+
+
+# ============================================================================
+#
+# ============================================================================
+
+class Catalog:
+    """ A database of IDE recording metadata, for quickly finding recordings
+        by device, time, and channel properties without opening every file.
+        The database is stored using SQLite.
+
+        Example usage::
+
+            catalog = Catalog("recordings.db")
+            catalog.update("/data/recordings", workers=16)
+            paths = catalog.query(serial=10913,
+                                  measurement_type=ACCELERATION,
+                                  min_rate=5000,
+                                  start=datetime(2026, 3, 1),
+                                  end=datetime(2026, 4, 1))
+    """
+
+    def __init__(self, database=":memory:"):
+        """ Constructor.
+
+            :param database: The name of the SQLite database file. It will
+                be created if it does not exist. Defaults to a temporary,
+                in-memory database.
+        """
+        self.database = database
+        self.connection = sqlite3.connect(database)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+        # Databases created by older versions lack the `error` column
+        columns = [row['name'] for row in
+                   self.connection.execute("PRAGMA table_info(recordings)")]
+        if 'error' not in columns:
+            self.connection.execute("ALTER TABLE recordings ADD COLUMN error TEXT")
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def __len__(self):
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM recordings WHERE valid = 1").fetchone()[0]
+
+
+    def close(self):
+        """ Close the database. """
+        self.connection.close()
+
+
+    def _add(self, record, channels):
+        """ Add (or replace) a recording and its channels. """
+        con = self.connection
+        con.execute("DELETE FROM recordings WHERE path = ?", (record['path'],))
+        con.execute(f"INSERT INTO recordings ({', '.join(RECORDING_FIELDS)}) "
+                    f"VALUES ({', '.join('?' * len(RECORDING_FIELDS))})",
+                    [record[k] for k in RECORDING_FIELDS])
+        con.executemany(f"INSERT INTO channels ({', '.join(CHANNEL_FIELDS)}) "
+                        f"VALUES ({', '.join('?' * len(CHANNEL_FIELDS))})",
+                        [[ch[k] for k in CHANNEL_FIELDS] for ch in channels])
+
+
+    def update(self, paths, pattern="**/*.ide", workers=None, prune=True):
+        """ Add new or modified recordings to the catalog. Files that have
+            not changed (i.e., have the same modification time and size) since
+            they were last cataloged are skipped.
+
+            :param paths: A directory, a filename, or a list of either.
+            :param pattern: A 'glob' pattern for finding IDE files in
+                directories. The default searches recursively.
+            :param workers: The number of processes to use for reading
+                files. If `None` or 1, files are read in this process.
+            :param prune: If `True`, recordings previously cataloged from
+                the given directories that no longer exist are removed.
+            :return: The number of files (re-)scanned.
+        """
+        if isinstance(paths, (str, os.PathLike)):
+            paths = [paths]
+
+        found = []
+        roots = []
+        for path in paths:
+            path = os.path.abspath(os.path.expanduser(path))
+            if os.path.isdir(path):
+                roots.append(path)
+                found.extend(glob.glob(os.path.join(path, pattern), recursive=True))
+            elif os.path.isfile(path):
+                found.append(path)
+
+        known = {row['path']: (row['mtime'], row['size']) for row in
+                 self.connection.execute("SELECT path, mtime, size FROM recordings")}
+
+        changed = []
+        for path in sorted(set(found)):
+            stat = os.stat(path)
+            if known.get(path) != (stat.st_mtime, stat.st_size):
+                changed.append(path)
+
+        with self.connection:
+            if prune:
+                existing = set(found)
+                for path in known:
+                    if path not in existing and any(path.startswith(os.path.join(r, '')) for r in roots):
+                        self.connection.execute("DELETE FROM recordings WHERE path = ?", (path,))
+
+            if workers and workers > 1 and len(changed) > 1:
+                chunksize = max(1, len(changed) // (workers * 8))
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    for record, channels in executor.map(_scan_file, changed, chunksize=chunksize):
+                        self._add(record, channels)
+            else:
+                for path in changed:
+                    self._add(*_scan_file(path))
+
+        return len(changed)
+
+
+    def get(self, path):
+        """ Get the cataloged information about a recording.
+
+            :param path: The recording's path.
+            :return: A dictionary of recording information, with its
+                channels in a list under the key ``"channels"``, or `None`
+                if the recording is not in the catalog.
+        """
+        path = os.path.abspath(os.path.expanduser(path))
+        row = self.connection.execute("SELECT * FROM recordings WHERE path = ?",
+                                      (path,)).fetchone()
+        if row is None:
+            return None
+        result = dict(row)
+        result['channels'] = [dict(ch) for ch in self.connection.execute(
+            "SELECT * FROM channels WHERE path = ? ORDER BY channel, subchannel", (path,))]
+        return result
+
+
+    def query(self, serial=None, product=None, measurement_type=None,
+              min_rate=None, max_rate=None, start=None, end=None):
+        """ Find recordings matching a set of criteria. All criteria are
+            optional; recordings must match all of those supplied. Channel
+            criteria (`measurement_type`, `min_rate`, and `max_rate`) must
+            all be met by the same channel.
+
+            :param serial: The recorder's serial number.
+            :param product: The recorder's product name (e.g., ``"S3-E25D40"``).
+                SQL ``LIKE`` wildcards (``%`` and ``_``) may be used.
+            :param measurement_type: A `MeasurementType`, a measurement type
+                'key' string (e.g., ``ACCELERATION`` or ``"acc"``), or a
+                string of multiple keys generated by adding and/or
+                subtracting `MeasurementType` objects (e.g.,
+                ``ACCELERATION+PRESSURE``).
+            :param min_rate: The minimum channel sample rate (Hz).
+            :param max_rate: The maximum channel sample rate (Hz).
+            :param start: The start of a time range, as a
+                `datetime.datetime` (assumed UTC if naive) or an epoch
+                timestamp. Recordings overlapping the range match.
+            :param end: The end of a time range (see `start`).
+            :return: A sorted list of recording paths.
+        """
+        where = ["r.valid = 1"]
+        args = []
+
+        if serial is not None:
+            where.append("r.serial = ?")
+            args.append(str(serial))
+        if product is not None:
+            where.append("r.product LIKE ?")
+            args.append(product)
+        if start is not None:
+            where.append("r.utc_end >= ?")
+            args.append(_epoch(start))
+        if end is not None:
+            where.append("r.utc_start <= ?")
+            args.append(_epoch(end))
+
+        channel_where = []
+        if measurement_type is not None:
+            condition, type_args = _type_condition(measurement_type)
+            if condition:
+                channel_where.append(condition)
+                args.extend(type_args)
+        if min_rate is not None:
+            channel_where.append("c.rate >= ?")
+            args.append(min_rate)
+        if max_rate is not None:
+            channel_where.append("c.rate <= ?")
+            args.append(max_rate)
+        if channel_where:
+            where.append("EXISTS (SELECT 1 FROM channels c WHERE c.path = r.path AND "
+                         + " AND ".join(channel_where) + ")")
+
+        sql = f"SELECT r.path FROM recordings r WHERE {' AND '.join(where)} ORDER BY r.path"
+        return [row[0] for row in self.connection.execute(sql, args)]
+
+
+def build_catalog(paths, database=":memory:", pattern="**/*.ide", workers=None):
+    """ Create (or update) a catalog of IDE recordings.
+
+        :param paths: A directory, a filename, or a list of either.
+        :param database: The name of the SQLite database file. Defaults to a
+            temporary, in-memory database.
+        :param pattern: A 'glob' pattern for finding IDE files in
+            directories. The default searches recursively.
+        :param workers: The number of processes to use for reading files.
+        :return: A `Catalog`.
+    """
+    catalog = Catalog(database)
+    catalog.update(paths, pattern=pattern, workers=workers)
+    return catalog
+
+
+# ============================================================================
+#
+# ============================================================================
+
+def _read_interval(path, start, end, measurement_type=ANY, channels=None):
+    """ Read the data within an absolute time interval from one IDE file.
+        Only the blocks overlapping the interval are decoded.
+
+        :param path: The IDE file's path.
+        :param start: The start of the interval (epoch timestamp).
+        :param end: The end of the interval (epoch timestamp).
+        :param measurement_type: The type of subchannels to read.
+        :param channels: A list of channel IDs to read.
+        :return: A list of `pandas.DataFrame` objects, one per channel
+            (empty if the file has no UTC start time).
+    """
+    frames = []
+    with open(path, 'rb') as fs:
+        doc = openFile(fs)
+        utc_start = doc.lastSession.utcStartTime
+        if not utc_start:
+            # Its data can't be placed in absolute time
+            return frames
+        t0 = (start - utc_start) * 10**6 if start is not None else None
+        t1 = (end - utc_start) * 10**6 if end is not None else None
+
+        selected = {}
+        for sch in get_channels(doc, measurement_type):
+            if channels is None or sch.parent.id in channels:
+                selected.setdefault(sch.parent.id, []).append(sch)
+        if not selected:
+            return frames
+
+        names = [sch.name for subs in selected.values() for sch in subs]
+        index = BlockIndex(doc)
+
+        for chid, subchannels in selected.items():
+            parent = doc.channels[chid]
+            blocks = index.find(parent.id, t0, t1)
+            if blocks.start == blocks.stop:
+                continue
+            t, values = index.read(parent, blocks)
+            keep = np.ones(len(t), dtype=bool)
+            if t0 is not None:
+                keep &= t >= t0
+            if t1 is not None:
+                keep &= t < t1
+            if not keep.any():
+                continue
+
+            df = _make_frame(parent, t[keep], values[:, keep].T, utc_start=utc_start)
+            df = df.iloc[:, [sch.id for sch in subchannels]]
+            df.columns = [sch.name if names.count(sch.name) == 1
+                          else f"{format_channel_id(sch)} {sch.name}"
+                          for sch in subchannels]
+            frames.append(df)
+
+    return frames
+
+
+def get_interval(source, start=None, end=None, measurement_type=ANY,
+                 channels=None, **kwargs):
+    """ Get the data within an absolute (UTC) time interval from a set of
+        IDE recordings. Only the files that overlap the interval are opened,
+        and only the data blocks within the interval are decoded. The data
+        from all the files is combined into one time-ordered
+        `pandas.DataFrame`.
+
+        Example usage::
+
+            accel = get_interval("/data/recordings",
+                                 datetime(2026, 3, 4, 10, 0),
+                                 datetime(2026, 3, 4, 10, 5),
+                                 measurement_type=ACCELERATION)
+
+        :param source: A `Catalog`, or a directory, filename, or list of
+            either (which will be scanned into a temporary `Catalog`).
+        :param start: The start of the interval, as a `datetime.datetime`
+            (assumed UTC if naive) or an epoch timestamp. Defaults to the
+            start of the earliest recording.
+        :param end: The end of the interval (see `start`). Defaults to the
+            end of the latest recording.
+        :param measurement_type: A `MeasurementType`, a measurement type
+            'key' string, or a string of multiple keys generated by adding
+            and/or subtracting `MeasurementType` objects.
+        :param channels: A list of channel IDs to read. Defaults to all
+            channels (of the specified `measurement_type`).
+        :return: A `pandas.DataFrame` with a `DatetimeIndex` of UTC times
+            (timezone-naive, like the index from `to_pandas()`). Columns
+            are named by subchannel; if channels in a recording share
+            subchannel names, the names are prefixed by the subchannel ID.
+            Columns are combined by name across recordings, and rows from
+            channels with different sample rates are interleaved, with
+            missing values as `NaN`.
+
+        Recordings without a UTC start time are skipped. Additional keyword
+        arguments are used to filter recordings (see `Catalog.query()`),
+        e.g., `serial`.
+    """
+    start = _epoch(start)
+    end = _epoch(end)
+
+    if isinstance(source, Catalog):
+        catalog = source
+    else:
+        catalog = build_catalog(source)
+
+    try:
+        paths = catalog.query(measurement_type=measurement_type, start=start, end=end,
+                              **kwargs)
+    finally:
+        if catalog is not source:
+            catalog.close()
+
+    frames = []
+    for path in paths:
+        frames.extend(_read_interval(path, start, end, measurement_type, channels))
+
+    if not frames:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name="timestamp"))
+
+    result = pd.concat(frames)
+    if len(frames) > 1:
+        result = result.sort_index(kind='stable')
+    return result
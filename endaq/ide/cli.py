@@ -0,0 +1,338 @@
+"""
+cli.py: The `endaq-ide` command-line tool, for summarizing and converting
+batches of IDE files.
+
+Example usage::
+
+    endaq-ide info "recordings/**/*.ide"
+    endaq-ide table -j 8 -t acc recordings/*.ide > channels.csv
+    endaq-ide extract --start 1:00 --end 2:00 -o clips/ recordings/*.ide
+    endaq-ide export --format parquet -j 8 -o exported/ recordings/*.ide
+    endaq-ide check -j 8 recordings/ > problems.csv
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import inspect
+import json
+import os
+import sys
+import time
+
+__all__ = ['main']
+
+
+# ============================================================================
+# Subcommand implementations. Each is run in a worker process, and returns
+# the text to write to stdout (or `None`). Imports are done in the functions,
+# so the tool's startup (and `--help`) is fast.
+# ============================================================================
+
+def _info(path, args):
+    """ Summarize one IDE file: device, start time, duration, channels. """
+    import datetime
+    from .catalog import _scan_file
+
+    record, channels = _scan_file(path)
+    if not record['valid']:
+        raise ValueError("not a valid IDE file")
+
+    start = record['utc_start']
+    if start is not None:
+        start = datetime.datetime.fromtimestamp(start, datetime.timezone.utc).isoformat()
+    duration = record['duration'] / 10**6 if record['duration'] is not None else None
+    summary = {
+        'path': path,
+        'serial': record['serial'],
+        'product': record['product'],
+        'firmware': record['firmware'],
+        'start': start,
+        'duration': duration,
+        'damaged': bool(record['damaged']),
+        'channels': len({ch['channel'] for ch in channels}),
+        'subchannels': len(channels),
+    }
+
+    if args.json:
+        summary['channels'] = [{k: v for k, v in ch.items() if k != 'path'} for ch in channels]
+        return json.dumps(summary)
+
+    return "\t".join('' if v is None else str(v) for v in summary.values())
+
+
+INFO_HEADER = "\t".join(('path', 'serial', 'product', 'firmware', 'start',
+                         'duration', 'damaged', 'channels', 'subchannels'))
+
+
+def _csv_rows(df):
+    """ Format a DataFrame's rows as CSV, without its header or index. """
+    # `line_terminator` was renamed `lineterminator` in pandas 1.5.
+    params = inspect.signature(df.to_csv).parameters
+    key = 'lineterminator' if 'lineterminator' in params else 'line_terminator'
+    return df.to_csv(index=False, header=False, **{key: '\n'}).rstrip('\n')
+
+
+def _table(path, args):
+    """ Get the channel table (see `get_channel_table()`) of one IDE file, as
+        CSV. The file's data is not imported; see `get_channel_tables()`.
+    """
+    from .info import get_channel_tables
+
+    table = get_channel_tables([path], args.measurement_type, start=args.start, end=args.end)
+    return _csv_rows(table)
+
+
+TABLE_HEADER = ",".join(('path', 'channel', 'name', 'type', 'units', 'start',
+                         'end', 'duration', 'samples', 'rate'))
+
+
+def _check(path, args):
+    """ Check the integrity of one IDE file (see `check_file()`), as CSV:
+        one line per problem found.
+    """
+    from .integrity import check_file
+
+    issues = check_file(path, gap_factor=args.gap_factor, drift=args.drift).issues
+    if not len(issues):
+        return None
+    issues.insert(0, 'path', path)
+    return _csv_rows(issues)
+
+
+CHECK_HEADER = ",".join(('path', 'kind', 'offset', 'channel', 'time', 'detail'))
+
+
+def _output_name(path, args, suffix):
+    """ Generate an output filename from an input filename. """
+    base = os.path.splitext(os.path.basename(path))[0]
+    outdir = args.output or os.path.dirname(path)
+    return os.path.join(outdir, base + suffix)
+
+
+def _extract(path, args):
+    """ Extract an interval from one IDE file into a new IDE file. """
+    from .files import extract_time
+
+    out = _output_name(path, args, args.suffix + ".ide")
+    if os.path.abspath(out) == os.path.abspath(path):
+        raise ValueError("output would overwrite input")
+    with open(out, 'wb') as f:
+        extract_time(path, f, start=args.start, end=args.end, channels=args.channels)
+    return out
+
+
+def _export(path, args):
+    """ Export each channel of one IDE file to CSV or Parquet. """
+    from .files import get_doc
+    from .info import to_pandas
+    from .measurement import get_channels
+
+    doc = get_doc(path, start=args.start, end=args.end, channels=args.channels)
+    written = []
+    try:
+        channels = get_channels(doc, args.measurement_type, subchannels=False)
+        for ch in channels:
+            if args.channels and ch.id not in args.channels:
+                continue
+            df = to_pandas(ch, time_mode=args.time_mode, dtype=args.dtype)
+            out = _output_name(path, args, f"_ch{ch.id}.{args.format}")
+            if args.format == "parquet":
+                df.columns = [str(c) for c in df.columns]
+                df.to_parquet(out)
+            else:
+                df.to_csv(out)
+            written.append(out)
+    finally:
+        doc.close()
+
+    return "\n".join(written) or None
+
+
+COMMANDS = {
+    'info': (_info, INFO_HEADER),
+    'table': (_table, TABLE_HEADER),
+    'extract': (_extract, None),
+    'export': (_export, None),
+    'check': (_check, CHECK_HEADER),
+}
+
+
+def _run(command, path, args):
+    """ Run a subcommand on one file, catching errors. Runs in a worker
+        process.
+
+        :return: The file's path, its size, the output text (or `None`),
+            and the error message (or `None`).
+    """
+    func = COMMANDS[command][0]
+    try:
+        size = os.path.getsize(path)
+        return path, size, func(path, args), None
+    except Exception as err:  # Report any failure and continue with other files
+        return path, 0, None, f"{type(err).__name__}: {err}"
+
+
+# ============================================================================
+#
+# ============================================================================
+
+def _channel_list(value):
+    """ Parse a comma-separated list of channel IDs. """
+    try:
+        return [int(c) for c in value.split(',') if c.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid channel list: {value!r}")
+
+
+def make_parser():
+    """ Build the command-line argument parser. """
+    parser = argparse.ArgumentParser(
+        prog="endaq-ide",
+        description="Summarize and convert enDAQ IDE recording files.")
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('paths', nargs='+', metavar='PATH',
+                        help="IDE files, directories, or glob patterns "
+                             "(quote patterns with '**' to search recursively)")
+    common.add_argument('-j', '--jobs', type=int, default=1,
+                        help="Number of files to process simultaneously (default: 1)")
+    common.add_argument('-q', '--quiet', action='store_true',
+                        help="Don't report progress, errors, or throughput")
+
+    interval = argparse.ArgumentParser(add_help=False)
+    interval.add_argument('-s', '--start', default=None,
+                          help="Start time (e.g., '1:23' or '83s'; default: recording start)")
+    interval.add_argument('-e', '--end', default=None,
+                          help="End time (default: recording end)")
+
+    mtype = argparse.ArgumentParser(add_help=False)
+    mtype.add_argument('-t', '--measurement-type', default="*",
+                       help="Measurement type(s), e.g., 'acc' or 'acc+pre' (default: all)")
+
+    channels = argparse.ArgumentParser(add_help=False)
+    channels.add_argument('-c', '--channels', type=_channel_list, default=None,
+                          help="Comma-separated channel IDs (default: all)")
+
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument('-o', '--output', default=None,
+                        help="Output directory (default: same as each input file)")
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('info', parents=[common],
+                              help="Summarize recordings (one line per file)")
+    p.add_argument('--json', action='store_true',
+                   help="Write JSON (one object per line), including channels")
+
+    subparsers.add_parser('table', parents=[common, interval, mtype],
+                          help="Write channel tables (see get_channel_table()) as CSV")
+
+    p = subparsers.add_parser('extract', parents=[common, interval, channels, output],
+                              help="Copy an interval of each file into a new IDE file")
+    p.add_argument('--suffix', default="_extract",
+                   help="Suffix for the output filenames (default: '_extract')")
+
+    p = subparsers.add_parser('export', parents=[common, interval, mtype, channels, output],
+                              help="Export each channel to CSV or Parquet")
+    p.add_argument('-f', '--format', choices=("csv", "parquet"), default="csv",
+                   help="Output format (default: csv)")
+    p.add_argument('--time-mode', choices=("seconds", "timedelta", "datetime"),
+                   default="datetime", help="Time index format (default: datetime)")
+    p.add_argument('--dtype', choices=("float32", "float64"), default=None,
+                   help="Data type of the exported values (default: float64)")
+
+    p = subparsers.add_parser('check', parents=[common],
+                              help="Check recordings for truncation, corruption, "
+                                   "and timing problems (one line per problem)")
+    p.add_argument('--gap-factor', type=float, default=10,
+                   help="Report gaps longer than this many sample periods (default: 10)")
+    p.add_argument('--drift', type=float, default=0.05,
+                   help="Report blocks whose sample rate differs from the median by "
+                        "more than this fraction (default: 0.05)")
+
+    return parser
+
+
+def main(argv=None, stdout=None, stderr=None):
+    """ The command-line tool's entry point.
+
+        :param argv: The command-line arguments. Defaults to `sys.argv`.
+        :param stdout: The stream for output. Defaults to `sys.stdout`.
+        :param stderr: The stream for errors and status. Defaults to
+            `sys.stderr`.
+        :return: The exit status: 0 if all files were processed, 1 if any
+            failed, 2 if no files were found.
+    """
+    from .util import expand_paths
+
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+    args = make_parser().parse_args(argv)
+
+    paths = expand_paths(args.paths)
+    if not paths:
+        print("endaq-ide: no files found", file=stderr)
+        return 2
+
+    if getattr(args, 'output', None):
+        os.makedirs(args.output, exist_ok=True)
+    if getattr(args, 'format', None) == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("endaq-ide: Parquet export requires pyarrow "
+                  "(pip install endaq-ide[parquet])", file=stderr)
+            return 2
+
+    header = COMMANDS[args.command][1]
+    if header and not getattr(args, 'json', False):
+        print(header, file=stdout, flush=True)
+
+    t0 = time.perf_counter()
+    total_bytes = 0
+    failed = 0
+
+    def report(results):
+        nonlocal total_bytes, failed
+        for path, size, output, error in results:
+            total_bytes += size
+            if error:
+                failed += 1
+                if not args.quiet:
+                    print(f"endaq-ide: {path}: {error}", file=stderr, flush=True)
+            elif output:
+                print(output, file=stdout, flush=True)
+
+    jobs = max(1, args.jobs)
+    try:
+        if jobs > 1 and len(paths) > 1:
+            executor = ProcessPoolExecutor(max_workers=min(jobs, len(paths)))
+            futures = [executor.submit(_run, args.command, path, args) for path in paths]
+            try:
+                report(f.result() for f in futures)
+            finally:
+                # Don't start the remaining files if stopped early
+                for f in futures:
+                    f.cancel()
+                executor.shutdown()
+        else:
+            report(_run(args.command, path, args) for path in paths)
+    except BrokenPipeError:
+        # Output closed early (e.g., piped to `head`). Redirect stdout so
+        # Python doesn't report another error when flushing it at exit.
+        if stdout is sys.stdout:
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+
+    elapsed = max(time.perf_counter() - t0, 1e-6)
+    if not args.quiet:
+        rate = total_bytes / elapsed / 2**20
+        print(f"endaq-ide {args.command}: {len(paths) - failed} of {len(paths)} files, "
+              f"{total_bytes / 2**20:.1f} MiB in {elapsed:.2f} s "
+              f"({rate:.1f} MiB/s, {len(paths) / elapsed:.1f} files/s)",
+              file=stderr)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
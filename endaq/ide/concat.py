@@ -0,0 +1,395 @@
+"""
+concat.py: Combining consecutive recordings (e.g., a long deployment that a
+device split into several IDE files) into one, either virtually or as a new
+IDE file. Neither way imports the recordings' data.
+"""
+from datetime import datetime
+import os
+from pathlib import Path
+import warnings
+
+import numpy as np
+from ebmlite.encoding import encodeId, encodeSize
+from idelib.importer import openFile
+from idelib.parsers import ChannelDataBlockParser
+
+from .blocks import BlockIndex, _BlockHeader, _parent
+from .files import _copy_ranges
+from .util import parse_time, walk_elements
+
+__all__ = ['MultiDataset', 'concat_docs']
+
+
+# ============================================================================
+#
+# ============================================================================
+
+""" The names of the timestamp elements within a `ChannelDataBlock`, and
+    the (non-modulo) elements that replace them in a merged file.
+"""
+TIMESTAMP_ELEMENTS = {
+    'StartTimeCodeAbs': 'StartTimeCodeAbs',
+    'StartTimeCodeAbsMod': 'StartTimeCodeAbs',
+    'EndTimeCodeAbs': 'EndTimeCodeAbs',
+    'EndTimeCodeAbsMod': 'EndTimeCodeAbs',
+}
+
+
+def _describe_channels(doc):
+    """ Get the metadata that must match for recordings to be combined: each
+        channel's sample format, timestamp scale, subchannels and
+        calibration.
+    """
+    scalars = doc._parsers['ChannelDataBlock'].timeScalars
+    result = {}
+    for chid, ch in doc.channels.items():
+        polys = ch.getSession()._fullXform.polys
+        result[chid] = {
+            'format': ch.parser.format,
+            'time scale': scalars.get(chid),
+            'subchannels': [sch.name for sch in ch.subchannels],
+            'calibration': [str(poly) for poly in polys],
+        }
+    return result
+
+
+def _check_compatible(docs):
+    """ Check that a set of recordings can be combined: they must have the
+        same channels, with the same sample formats and calibration, and
+        must not overlap in time.
+
+        :param docs: A list of `Dataset` objects, in chronological order.
+        :return: A list of their indices (`BlockIndex`).
+        :raises ValueError: If the recordings can't be combined.
+    """
+    first = _describe_channels(docs[0])
+    serial = docs[0].recorderInfo.get('RecorderSerial')
+
+    for doc in docs[1:]:
+        other = _describe_channels(doc)
+        if set(other) != set(first):
+            raise ValueError(f"{doc.filename} has different channels "
+                             f"({sorted(other)}) than {docs[0].filename} ({sorted(first)})")
+        for chid, info in other.items():
+            for key, value in info.items():
+                if value != first[chid][key]:
+                    raise ValueError(f"{doc.filename} channel {chid} has a different "
+                                     f"{key} than {docs[0].filename}")
+        if doc.recorderInfo.get('RecorderSerial') != serial:
+            warnings.warn(f"{doc.filename} was recorded by a different device "
+                          f"than {docs[0].filename}")
+
+    indexes = [BlockIndex(doc) for doc in docs]
+    previous = None
+    for doc, index in zip(docs, indexes):
+        utc = doc.lastSession.utcStartTime
+        channels = index.channels
+        if not channels:
+            continue
+        start = utc + min(index[ch]['start'][0] for ch in channels) / 10**6
+        end = utc + max(index[ch]['end'][-1] for ch in channels) / 10**6
+        if previous is not None and start < previous[1]:
+            raise ValueError(f"{doc.filename} overlaps {previous[0].filename}")
+        previous = (doc, end)
+
+    return indexes
+
+
+def _open_docs(docs):
+    """ Open a set of recordings (if not already opened), and put them in
+        chronological order.
+
+        :return: A list of `Dataset` objects, and a list of the ones that
+            were opened here (and should be closed when done).
+    """
+    opened = []
+    result = []
+    for doc in docs:
+        if isinstance(doc, (str, Path)):
+            doc = openFile(open(doc, 'rb'))
+            opened.append(doc)
+        result.append(doc)
+
+    if not result:
+        raise ValueError("No recordings to combine")
+    for doc in result:
+        if not doc.lastSession.utcStartTime:
+            for d in opened:
+                d.close()
+            raise ValueError(f"{doc.filename} has no UTC start time, so it can't be "
+                             f"ordered with other recordings")
+
+    result.sort(key=lambda d: d.lastSession.utcStartTime)
+    return result, opened
+
+
+# ============================================================================
+#
+# ============================================================================
+
+class MultiDataset:
+    """ Several consecutive recordings, treated as one. Data is read only as
+        needed, and only from the files (and blocks) overlapping the
+        requested interval. Created by `concat_docs()`.
+
+        Times are in microseconds relative to the start of the first
+        recording, as in a single `Dataset`.
+    """
+
+    def __init__(self, docs, indexes, opened=()):
+        """ Constructor. Typically not used directly; see `concat_docs()`.
+
+            :param docs: A list of `Dataset` objects, in chronological
+                order.
+            :param indexes: A `BlockIndex` for each `Dataset`.
+            :param opened: `Dataset` objects to close when the
+                `MultiDataset` is closed.
+        """
+        self.docs = docs
+        self.indexes = indexes
+        self._opened = list(opened)
+        self.utc_start = docs[0].lastSession.utcStartTime
+        self.offsets = [(doc.lastSession.utcStartTime - self.utc_start) * 10**6
+                        for doc in docs]
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def __repr__(self):
+        return f"<{type(self).__name__} ({len(self.docs)} recordings)>"
+
+
+    def close(self):
+        """ Close the files opened by `concat_docs()`. """
+        for doc in self._opened:
+            doc.close()
+        self._opened = []
+
+
+    @property
+    def channels(self):
+        """ The recordings' channels (those of the first recording). """
+        return self.docs[0].channels
+
+
+    @property
+    def start(self):
+        """ The time of the first sample in any channel (microseconds). """
+        starts = [index[ch]['start'][0] + offset
+                  for index, offset in zip(self.indexes, self.offsets)
+                  for ch in index.channels]
+        return min(starts) if starts else None
+
+
+    @property
+    def end(self):
+        """ The time of the last sample in any channel (microseconds). """
+        ends = [index[ch]['end'][-1] + offset
+                for index, offset in zip(self.indexes, self.offsets)
+                for ch in index.channels]
+        return max(ends) if ends else None
+
+
+    def _parse_time(self, t):
+        """ Parse a time (in any form accepted by `get_doc()`). """
+        return parse_time(t, datetime.utcfromtimestamp(self.utc_start))
+
+
+    def read(self, channel, start=None, end=None, raw=False):
+        """ Read a channel's data within an interval. Only the blocks that
+            overlap the interval are read.
+
+            The `start` and `end` times may be specified in any of the forms
+            accepted by `get_doc()`. Samples at or after `start` and before
+            `end` are included.
+
+            :param channel: A `Channel` or `SubChannel` (of any of the
+                recordings), or a channel ID.
+            :param start: The start of the interval. Defaults to the start of
+                the first recording.
+            :param end: The end of the interval. Defaults to the end of the
+                last recording.
+            :param raw: If `True`, return the uncalibrated values.
+            :return: An array of sample times (microseconds) and a 2D array
+                of values, with one row per subchannel.
+        """
+        if isinstance(channel, int):
+            channel = self.channels[channel]
+        parent = _parent(channel)
+        start = self._parse_time(start)
+        end = self._parse_time(end)
+
+        times = []
+        values = []
+        for doc, index, offset in zip(self.docs, self.indexes, self.offsets):
+            ch = doc.channels[parent.id]
+            if channel is not parent:
+                ch = ch[channel.id]
+            t0 = None if start is None else start - offset
+            t1 = None if end is None else end - offset
+            blocks = index.find(parent.id, t0, t1)
+            if blocks.start == blocks.stop:
+                continue
+
+            t, v = index.read(ch, blocks, raw=raw)
+            keep = np.ones(len(t), dtype=bool)
+            if t0 is not None:
+                keep &= t >= t0
+            if t1 is not None:
+                keep &= t < t1
+            times.append(t[keep] + offset)
+            values.append(v[:, keep])
+
+        if not times:
+            nrows = 1 if channel is not parent else len(parent.subchannels)
+            return np.empty(0), np.empty((nrows, 0))
+        return np.concatenate(times), np.concatenate(values, axis=1)
+
+
+    def to_pandas(self, channel, start=None, end=None, time_mode="datetime"):
+        """ Read a channel's data within an interval into a pandas
+            DataFrame, like `to_pandas()`. See `MultiDataset.read()`.
+
+            :param channel: A `Channel` or `SubChannel` (of any of the
+                recordings), or a channel ID.
+            :param start: The start of the interval. Defaults to the start of
+                the first recording.
+            :param end: The end of the interval. Defaults to the end of the
+                last recording.
+            :param time_mode: how to temporally index samples (see
+                `to_pandas()`). Relative times are relative to the start of
+                the first recording.
+            :return: a `pandas.DataFrame` containing the channel's data
+        """
+        from .info import _make_frame
+
+        if isinstance(channel, int):
+            channel = self.channels[channel]
+        t, values = self.read(channel, start, end)
+        return _make_frame(channel, t, values.T, time_mode, utc_start=self.utc_start)
+
+
+# ============================================================================
+#
+# ============================================================================
+
+def _write_shifted(doc, out, shift):
+    """ Copy a recording's `ChannelDataBlock` elements to a stream, with
+        their timestamps shifted. Other elements (the header, etc.) are not
+        copied. Only one block is read at a time.
+
+        :param doc: The `Dataset` to copy.
+        :param out: The output stream.
+        :param shift: The time to add to every block (microseconds).
+        :return: The number of bytes written and blocks copied.
+    """
+    stream = doc.ebmldoc.stream
+    schema = doc.ebmldoc.schema
+    length = stream.seek(0, os.SEEK_END)
+    timing = ChannelDataBlockParser(doc)
+    timing.timeScalars.update(doc._parsers['ChannelDataBlock'].timeScalars)
+
+    written = 0
+    blocks = 0
+    for eid, offset, payload, size in walk_elements(stream, doc.ebmldoc.payloadOffset):
+        if payload + size > length:
+            break
+        if eid != BlockIndex.BLOCK_ID:
+            continue
+
+        stream.seek(offset)
+        el, _next = doc.ebmldoc.parseElement(stream)
+        children = list(el)
+        ch = next((c.value for c in children if c.name == "ChannelIDRef"), None)
+        if ch not in doc.channels:
+            continue
+
+        # Timestamps are rewritten as absolute (non-modulo) values in the
+        # first recording's time base; everything else is copied verbatim.
+        header = _BlockHeader(ch)
+        scalar = timing.timeScalars.get(ch, timing.timeScalar)
+        parts = []
+        for child in children:
+            name = TIMESTAMP_ELEMENTS.get(child.name)
+            if name:
+                ticks = round((timing.fixOverflow(header, child.value) + shift) / scalar)
+                parts.append(schema[name].encode(ticks))
+            else:
+                stream.seek(child.offset)
+                parts.append(stream.read(child.payloadOffset + child.size - child.offset))
+
+        body = b"".join(parts)
+        data = encodeId(BlockIndex.BLOCK_ID) + encodeSize(len(body)) + body
+        out.write(data)
+        written += len(data)
+        blocks += 1
+
+    return written, blocks
+
+
+def concat_docs(docs, out=None):
+    """ Combine consecutive recordings (e.g., a long deployment split into
+        several files by the device). The recordings are put in order by
+        their UTC start times, and checked for compatibility (same channels,
+        sample formats, and calibration, and no overlap) using only their
+        metadata.
+
+        If `out` is `None`, the recordings are combined virtually, as a
+        `MultiDataset` from which intervals of data can be read. Otherwise,
+        they are merged into a single new IDE file: the first recording is
+        copied verbatim, followed by the data blocks of the others, with
+        their timestamps adjusted to the first recording's start time. One
+        block is read into memory at a time; no data is decoded.
+
+        :param docs: A list of `Dataset` objects (which do not have to be
+            imported) and/or names of IDE files.
+        :param out: A filename or stream to which to save the merged IDE,
+            or `None`.
+        :return: A `MultiDataset` if `out` is `None`, otherwise the total
+            number of bytes written and number of ChannelDataBlock elements
+            copied.
+        :raises ValueError: If the recordings can't be combined.
+    """
+    docs, opened = _open_docs(list(docs))
+    try:
+        indexes = _check_compatible(docs)
+    except BaseException:
+        for doc in opened:
+            doc.close()
+        raise
+
+    if out is None:
+        return MultiDataset(docs, indexes, opened)
+
+    try:
+        if isinstance(out, (str, Path)):
+            with open(out, 'wb') as f:
+                return _concat_to(docs, indexes, f)
+        return _concat_to(docs, indexes, out)
+    finally:
+        for doc in opened:
+            doc.close()
+
+
+def _concat_to(docs, indexes, out):
+    """ Write recordings to a stream as a single IDE. Used by
+        `concat_docs()`.
+    """
+    first = indexes[0]
+    written = _copy_ranges(first.stream, out, [(0, first.offset)])
+    blocks = sum(len(first[ch]) for ch in first.channels)
+
+    utc_start = docs[0].lastSession.utcStartTime
+    for doc in docs[1:]:
+        shift = (doc.lastSession.utcStartTime - utc_start) * 10**6
+        w, b = _write_shifted(doc, out, shift)
+        written += w
+        blocks += b
+
+    return written, blocks
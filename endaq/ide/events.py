@@ -0,0 +1,244 @@
+"""
+events.py: Finding events (e.g., shocks) in which channel data exceeds a
+threshold.
+
+The search is done in a single pass over the channel's data blocks. Blocks
+in which no sample can exceed the threshold are identified by their
+per-block statistics (computed by `endaq.ide.stats`, or written by the
+recorder) and skipped without being read; other blocks are decoded once.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from .blocks import _parent, calibrate
+from .stats import get_stats
+from .util import parse_time
+
+__all__ = ['find_events']
+
+
+# ============================================================================
+#
+# ============================================================================
+
+""" The maximum number of data blocks read and decoded at a time. """
+BATCH_BLOCKS = 64
+
+""" The columns of the table returned by `find_events()`. """
+EVENT_COLUMNS = ['start', 'end', 'duration', 'peak', 'peak_time', 'subchannel', 'samples']
+
+
+class _EventBuilder:
+    """ Combines the samples that exceed a threshold into events, one batch
+        of samples at a time.
+    """
+
+    def __init__(self, min_gap):
+        self.min_gap = min_gap
+        self.events = []
+        self.current = None
+
+
+    def add(self, idx, times, peaks, subchannels):
+        """ Add a batch of samples exceeding the threshold, in order.
+
+            :param idx: The samples' indices in the channel's data.
+            :param times: The samples' times (microseconds).
+            :param peaks: The samples' values (the largest of all
+                subchannels, for a `Channel`).
+            :param subchannels: The index of the subchannel with the peak
+                value of each sample.
+        """
+        if not len(idx):
+            return
+
+        # An event ends where the next exceedance isn't the next sample and
+        # is more than `min_gap` later.
+        breaks = (np.diff(idx) > 1) & (np.diff(times) > self.min_gap)
+        firsts = np.concatenate(([0], np.flatnonzero(breaks) + 1))
+        lasts = np.concatenate((firsts[1:] - 1, [len(idx) - 1]))
+        counts = lasts - firsts + 1
+
+        for first, last, count in zip(firsts.tolist(), lasts.tolist(), counts.tolist()):
+            peak = first + int(np.argmax(peaks[first:last + 1]))
+            event = [idx[first], idx[last], times[first], times[last],
+                     peaks[peak], times[peak], subchannels[peak], count]
+            if self.current is not None:
+                if (event[0] - self.current[1] <= 1
+                        or event[2] - self.current[3] <= self.min_gap):
+                    self._merge(event)
+                    continue
+                self.events.append(self.current)
+            self.current = event
+
+
+    def _merge(self, event):
+        """ Combine an event with the current one. """
+        current = self.current
+        current[1] = event[1]
+        current[3] = event[3]
+        if event[4] > current[4]:
+            current[4:7] = event[4:7]
+        current[7] += event[7]
+
+
+    def finish(self):
+        """ Get all the events found, as a list of lists. """
+        if self.current is not None:
+            self.events.append(self.current)
+            self.current = None
+        return self.events
+
+
+def _linear(channel):
+    """ Check if a `Channel`'s calibration is linear in its raw values,
+        so the calibrated extremes of a block are the calibrated raw
+        extremes.
+    """
+    for poly in channel.getSession()._fullXform.polys:
+        if poly is None or getattr(poly, 'variables', None) is None:
+            continue
+        coeffs = getattr(poly, '_fastCoeffs', None)
+        if not coeffs or len(coeffs) not in (2, 4):
+            return False
+        if len(coeffs) == 2 and len(poly.variables) != 1:
+            return False
+    return True
+
+
+def _block_peaks(stats, channel, rows, blocks, absolute):
+    """ Get the largest value (or magnitude) that each block in a range
+        could contain, without reading their data: from the blocks'
+        statistics, if already computed (see `BlockStats`), or from the
+        minimums and maximums written by the recorder.
+
+        :param stats: The file's `BlockStats`.
+        :param channel: The `Channel`.
+        :param rows: The indices of the subchannels to check.
+        :param blocks: A `slice` of the channel's index entries.
+        :param absolute: If `True`, get the largest magnitude.
+        :return: An array with the peak of each block, or `NaN` if unknown.
+    """
+    block_stats = stats.get(channel.id, compute=False)
+    if block_stats is not None:
+        lows = block_stats['min'][rows, blocks]
+        highs = block_stats['max'][rows, blocks]
+        present = np.ones(lows.shape[1], dtype=bool)
+    elif _linear(channel):
+        index = stats.index
+        lows, highs, present = index.read_min_max(channel.id, blocks)
+        references = index.get_references(channel)
+        lows = calibrate(channel, lows, reference=references)[rows]
+        highs = calibrate(channel, highs, reference=references)[rows]
+        # A negative calibration slope swaps minimum and maximum
+        lows, highs = np.minimum(lows, highs), np.maximum(lows, highs)
+    else:
+        return np.full(blocks.stop - blocks.start, np.nan)
+
+    peaks = np.maximum(highs, -lows) if absolute else highs
+    peaks = peaks.max(axis=0)
+    peaks[~present] = np.nan
+    return peaks
+
+
+def find_events(channel, threshold, min_gap=0, start=None, end=None,
+                absolute=True, cache=False):
+    """ Find the events in which a channel's data exceeds a threshold, e.g.,
+        shocks above some number of g. The data is searched block-by-block,
+        in a single pass; blocks that can't contain any value above the
+        threshold (according to their statistics, if already computed by
+        `endaq.ide.stats`, or the minimum and maximum written by the
+        recorder) are skipped without being read.
+
+        The `start` and `end` times, and `min_gap`, may be specified in any
+        of the forms accepted by `get_doc()`. The resulting events' start
+        and end times can be used directly with `extract_time()` to clip
+        them from the recording::
+
+            events = find_events(doc.channels[8], 50, min_gap="1s")
+            for i, event in events.iterrows():
+                extract_time(doc, f"shock_{i}.ide", event.start, event.end)
+
+        :param channel: A `Channel` or `SubChannel`. For a `Channel`, a
+            sample exceeds the threshold if any of its subchannels does.
+        :param threshold: The threshold value, in the channel's units.
+            Values greater than or equal to it are exceedances.
+        :param min_gap: The minimum time between events. Exceedances closer
+            together than this are combined into one event. By default,
+            only consecutive samples are combined.
+        :param start: The start of the interval to search. Defaults to the
+            start of the recording.
+        :param end: The end of the interval to search. Defaults to the end
+            of the recording.
+        :param absolute: If `True`, compare the magnitude (absolute value)
+            of the data to the threshold, so negative peaks are found as
+            well.
+        :param cache: If `True` (or a directory name), per-block statistics
+            previously saved in a sidecar file are used (see
+            `endaq.ide.stats.BlockStats`). `find_events()` itself never
+            computes or saves statistics.
+        :return: A `pandas.DataFrame` with one row per event, and the
+            columns ``start`` and ``end`` (the times of the first and last
+            exceedances, in microseconds), ``duration``, ``peak`` (the
+            largest value, or magnitude if `absolute`), ``peak_time``,
+            ``subchannel`` (the name of the subchannel with the peak), and
+            ``samples`` (the number of exceedances).
+    """
+    parent = _parent(channel)
+    doc = parent.dataset
+    stats = get_stats(doc, cache=cache)
+    index = stats.index
+
+    session_start = None
+    if doc.lastSession.utcStartTime:
+        session_start = datetime.datetime.utcfromtimestamp(doc.lastSession.utcStartTime)
+    start = parse_time(start, session_start)
+    end = parse_time(end, session_start)
+    min_gap = parse_time(min_gap) or 0
+
+    if parent is channel:
+        rows = list(range(len(parent.subchannels)))
+    else:
+        rows = [channel.id]
+    names = [parent.subchannels[r].name for r in rows]
+
+    # Select the blocks in the interval that could contain an exceedance
+    # (including any whose peak is unknown)
+    entries = index[parent.id]
+    firsts = np.cumsum(entries['samples']) - entries['samples']
+    blocks = index.find(parent.id, start, end)
+    peaks = _block_peaks(stats, parent, rows, blocks, absolute)
+    candidates = np.flatnonzero(~(peaks < threshold)) + blocks.start
+
+    builder = _EventBuilder(min_gap)
+    for i in range(0, len(candidates), BATCH_BLOCKS):
+        batch = candidates[i:i + BATCH_BLOCKS]
+        times, values = index.read(channel, entries[batch])
+        idx = np.concatenate([np.arange(first, first + count) for first, count
+                              in zip(firsts[batch], entries['samples'][batch])])
+
+        if absolute:
+            values = np.abs(values)
+        hits = (values >= threshold).any(axis=0)
+        if start is not None:
+            hits &= times >= start
+        if end is not None:
+            hits &= times < end
+
+        values = values[:, hits]
+        builder.add(idx[hits], times[hits], values.max(axis=0), values.argmax(axis=0))
+
+    events = builder.finish()
+    result = pd.DataFrame({
+        'start': [e[2] for e in events],
+        'end': [e[3] for e in events],
+        'duration': [e[3] - e[2] for e in events],
+        'peak': [e[4] for e in events],
+        'peak_time': [e[5] for e in events],
+        'subchannel': [names[e[6]] for e in events],
+        'samples': [e[7] for e in events],
+    }, columns=EVENT_COLUMNS)
+    return result.astype({'start': np.float64, 'end': np.float64, 'duration': np.float64,
+                          'peak': np.float64, 'peak_time': np.float64, 'samples': np.int64})
@@ -0,0 +1,329 @@
+"""
+export.py: Fast, streaming export of IDE channel data to CSV.
+
+Data is read block-by-block (see `endaq.ide.blocks`) and formatted a large
+batch of rows at a time, with a single C-level string formatting operation
+per batch, so memory use is bounded and the export is several times faster
+than ``to_pandas(channel).to_csv()``. Several channels can be exported to
+one file, aligned to the sample times of one of them.
+"""
+import datetime
+import gzip
+import io
+from pathlib import Path
+
+import numpy as np
+
+from .blocks import BlockIndex, _parent
+from .measurement import ANY, get_channels
+from .profiling import timed
+from .util import parse_time
+
+__all__ = ['export_csv']
+
+
+# ============================================================================
+#
+# ============================================================================
+
+""" The approximate number of rows formatted and written at a time. """
+BATCH_ROWS = 2**16
+
+""" The gzip compression level used for compressed output. """
+GZIP_LEVEL = 6
+
+""" The formats of the time column, for each `time_mode`. """
+TIME_FORMATS = {
+    'seconds': "%.9f",
+    'timedelta': "%s",
+    'datetime': "%s",
+}
+
+
+def _batches(entries, size=BATCH_ROWS):
+    """ Divide a channel's blocks into batches of at least `size` samples.
+
+        :param entries: The channel's block index entries.
+        :return: A list of slices.
+    """
+    offsets = np.concatenate(([0], np.cumsum(entries['samples'])))
+    batches = []
+    first = 0
+    while first < len(entries):
+        last = int(np.searchsorted(offsets, offsets[first] + size, side='left'))
+        last = min(max(last, first + 1), len(entries))
+        batches.append(slice(first, last))
+        first = last
+    return batches
+
+
+def _timedelta_strings(ns):
+    """ Format times (integer nanoseconds) like `pandas.Timedelta`, e.g.,
+        ``"0 days 00:01:02.500000000"``.
+    """
+    days, ns = np.divmod(ns, 86400 * 10**9)
+    hours, ns = np.divmod(ns, 3600 * 10**9)
+    minutes, ns = np.divmod(ns, 60 * 10**9)
+    seconds, ns = np.divmod(ns, 10**9)
+    fields = np.column_stack((days, hours, minutes, seconds, ns))
+    lines = ("%d days %02d:%02d:%02d.%09d\n" * len(fields)) % tuple(fields.ravel().tolist())
+    return lines.split("\n")[:-1]
+
+
+def _time_column(t, time_mode, utc_start):
+    """ Convert sample times (microseconds) to the values of the time
+        column, the same way `to_pandas()` builds its index.
+    """
+    t = (1e3 * t).astype("timedelta64[ns]")
+    if time_mode == "seconds":
+        return t / np.timedelta64(1, "s")
+    elif time_mode == "timedelta":
+        return _timedelta_strings(t.astype(np.int64))
+    return np.datetime_as_string(t + np.datetime64(utc_start, "s"), unit="ns")
+
+
+def _format_rows(times, values, time_format, float_format, na_rep):
+    """ Format a batch of rows as CSV text.
+
+        :param times: The values of the time column.
+        :param values: A 2D array of values, one row per column.
+        :return: The CSV text.
+    """
+    rows = np.empty((len(times), len(values) + 1), dtype=object)
+    rows[:, 0] = times
+    rows[:, 1:] = values.T
+    line = time_format + ("," + float_format) * len(values) + "\n"
+    text = (line * len(rows)) % tuple(rows.ravel().tolist())
+    if na_rep != "nan" and np.isnan(values).any():
+        text = text.replace(",nan", "," + na_rep)
+    return text
+
+
+class _Aligned:
+    """ A channel's data, read block-by-block as needed and sampled at the
+        times of another channel's data.
+    """
+
+    def __init__(self, channel, index, start, end, method):
+        self.channel = channel
+        self.index = index
+        self.method = method
+
+        parent = _parent(channel)
+        self.nrows = 1 if parent is not channel else len(parent.subchannels)
+
+        # Start one block early, for the value preceding the first time
+        first = max(0, index.find(parent.id, start, end).start - 1)
+        self.entries = index[parent.id][first:]
+        self.batches = iter(_batches(self.entries))
+        self.done = False
+        self.times = np.empty(0)
+        self.values = np.empty((self.nrows, 0))
+
+
+    def _fill(self, until):
+        """ Read blocks until the buffered data reaches a given time. """
+        times = [self.times]
+        values = [self.values]
+        while not self.done and (not len(times[-1]) or times[-1][-1] < until):
+            batch = next(self.batches, None)
+            if batch is None:
+                self.done = True
+                break
+            t, v = self.index.read(self.channel, self.entries[batch])
+            times.append(t)
+            values.append(v)
+        self.times = np.concatenate(times)
+        self.values = np.concatenate(values, axis=1)
+
+
+    def sample(self, t):
+        """ Get the channel's values at a batch of times (in order, and after
+            those of the previous batch).
+
+            :param t: The times (microseconds).
+            :return: A 2D array of values, one row per subchannel. Times
+                before the channel's first sample have no value (NaN).
+        """
+        self._fill(t[-1])
+        result = np.full((self.nrows, len(t)), np.nan)
+        if not len(self.times):
+            return result
+
+        if self.method == "linear":
+            for row, values in zip(result, self.values):
+                row[:] = np.interp(t, self.times, values, left=np.nan, right=np.nan)
+        else:
+            idx = np.searchsorted(self.times, t, side='right') - 1
+            valid = idx >= 0
+            result[:, valid] = self.values[:, idx[valid]]
+
+        # Keep only the data that could be needed by the next batch
+        first = max(0, int(np.searchsorted(self.times, t[-1], side='right')) - 1)
+        self.times = self.times[first:]
+        self.values = self.values[:, first:]
+        return result
+
+
+def _sample_rate(entries):
+    """ Estimate a channel's sample rate from its block index entries. """
+    if not len(entries):
+        return 0
+    elapsed = entries['end'][-1] - entries['start'][0]
+    return (entries['samples'].sum() - 1) / elapsed if elapsed > 0 else 0
+
+
+def _open_output(out, compression):
+    """ Open the output of `export_csv()`.
+
+        :return: A function that writes text, and the file to close (if it
+            was opened here).
+    """
+    if compression == "infer":
+        compression = "gzip" if str(getattr(out, 'name', out)).endswith(".gz") else None
+    elif compression not in ("gzip", None):
+        raise ValueError(f"Unsupported compression: {compression!r}")
+
+    if isinstance(out, (str, Path)):
+        if compression:
+            f = gzip.open(out, 'wb', compresslevel=GZIP_LEVEL)
+        else:
+            f = open(out, 'wb')
+        return (lambda text: f.write(text.encode('utf-8'))), f
+
+    if isinstance(out, io.TextIOBase):
+        if compression:
+            raise TypeError("Compressed output requires a binary stream")
+        return out.write, None
+
+    if compression:
+        f = gzip.GzipFile(fileobj=out, mode='wb', compresslevel=GZIP_LEVEL)
+        return (lambda text: f.write(text.encode('utf-8'))), f
+    return (lambda text: out.write(text.encode('utf-8'))), None
+
+
+@timed
+def export_csv(source, out, start=None, end=None, time_mode="datetime",
+               measurement_type=ANY, reference=None, align="previous",
+               float_format="%.9g", na_rep="", compression="infer",
+               header=True, index=None):
+    """ Export channel data to CSV. The data is read and written in
+        batches, so any length of recording can be exported with little
+        memory, and much faster than with ``to_pandas(channel).to_csv()``.
+
+        The `start` and `end` times may be specified in any of the forms
+        accepted by `get_doc()`. Samples at or after `start` and before
+        `end` are exported.
+
+        When more than one channel is exported, the rows are the sample
+        times of the `reference` channel, and the other channels' values
+        are aligned to them.
+
+        :param source: A `Channel` or `SubChannel`, a list of them, or a
+            `Dataset` (which does not have to be imported).
+        :param out: The output filename, or a file-like object (text or
+            binary).
+        :param start: The start of the interval. Defaults to the start of
+            the recording.
+        :param end: The end of the interval. Defaults to the end of the
+            recording.
+        :param time_mode: How to write the sample times: ``"seconds"``
+            (relative to the start of the recording), ``"timedelta"``, or
+            ``"datetime"`` (absolute UTC times, ISO 8601), as in
+            `to_pandas()`.
+        :param measurement_type: A `MeasurementType`, a measurement type
+            'key' string, or a string of multiple keys generated by adding
+            and/or subtracting `MeasurementType` objects to filter the
+            channels. Only used if `source` is a `Dataset`.
+        :param reference: The channel whose sample times are used when
+            exporting several channels. Defaults to the one with the
+            highest sample rate.
+        :param align: How other channels' values are aligned to the
+            reference channel's times: ``"previous"`` (the most recent
+            sample at or before each time) or ``"linear"`` (linearly
+            interpolated).
+        :param float_format: The printf-style format of the values.
+        :param na_rep: The representation of missing values (e.g., before
+            an aligned channel's first sample).
+        :param compression: ``"gzip"``, `None`, or ``"infer"`` (gzip if
+            the filename ends with ``.gz``).
+        :param header: If `True`, write a header row of column names.
+        :param index: An existing `BlockIndex` of the file, to avoid
+            indexing it again.
+        :return: The number of rows written (excluding the header).
+    """
+    if time_mode not in TIME_FORMATS:
+        raise ValueError(f'invalid time mode "{time_mode}"')
+    if align not in ("previous", "linear"):
+        raise ValueError(f"align must be 'previous' or 'linear', not {align!r}")
+
+    if hasattr(source, 'getPlots'):
+        doc = source
+        channels = get_channels(doc, measurement_type, subchannels=False)
+    else:
+        channels = [source] if hasattr(source, 'getSession') else list(source)
+        if not channels:
+            raise ValueError("No channels to export")
+        doc = _parent(channels[0]).dataset
+
+    index = index or BlockIndex(doc)
+    channels = [ch for ch in channels if len(index[_parent(ch).id])]
+    if not channels:
+        raise ValueError("No channels with data to export")
+
+    session_start = None
+    if doc.lastSession.utcStartTime:
+        session_start = datetime.datetime.utcfromtimestamp(doc.lastSession.utcStartTime)
+    start = parse_time(start, session_start)
+    end = parse_time(end, session_start)
+
+    if reference is None:
+        reference = max(channels, key=lambda ch: _sample_rate(index[_parent(ch).id]))
+    elif reference not in channels:
+        channels.insert(0, reference)
+
+    columns = []
+    for ch in channels:
+        subchannels = ch.subchannels if _parent(ch) is ch else [ch]
+        if len(channels) == 1:
+            columns.extend(sch.name for sch in subchannels)
+        else:
+            columns.extend(f"{sch.parent.id}.{sch.id}: {sch.name}" for sch in subchannels)
+
+    aligned = {id(ch): _Aligned(ch, index, start, end, align)
+               for ch in channels if ch is not reference}
+
+    ref = _parent(reference)
+    entries = index[ref.id][index.find(ref.id, start, end)]
+    time_format = TIME_FORMATS[time_mode]
+    rows = 0
+
+    write, f = _open_output(out, compression)
+    try:
+        if header:
+            write(",".join(["timestamp"] + [f'"{c}"' if "," in c else c for c in columns]) + "\n")
+
+        for batch in _batches(entries):
+            t, values = index.read(reference, entries[batch])
+            if start is not None or end is not None:
+                keep = np.ones(len(t), dtype=bool)
+                if start is not None:
+                    keep &= t >= start
+                if end is not None:
+                    keep &= t < end
+                t, values = t[keep], values[:, keep]
+            if not len(t):
+                continue
+
+            if aligned:
+                values = np.concatenate([values if ch is reference else aligned[id(ch)].sample(t)
+                                         for ch in channels])
+
+            write(_format_rows(_time_column(t, time_mode, doc.lastUtcTime), values,
+                               time_format, float_format, na_rep))
+            rows += len(t)
+    finally:
+        if f is not None:
+            f.close()
+
+    return rows
@@ -6,73 +6,230 @@ files.py: IDE file access functions.
 # TODO: Exception subclasses for `get_doc()` failures, to separate the function's
 #  own errors from `ValueError` exceptions raised by things the function calls?
 
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
 import os
 from pathlib import Path
 import tempfile
+import threading
 from urllib.parse import urlparse
+import warnings
 
+import numpy as np
 from idelib.importer import openFile, readData
 from idelib.util import extractTime
-import requests
 
-from .gdrive import gdrive_download
-from .info import parse_time
-from .util import validate
+from .blocks import BLOCK_DTYPE, BlockIndex
+from .profiling import section, timed
+from .util import SharedFile, parse_time, validate, walk_elements
 
-__all__ = ['get_doc', 'extract_time']
+__all__ = ['get_doc', 'extract_time', 'extract_windows']
 
 # ============================================================================
 #
 # ============================================================================
 
 
-def _get_url(url, localfile=None, params=None, cookies=None):
+""" The number of simultaneous connections used to download large files
+    from servers that support ranged requests.
+"""
+DOWNLOAD_CONNECTIONS = 4
+
+""" The size (in bytes) of each ranged request in a parallel download. Files
+    smaller than this are always downloaded with a single request.
+"""
+RANGE_SIZE = 2**23
+
+
+def _download_ranges(session, url, stream, size, connections=None,
+                     range_size=None, cookies=None, cancel=None):
+    """
+    Download a file in several simultaneous ranged requests, writing it into
+    a preallocated stream.
+
+    :param session: The `requests.Session` used to get the file's headers.
+        Its cookies are used in all the ranged requests.
+    :param url: The file's URL.
+    :param stream: The stream to which to write the data.
+    :param size: The total size of the file.
+    :param connections: The number of simultaneous requests.
+    :param range_size: The size (in bytes) of each request.
+    :param cookies: Optional browser cookies for the session.
+    :param cancel: An optional `threading.Event` that stops the download
+        (raising `CancelledError`) when set.
+    :return: The number of bytes downloaded, or `None` if the server did not
+        honor the ranged request (nothing will have been written).
+    """
+    import requests
+
+    connections = connections or DOWNLOAD_CONNECTIONS
+    range_size = range_size or RANGE_SIZE
+    ranges = [(first, min(first + range_size, size) - 1)
+              for first in range(0, size, range_size)]
+    lock = threading.Lock()
+    local = threading.local()
+    sessions = []
+
+    def fetch(byte_range):
+        # `requests.Session` isn't guaranteed to be thread-safe; use one per thread.
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+            sessions.append(local.session)
+            local.session.headers.update(session.headers)
+            local.session.cookies.update(session.cookies)
+        first, last = byte_range
+        response = local.session.get(url, headers={'Range': f"bytes={first}-{last}"},
+                                     cookies=cookies, stream=True)
+        with response:
+            if response.status_code != 206:
+                return None
+            pos = first
+            for chunk in response.iter_content(2**16):
+                _check_cancel(cancel)
+                with lock:
+                    stream.seek(pos)
+                    stream.write(chunk)
+                pos += len(chunk)
+        if pos != last + 1:
+            raise ValueError(f"Could not retrieve data from URL {url} "
+                             f"(got {pos - first} of {last + 1 - first} bytes "
+                             f"at offset {first})")
+        return pos - first
+
+    try:
+        # The first range is requested by itself, to make sure ranges are honored.
+        total = fetch(ranges[0])
+        if total is None:
+            return None
+
+        stream.seek(size - 1)
+        stream.write(b'\0')
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            for received in executor.map(fetch, ranges[1:]):
+                if received is None:
+                    raise ValueError(f"Could not retrieve data from URL {url} "
+                                     f"(server stopped honoring ranged requests)")
+                total += received
+    finally:
+        for s in sessions:
+            s.close()
+
+    return total
+
+
+def _check_cancel(cancel):
+    """ Raise `CancelledError` if a download's cancellation `Event` is set. """
+    if cancel is not None and cancel.is_set():
+        raise CancelledError("Download cancelled")
+
+
+def _open_localfile(url, localfile=None, filename=None):
+    """
+    Create the stream to which a downloaded IDE is written: a temporary
+    file, or a named local file.
+
+    :param url: The file's URL.
+    :param localfile: The local filename (if saving the file). If it is a
+        directory, the file is saved in it, named after `filename` (or the
+        last part of the URL's path).
+    :param filename: The file's name, as reported by the server.
+    :return: The open stream, and the full path of the local file (or
+        `None`, if using a temporary file).
+    """
+    if localfile is None:
+        return tempfile.SpooledTemporaryFile(suffix=".ide"), None
+
+    localfile = os.path.abspath(os.path.expanduser(localfile))
+    if os.path.isdir(localfile):
+        localfile = os.path.join(localfile, filename or os.path.basename(urlparse(url).path))
+    if not localfile.lower().endswith('.ide'):
+        localfile += ".ide"
+    return open(localfile, 'w+b'), localfile
+
+
+def _discard_localfile(stream, localfile):
+    """ Close the stream of a failed (or cancelled) download, and remove
+        the partially-written local file (if any).
+    """
+    stream.close()
+    if localfile and os.path.isfile(localfile):
+        os.remove(localfile)
+
+
+@timed(nbytes=lambda result: result[1])
+def _get_url(url, localfile=None, params=None, cookies=None, connections=None,
+             cancel=None):
     """
     Retrieve an IDE from a (HTTP/HTTPS) URL, including Google Drive shared
-    links.
+    links. Large files are downloaded using several simultaneous ranged
+    requests, if the server supports them.
 
     :param url: The file's URL.
     :param localfile: The local filename (if saving the file).
     :param params: Additional (optional) request parameters.
     :param cookies: Optional browser cookies for the session.
+    :param connections: The maximum number of simultaneous requests.
+        Defaults to `DOWNLOAD_CONNECTIONS`.
+    :param cancel: An optional `threading.Event` that stops the download
+        (raising `CancelledError`) when set.
     :return: An open file stream containing the IDE data and the number of
         bytes downloaded.
     """
-    parsed_url = urlparse(url)
-    session = requests.Session()
+    # Imported here to keep importing `endaq.ide` fast.
+    import requests
+    from .gdrive import gdrive_download
 
-    netloc = parsed_url.netloc.lower()
-    if netloc.endswith('.google.com') or netloc == "google.com":
-        response, filename = gdrive_download(url, localfile, params=params, cookies=cookies)
-    else:
-        response = session.get(parsed_url.geturl(), params=params, cookies=cookies)
-        filename = None
+    parsed_url = urlparse(url)
+    connections = connections or DOWNLOAD_CONNECTIONS
 
-    if not response.ok:
-        raise ValueError(f"Could not retrieve data from URL {url} "
-                         f"({response.status_code}: {response.reason})")
+    with requests.Session() as session:
+        netloc = parsed_url.netloc.lower()
+        if netloc.endswith('.google.com') or netloc == "google.com":
+            response, filename = gdrive_download(url, localfile, params=params,
+                                                 cookies=cookies, session=session)
+        else:
+            response = session.get(parsed_url.geturl(), params=params, cookies=cookies,
+                                   stream=True)
+            filename = None
+
+        if not response.ok:
+            response.close()
+            raise ValueError(f"Could not retrieve data from URL {url} "
+                             f"({response.status_code}: {response.reason})")
+
+        stream, localfile = _open_localfile(url, localfile, filename)
+
+        try:
+            total = None
+            size = int(response.headers.get('Content-Length', 0) or 0)
+            if (connections > 1 and size > RANGE_SIZE
+                    and response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+                    and not response.headers.get('Content-Encoding')):
+                response.close()
+                total = _download_ranges(session, response.url, stream, size,
+                                         connections=connections, cookies=cookies,
+                                         cancel=cancel)
+                if total is None:
+                    # Server didn't honor the range; start over with a single request.
+                    response = session.get(response.url, cookies=cookies, stream=True)
+                    if not response.ok:
+                        raise ValueError(f"Could not retrieve data from URL {url} "
+                                         f"({response.status_code}: {response.reason})")
+
+            if total is None:
+                total = 0
+                for chunk in response.iter_content(2**15):
+                    # future: Confirm that this is an IDE from 1st chunk, avoiding download if not
+                    _check_cancel(cancel)
+                    if chunk:
+                        stream.write(chunk)
+                        total += len(chunk)
+        except BaseException:
+            _discard_localfile(stream, localfile)
+            raise
+        finally:
+            response.close()
 
-    if localfile is None:
-        stream = tempfile.SpooledTemporaryFile(suffix=".ide")
-    else:
-        localfile = os.path.abspath(os.path.expanduser(localfile))
-        if os.path.isdir(localfile):
-            if not filename:
-                filename = os.path.basename(parsed_url.path)
-            localfile = os.path.join(localfile, filename)
-        if not localfile.lower().endswith('.ide'):
-            localfile += ".ide"
-        stream = open(localfile, 'w+b')
-
-    total = 0
-    for chunk in response.iter_content(2**15):
-        # future: Confirm that this is an IDE from 1st chunk, avoiding download if not
-        if chunk:
-            stream.write(chunk)
-            total += len(chunk)
-
-    response.close()
     stream.seek(0)
 
     return stream, total
@@ -82,8 +239,10 @@ def _get_url(url, localfile=None, params=None, cookies=None):
 #
 # ============================================================================
 
+@timed
 def get_doc(name=None, filename=None, url=None, parsed=True, start=0, end=None,
-            localfile=None, params=None, cookies=None, **kwargs):
+            localfile=None, params=None, cookies=None, shared=False,
+            workers=None, **kwargs):
     """
     Retrieve an IDE file from either a file or URL.
 
@@ -137,16 +296,67 @@ def get_doc(name=None, filename=None, url=None, parsed=True, start=0, end=None,
         opening a URL.
     :param cookies: Additional browser cookies for use in the URL request.
         Only applicable when opening a URL.
+    :param shared: If `True`, read the file through a `SharedFile`, so
+        that several threads can read the `Dataset`'s data at once (e.g.,
+        concurrent `to_pandas()` calls on one cached `Dataset`), each with
+        its own file position. Only applicable for local files (including
+        URLs saved to a `localfile`).
+    :param workers: If given, decode the data in this many processes
+        instead of importing it with `idelib`. Each process reads and
+        decodes a contiguous range of the file's data blocks, and the
+        results are merged into arrays held with the `Dataset` (an
+        in-memory `DataCache`, see `endaq.ide.cache`), which are used by
+        `to_pandas()`, `to_numpy()`, `get_channel_table()`, and the other
+        functions that use a cache. The channels' `idelib` `EventArray`
+        objects are left empty. Only applicable if `parsed` is `True` and
+        the data is in a local file (including URLs saved to a
+        `localfile`); otherwise, the data is imported normally. The
+        `start`, `end`, and `channels` arguments are applied; other
+        `idelib.importer.readData()` arguments are ignored.
     :return: The fetched IDE data.
 
     Additionally, `get_doc()` will accept the keyword arguments for
     `idelib.importer.importFile()` or `idelib.importer.openFile()`
     """
+    filename, url, original = _resolve_source(name, filename, url)
+    stream = None
+
+    if filename:
+        stream = SharedFile(filename) if shared else open(filename, 'rb')
+
+    elif url:
+        kwargs.setdefault('name', url)
+        stream, _total = _get_url(url, localfile=localfile, params=params, cookies=cookies)
+        if shared:
+            if localfile:
+                stream.close()
+                stream = SharedFile(stream.name)
+            else:
+                warnings.warn("get_doc(): shared reading requires a local file; "
+                              "use `localfile` to save the downloaded file")
+
+    if stream:
+        return _read_doc(stream, original, parsed=parsed, start=start, end=end,
+                         workers=workers, **kwargs)
+
+    raise ValueError(f"Could not read data from '{original}'")
+
+
+def _resolve_source(name=None, filename=None, url=None):
+    """
+    Determine whether an IDE source (as given to `get_doc()`) is a local file
+    or a URL.
+
+    :param name: The name or URL of the IDE.
+    :param filename: The name of an IDE file.
+    :param url: The URL of an IDE file.
+    :return: The full path of the file (or `None`), the URL (or `None`),
+        and the original source (for error reporting).
+    """
     if len([x for x in (name, filename, url) if x]) != 1:
         raise TypeError("Only one source can be specified: name, filename, or url")
 
     original = name or filename or url  # For error reporting
-    stream = None
     parsed_url = None
 
     if name:
@@ -161,53 +371,195 @@ def get_doc(name=None, filename=None, url=None, parsed=True, start=0, end=None,
 
     if filename:
         filename = os.path.abspath(os.path.expanduser(filename))
-        stream = open(filename, 'rb')
 
     elif url:
-        kwargs.setdefault('name', url)
         parsed_url = parsed_url or urlparse(url)
-        if parsed_url.scheme.startswith('http'):
-            stream, _total = _get_url(url, localfile=localfile, params=params, cookies=cookies)
-        else:
+        if not parsed_url.scheme.startswith('http'):
             # future: more fetching schemes before this `else` (ftp, etc.)?
             raise ValueError(f"Unsupported transfer scheme: {parsed_url.scheme}")
 
-    if stream:
-        if not validate(stream):
-            stream.close()
-            raise ValueError(f"Could not read a Dataset from '{original}'"
-                             f"(not an IDE file?)")
+    return filename, url, original
 
-        # Separate `openFile()` and `readData` kwargs, remove ones that aren't shared
-        open_kwargs = kwargs.copy()
-        read_kwargs = kwargs.copy()
 
-        for k in ('startTime', 'endTime', 'channels', 'source', 'total',
-                  'bytesRead', 'samplesRead'):
-            open_kwargs.pop(k, None)
+def _read_doc(stream, original, parsed=True, start=0, end=None, workers=None, **kwargs):
+    """
+    Open (and optionally import) a `Dataset` from a stream. Used internally
+    by `get_doc()` and other functions; arguments are the same.
 
-        doc = openFile(stream, **open_kwargs)
+    :param stream: The stream containing IDE data.
+    :param original: The name of the IDE's source (for error reporting).
+    :return: The IDE data.
+    """
+    if not validate(stream):
+        stream.close()
+        raise ValueError(f"Could not read a Dataset from '{original}'"
+                         f"(not an IDE file?)")
 
-        if parsed:
-            for k in ('defaults', 'name', 'quiet'):
-                read_kwargs.pop(k, None)
+    # Separate `openFile()` and `readData` kwargs, remove ones that aren't shared
+    open_kwargs = kwargs.copy()
+    read_kwargs = kwargs.copy()
 
-            session_start = doc.lastSession.utcStartTime
-            if session_start:
-                session_start = datetime.utcfromtimestamp(session_start)
+    for k in ('startTime', 'endTime', 'channels', 'source', 'total',
+              'bytesRead', 'samplesRead'):
+        open_kwargs.pop(k, None)
 
-            if start:
-                read_kwargs['startTime'] = parse_time(start, session_start)
-            if end:
-                read_kwargs['endTime'] = parse_time(end, session_start)
+    with section("idelib.importer.openFile"):
+        doc = openFile(stream, **open_kwargs)
 
+    # Recorded so that channels left empty by a partial import (see
+    # `channels`, `start`, and `end`) aren't mistaken for unimported ones
+    doc._endaq_parsed = parsed
+
+    if parsed:
+        for k in ('defaults', 'name', 'quiet'):
+            read_kwargs.pop(k, None)
+
+        session_start = doc.lastSession.utcStartTime
+        if session_start:
+            session_start = datetime.utcfromtimestamp(session_start)
+
+        filename = getattr(stream, 'name', None)
+        if workers and isinstance(filename, str) and os.path.isfile(filename):
+            with section("endaq.ide.files.decode_blocks", nbytes=doc.ebmldoc.size):
+                _decode_blocks(doc, filename, workers,
+                               start=parse_time(start, session_start) if start else None,
+                               end=parse_time(end, session_start) if end else None,
+                               channels=read_kwargs.get('channels'))
+            return doc
+
+        if read_kwargs.get('updater') and read_kwargs.get('total') is None:
+            # `readData()` can't get the size of a `SpooledTemporaryFile`
+            pos = stream.tell()
+            read_kwargs['total'] = stream.seek(0, os.SEEK_END)
+            stream.seek(pos)
+
+        if start:
+            read_kwargs['startTime'] = parse_time(start, session_start)
+        if end:
+            read_kwargs['endTime'] = parse_time(end, session_start)
+
+        with section("idelib.importer.readData", nbytes=doc.ebmldoc.size):
             readData(doc, **read_kwargs)
 
-        return doc
+    return doc
 
-    raise ValueError(f"Could not read data from '{original}'")
 
+def _read_blocks(filename, offsets, channels=None):
+    """
+    Read the headers and raw data of some of a file's `ChannelDataBlock`
+    elements. Run in worker processes by `_decode_blocks()`.
+
+    :param filename: The IDE file's name.
+    :param offsets: The offsets of the blocks' elements, in file order.
+    :param channels: The IDs of the channels to read, or `None` for all.
+    :return: A list of the blocks' headers (see `BlockIndex._read_block()`),
+        and a dictionary of each channel's raw data (a structured array),
+        keyed by channel ID.
+    """
+    with open(filename, 'rb') as stream:
+        index = BlockIndex(openFile(stream), update=False)
+        headers = []
+        payloads = {}
+        for offset in offsets:
+            header = index._read_block(int(offset))
+            if header is not None and (channels is None or header[0] in channels):
+                headers.append(header)
+                payloads.setdefault(header[0], []).append(header[2:4])
+
+        values = {}
+        for chid, locations in payloads.items():
+            entries = np.zeros(len(locations), dtype=BLOCK_DTYPE)
+            entries['payload'], entries['size'] = zip(*locations)
+            values[chid] = index.read_raw(chid, entries)
+
+    return headers, values
+
+
+def _import_range(starts, ends, start=None, end=None):
+    """
+    Get the range of a channel's blocks that `idelib.importer.readData()`
+    imports for an interval (see `idelib.importer.filterTime()`): the
+    blocks overlapping it, the block before them (if the first starts after
+    `start`), and the first block ending after `end`.
+
+    :param starts: The blocks' start times, computed like `filterTime()`
+        (unrounded, without rollover correction).
+    :param ends: The blocks' end times.
+    :param start: The start of the interval (microseconds), or `None`.
+    :param end: The end of the interval (microseconds), or `None`.
+    :return: A `slice` of the blocks.
+    """
+    start = start or 0
+    count = len(starts)
+    first = int(np.searchsorted(ends, start, side='left'))
+    last = count
+    if end is not None and first < count:
+        # The first block overlapping the end of the interval is the last
+        done = np.where(starts[first:] <= start, ends[first:] >= end, ends[first:] > end)
+        if done.any():
+            last = first + int(np.argmax(done)) + 1
+    if 0 < first < count and starts[first] > start:
+        first -= 1
+    return slice(first, max(first, last))
+
+
+def _decode_blocks(doc, filename, workers, start=None, end=None, channels=None):
+    """
+    Decode a recording's data in several processes, keeping the results
+    with the `Dataset` as an in-memory `DataCache`. Used internally by
+    `get_doc()`.
+
+    :param doc: The `Dataset`, opened but not imported.
+    :param filename: The name of the `Dataset`'s file.
+    :param workers: The number of processes to use. If 1, the data is
+        decoded in this process.
+    :param start: The start of the interval to keep (microseconds). The
+        same blocks are kept as by `idelib.importer.readData()`.
+    :param end: The end of the interval to keep (microseconds).
+    :param channels: The IDs of the channels to decode, or `None` for all.
+    :return: The `DataCache`.
+    """
+    from .cache import DataCache, _cache_path
+
+    index = BlockIndex(doc, update=False)
+    offsets = np.array(list(index._walk()), dtype=np.int64)
+    ranges = [r for r in np.array_split(offsets, max(1, min(workers, len(offsets)))) if len(r)]
 
+    if len(ranges) > 1:
+        with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+            results = list(executor.map(_read_blocks, [filename] * len(ranges), ranges,
+                                        [channels] * len(ranges)))
+    else:
+        results = [_read_blocks(filename, r, channels) for r in ranges]
+
+    # Timestamp rollovers are corrected in file order, as in an import
+    parts = {}
+    stamps = {}
+    for headers, values in results:
+        for header in headers:
+            index._add_block(*header)
+            stamps.setdefault(header[0], []).append((header[4], header[5] or header[4]))
+        for chid, raw in values.items():
+            parts.setdefault(chid, []).append(raw)
+
+    blocks = {}
+    values = {}
+    scalars = doc._parsers['ChannelDataBlock'].timeScalars
+    for chid, raw in parts.items():
+        entries = index[chid]
+        times = np.array(stamps[chid], dtype=np.float64) * scalars.get(chid, 1)
+        selected = _import_range(times[:, 0], times[:, 1], start, end)
+        firsts = np.concatenate(([0], np.cumsum(entries['samples'])))
+        blocks[chid] = entries[selected]
+        values[chid] = np.concatenate(raw)[firsts[selected.start]:firsts[selected.stop]]
+
+    cache = DataCache.from_arrays(doc, blocks, values)
+    doc._endaq_caches = {_cache_path(filename): cache}
+    doc._endaq_parsed = False
+    return cache
+
+
+@timed(nbytes=lambda result: result)
 def extract_time(doc, out, start=0, end=None, channels=None, **kwargs):
     """
     Efficiently extract data within a certain interval from an IDE file. Note
@@ -239,21 +591,137 @@ def extract_time(doc, out, start=0, end=None, channels=None, **kwargs):
         all channels will be exported. Note excluded channels will still
         appear in the new IDE's `channels` dictionary, but the file will
         contain no data for them.
-    :return: The total number of bytes written, and total number of
-        ChannelDataBlock elements copied.
+    :return: The total number of bytes written.
     """
-    if isinstance(doc, (str, Path)):
+    opened = isinstance(doc, (str, Path))
+    if opened:
         doc = openFile(doc)
+    try:
+        session_start = doc.lastSession.utcStartTime
+        if session_start:
+            session_start = datetime.utcfromtimestamp(session_start)
+
+        if start:
+            kwargs['startTime'] = parse_time(start, session_start)
+        if end:
+            kwargs['endTime'] = parse_time(end, session_start)
+        kwargs['channels'] = channels
+
+        return extractTime(doc, out, **kwargs)
+    finally:
+        # Only close a file opened here
+        if opened:
+            doc.close()
+
+
+def _copy_ranges(stream, out, ranges, chunk_size=2**20):
+    """ Copy byte ranges from one stream to another, in order.
+
+        :param stream: The source stream.
+        :param out: The destination stream.
+        :param ranges: A list of (start, end) offsets.
+        :param chunk_size: The maximum number of bytes to read at once.
+        :return: The number of bytes copied.
+    """
+    copied = 0
+    for start, end in ranges:
+        stream.seek(start)
+        while start < end:
+            data = stream.read(min(chunk_size, end - start))
+            if not data:
+                break
+            out.write(data)
+            start += len(data)
+            copied += len(data)
+    return copied
+
+
+@timed(nbytes=lambda result: result)
+def extract_windows(doc, out, windows, channels=None, pad=0):
+    """
+    Extract data within several intervals from an IDE file into a single new
+    IDE file (e.g., a 'highlight reel' of events found by `find_events()`).
+    The source is indexed once, and the union of the data blocks required by
+    all the intervals is copied verbatim, in its original order. As with
+    `extract_time()`, each exported interval will be slightly wider than
+    specified. Overlapping intervals are combined.
 
-    session_start = doc.lastSession.utcStartTime
-    if session_start:
-        session_start = datetime.utcfromtimestamp(session_start)
-
-    if start:
-        kwargs['startTime'] = parse_time(start, session_start)
-    if end:
-        kwargs['endTime'] = parse_time(end, session_start)
-    kwargs['channels'] = channels
-
-    return extractTime(doc, out, **kwargs)
+    The intervals' start and end times, and `pad`, may be specified in any of
+    the forms accepted by `extract_time()`.
 
+    :param doc: A `Dataset` or the name of a local IDE file. `Dataset`
+        objects do not have to be fully imported.
+    :param out: A filename or stream to which to save the extracted data.
+    :param windows: A list of (start, end) pairs, or a `pandas.DataFrame`
+        with ``start`` and ``end`` columns (like the one returned by
+        `find_events()`). A start or end of `None` is the start or end of
+        the recording.
+    :param channels: A list of channel IDs to specifically export. If `None`,
+        all channels will be exported. Note excluded channels will still
+        appear in the new IDE's `channels` dictionary, but the file will
+        contain no data for them.
+    :param pad: Additional time to include before and after each interval.
+    :return: The total number of bytes written.
+    """
+    opened = isinstance(doc, (str, Path))
+    if opened:
+        doc = openFile(doc)
+    try:
+        session_start = doc.lastSession.utcStartTime
+        if session_start:
+            session_start = datetime.utcfromtimestamp(session_start)
+
+        if hasattr(windows, 'columns'):
+            windows = zip(windows['start'], windows['end'])
+        pad = parse_time(pad) or 0
+        intervals = []
+        for start, end in windows:
+            start = parse_time(start, session_start)
+            end = parse_time(end, session_start)
+            intervals.append((None if start is None else start - pad,
+                              None if end is None else end + pad))
+
+        # Find the blocks to omit, by offset
+        index = BlockIndex(doc)
+        omit = set()
+        for chid in index.channels:
+            entries = index[chid]
+            selected = np.zeros(len(entries), dtype=bool)
+            if channels is None or chid in channels:
+                ends = entries['end']
+                for start, end in intervals:
+                    # Like `extract_time()`: from the first block ending after
+                    # `start` through the first block ending after `end`, plus
+                    # the previous block if the first one starts late (so
+                    # initial data is not left out).
+                    first = 0 if start is None else int(np.searchsorted(ends, start, side='left'))
+                    stop = len(entries) if end is None else int(np.searchsorted(ends, end, side='right')) + 1
+                    if first and first < len(entries) and entries['start'][first] > start:
+                        first -= 1
+                    selected[first:stop] = True
+            omit.update(entries['offset'][~selected].tolist())
+
+        # Everything else (the header, channel definitions, calibration, etc.)
+        # is copied as-is. The omitted blocks' extents are those of the whole
+        # elements, which may contain more after their payloads.
+        ranges = []
+        pos = 0
+        if omit:
+            for _eid, offset, payload, size in walk_elements(index.stream, 0):
+                if offset >= index.offset:
+                    break
+                if offset in omit:
+                    if offset > pos:
+                        ranges.append((pos, offset))
+                    pos = payload + size
+        if index.offset > pos:
+            ranges.append((pos, index.offset))
+
+        if isinstance(out, (str, Path)):
+            with open(out, 'wb') as f:
+                return _copy_ranges(index.stream, f, ranges)
+        return _copy_ranges(index.stream, out, ranges)
+    finally:
+        # Only close a file opened here
+        if opened:
+            doc.close()
@@ -0,0 +1,159 @@
+"""
+follow.py: Incremental reading of IDE files that are still being written.
+"""
+import os
+import time
+
+from idelib.importer import openFile
+
+from .blocks import BlockIndex
+from .info import _make_frame
+from .util import walk_elements
+
+__all__ = ['Follower', 'follow']
+
+
+# ============================================================================
+#
+# ============================================================================
+
+class Follower:
+    """ An incremental reader for an IDE file that is still being written
+        (e.g., streamed from a recorder to a network share). Each call to
+        `poll()` decodes only the data blocks that have been completely
+        written since the previous call. An incomplete final element is
+        ignored until a later poll, when it has been finished.
+
+        Example usage::
+
+            with Follower("recording.ide") as f:
+                while recording:
+                    for channel_id, df in f.poll().items():
+                        update_dashboard(channel_id, df)
+                    time.sleep(1)
+    """
+
+    def __init__(self, filename, channels=None, time_mode="datetime", raw=False):
+        """ Constructor.
+
+            :param filename: The name of the IDE file to read. The file does
+                not need to exist yet, or have its metadata completely
+                written.
+            :param channels: A list of channel IDs to read. Defaults to all
+                channels.
+            :param time_mode: How to temporally index samples in the
+                resulting `pandas.DataFrame` objects (see `to_pandas()`). If
+                `None`, raw NumPy arrays are produced instead.
+            :param raw: If `True`, return the uncalibrated sample values.
+        """
+        self.filename = os.path.abspath(os.path.expanduser(filename))
+        self.channels = channels
+        self.time_mode = time_mode
+        self.raw = raw
+        self.doc = None
+        self.index = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def close(self):
+        """ Close the file. """
+        if self.doc is not None:
+            self.doc.close()
+
+
+    @property
+    def offset(self):
+        """ The offset of the first byte not yet read (i.e., the end of the
+            last complete element).
+        """
+        return self.index.offset if self.index else 0
+
+
+    def _open(self):
+        """ Open the file, once its metadata has been completely written
+            (i.e., it contains at least one data block).
+
+            :return: `True` if the file was opened.
+        """
+        if not os.path.isfile(self.filename):
+            return False
+
+        with open(self.filename, 'rb') as fs:
+            length = fs.seek(0, os.SEEK_END)
+            for eid, _offset, payload, size in walk_elements(fs, 0):
+                if payload + size > length:
+                    return False
+                if eid == BlockIndex.BLOCK_ID:
+                    break
+            else:
+                return False
+
+        self.doc = openFile(open(self.filename, 'rb'))
+        self.index = BlockIndex(self.doc, update=False)
+        return True
+
+
+    def poll(self):
+        """ Read any data blocks written since the last poll.
+
+            :return: A dictionary of new data, keyed by channel ID. Values
+                are `pandas.DataFrame` objects, or tuples of times
+                (microseconds) and values (one row per subchannel) if the
+                `Follower`'s `time_mode` is `None`. Channels without new
+                data are omitted.
+        """
+        if self.doc is None and not self._open():
+            return {}
+
+        result = {}
+        for chid, entries in self.index.update().items():
+            if self.channels and chid not in self.channels:
+                continue
+            channel = self.doc.channels[chid]
+            t, values = self.index.read(channel, entries, raw=self.raw)
+            if self.time_mode is None:
+                result[chid] = (t, values)
+            else:
+                result[chid] = _make_frame(channel, t, values.T, self.time_mode)
+
+        return result
+
+
+def follow(filename, interval=1.0, timeout=None, **kwargs):
+    """ Iterate over new data as it is written to an IDE file. A convenient
+        wrapper for `Follower`.
+
+        Example usage::
+
+            for data in follow("recording.ide", timeout=60):
+                accel = data.get(8)
+                if accel is not None:
+                    update_dashboard(accel)
+
+        :param filename: The name of the IDE file to read.
+        :param interval: The time (in seconds) between polls.
+        :param timeout: The time (in seconds) to wait for new data before
+            stopping. If `None`, iteration continues indefinitely.
+        :yields: A dictionary of new data, keyed by channel ID (see
+            `Follower.poll()`).
+
+        Additionally, `follow()` accepts the keyword arguments for
+        `Follower`.
+    """
+    with Follower(filename, **kwargs) as follower:
+        last = time.monotonic()
+        while True:
+            data = follower.poll()
+            if data:
+                last = time.monotonic()
+                yield data
+            elif timeout is not None and time.monotonic() - last >= timeout:
+                return
+            time.sleep(interval)
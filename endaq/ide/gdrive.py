@@ -1,8 +1,9 @@
 """
 gdrive.py: Accessing data via Google Drive links.
 """
+import html
 import re
-from urllib.parse import parse_qs, urlparse
+from urllib.parse import parse_qs, urljoin, urlparse
 
 import requests
 
@@ -33,18 +34,62 @@ def get_file_id(url):
     return None
 
 
-def gdrive_download(url, localfile, params=None, cookies=None, drive_url=DRIVE_URL):
+def get_confirmation(response, drive_url=DRIVE_URL):
+    """
+    Get the URL and parameters needed to get past the intermediate page
+    that Google Drive returns for large files (warning that the file is
+    too large to scan for viruses).
+
+    :param response: The response containing the intermediate page.
+    :param drive_url: The Google Docs download URL.
+    :return: The URL and a dictionary of parameters to request, or `None`
+        if the response isn't a recognized confirmation page.
+    """
+    # Newer: a form, with the token (and other parameters) as hidden inputs
+    text = response.text
+    form = re.search(r'<form[^>]*id="download-form"[^>]*>(.*?)</form>', text, re.S)
+    if form:
+        action = re.search(r'action="([^"]+)"', form.group(0))
+        fields = {}
+        for tag in re.findall(r'<input[^>]*type="hidden"[^>]*>', form.group(1)):
+            name = re.search(r'name="([^"]*)"', tag)
+            value = re.search(r'value="([^"]*)"', tag)
+            if name:
+                fields[html.unescape(name.group(1))] = html.unescape(value.group(1)) if value else ''
+        if action:
+            return urljoin(response.url, html.unescape(action.group(1))), fields
+
+    # Older: the token in a cookie, or in a link in the page
+    for key, value in response.cookies.items():
+        if key.startswith('download_warning'):
+            return drive_url, {'confirm': value}
+
+    m = re.search(r'confirm=([0-9A-Za-z_-]+)', text)
+    if m:
+        return drive_url, {'confirm': m.group(1)}
+
+    return None
+
+
+def gdrive_download(url, localfile, params=None, cookies=None, drive_url=None,
+                    session=None):
     """
     Retrieve an IDE from Google Drive. The file must be set to be shared
-    with anyone with the URL.
+    with anyone with the URL. Large files, for which Google Drive first
+    returns a confirmation page, are handled automatically.
 
     :param url: The 'shared link' to the file on Google Drive.
     :param localfile: The local filename (if saving the file).
     :param params: Additional (optional) request parameters.
     :param cookies: Optional browser cookies for the session.
-    :param drive_url: The Google Docs download URL.
-    :return: The 'get' response and the filename.
+    :param drive_url: The Google Docs download URL. Defaults to
+        `DRIVE_URL`.
+    :param session: The `requests.Session` to use. Any cookies set while
+        confirming the download will be kept in it.
+    :return: The 'get' response (streaming; the content has not been read)
+        and the filename.
     """
+    drive_url = drive_url or DRIVE_URL
     file_id = get_file_id(url)
     if not file_id:
         raise ValueError(f"Could not identify ID in URL {url}")
@@ -53,29 +98,39 @@ def gdrive_download(url, localfile, params=None, cookies=None, drive_url=DRIVE_U
     if params:
         p.update(params)
 
-    session = requests.Session()
+    session = session or requests.Session()
     response = session.get(drive_url, params=p, cookies=cookies, stream=True)
 
     if not response.ok:
         raise ValueError(f"Could not retrieve data from URL {url} "
                          f"({response.status_code}: {response.reason})")
 
+    if 'Content-Disposition' not in response.headers:
+        # Probably an intermediate page, e.g., the virus scan warning.
+        confirmation = get_confirmation(response, drive_url)
+        response.close()
+        if confirmation:
+            confirm_url, confirm_params = confirmation
+            response = session.get(confirm_url, params=dict(p, **confirm_params),
+                                   cookies=cookies, stream=True)
+            if not response.ok:
+                raise ValueError(f"Could not retrieve data from URL {url} "
+                                 f"({response.status_code}: {response.reason})")
+
     # A response with the file will have its name in the headers.
     name = None
 
     if 'Content-Disposition' not in response.headers:
-        # TODO: This is probably an intermediate page, possibly a warning.
-        #  Get the download URL from the response body text and/or
-        #  authorization token from the cookies, then get another response.
+        response.close()
         raise ValueError(f"Could not retrieve data from URL {url} "
                          f"(not shared 'anyone with link'?)")
 
-    if 'Content-Disposition' in response.headers:
-        m = re.search('filename="(.*)"', ''.join(response.headers['Content-Disposition']))
-        if m:
-            name = m.groups()[0]
+    m = re.search('filename="(.*)"', ''.join(response.headers['Content-Disposition']))
+    if m:
+        name = m.groups()[0]
 
     if not name:
+        response.close()
         raise ValueError(f"Could not retrieve data from URL {url}")
 
     return response, name
@@ -0,0 +1,225 @@
+"""
+handles.py: Small, picklable references to IDE channels, for sending to
+worker processes. A `Channel` or `SubChannel` can't be pickled (it refers to
+its whole `Dataset`, including the open file), but a `ChannelHandle` only
+holds the file's name (or URL) and the channel's IDs; the file is reopened,
+and only the required data decoded, in the process that uses it::
+
+    from multiprocessing import Pool
+
+    handles = get_channel_handles(doc, "accel", start="1:00", end="2:00")
+    with Pool() as pool:
+        peaks = pool.map(peak_acceleration, handles)
+
+Reopened files are kept open for use by later handles; see
+`endaq.ide.lazy.close_files()`.
+"""
+from contextlib import contextmanager
+import datetime
+import os
+
+import numpy as np
+
+from .blocks import _parent
+from .lazy import _open_file
+from .measurement import ANY, get_channels
+from .util import parse_time
+
+__all__ = ['ChannelHandle', 'get_channel_handles']
+
+
+# ============================================================================
+#
+# ============================================================================
+
+class ChannelHandle:
+    """ A picklable reference to a `Channel` or `SubChannel` of an IDE
+        file, and optionally an interval of its data. The file is reopened
+        (once per process) when the handle's data is used.
+    """
+
+    def __init__(self, source, channel_id, subchannel_id=None, session=None,
+                 start=None, end=None):
+        """ Constructor. Handles are typically created by
+            `ChannelHandle.from_channel()` or `get_channel_handles()`.
+
+            :param source: The IDE file's name or URL.
+            :param channel_id: The channel ID.
+            :param subchannel_id: The subchannel ID, or `None` for the whole
+                channel.
+            :param session: The ID of the recording session, checked when
+                the file is reopened. `None` skips the check.
+            :param start: The start of the interval, in any of the forms
+                accepted by `get_doc()`. Defaults to the start of the
+                recording.
+            :param end: The end of the interval. Defaults to the end of the
+                recording.
+        """
+        self.source = os.fspath(source)
+        self.channel_id = channel_id
+        self.subchannel_id = subchannel_id
+        self.session = session
+        self.start = start
+        self.end = end
+
+
+    @classmethod
+    def from_channel(cls, channel, start=None, end=None):
+        """ Create a handle for a `Channel` or `SubChannel`.
+
+            :param channel: A `Channel` or `SubChannel`, of a `Dataset` read
+                from a local file or URL.
+            :param start: The start of the interval, in any of the forms
+                accepted by `get_doc()`. Defaults to the start of the
+                recording.
+            :param end: The end of the interval. Defaults to the end of the
+                recording.
+            :return: A `ChannelHandle`.
+        """
+        parent = _parent(channel)
+        doc = parent.dataset
+        source = doc.filename
+        if not source:
+            raise ValueError(f"{channel!r} is not from a file or URL, so it can't be reopened")
+        if os.path.isfile(source):
+            source = os.path.abspath(source)
+        elif "://" not in source:
+            raise ValueError(f"{source} does not exist, so it can't be reopened")
+
+        return cls(source, parent.id, None if parent is channel else channel.id,
+                   session=doc.lastSession.sessionId, start=start, end=end)
+
+
+    def _key(self):
+        return (self.source, self.channel_id, self.subchannel_id, self.session,
+                self.start, self.end)
+
+
+    def __eq__(self, other):
+        return isinstance(other, ChannelHandle) and self._key() == other._key()
+
+
+    def __hash__(self):
+        return hash(self._key())
+
+
+    def __repr__(self):
+        name = self.channel_id if self.subchannel_id is None else f"{self.channel_id}.{self.subchannel_id}"
+        window = ""
+        if self.start is not None or self.end is not None:
+            window = f" [{self.start}:{self.end}]"
+        return f"<{type(self).__name__} {name}{window} of {self.source!r}>"
+
+
+    @contextmanager
+    def _open(self):
+        """ Use the handle's file, opening it if not already open in this
+            process (see `endaq.ide.lazy.close_files()`).
+
+            :return: A context manager producing the `Dataset`, its
+                `BlockIndex`, and the handle's `Channel` or `SubChannel`.
+        """
+        url = "://" in self.source and not os.path.isfile(self.source)
+        source = self.source if url else (self.source, os.stat(self.source).st_mtime_ns)
+        with _open_file(source) as (doc, index):
+            if not url:
+                index.update()
+            if self.session is not None and doc.lastSession.sessionId != self.session:
+                raise ValueError(f"{self.source} has no session {self.session}")
+
+            channel = doc.channels[self.channel_id]
+            if self.subchannel_id is not None:
+                channel = channel[self.subchannel_id]
+            yield doc, index, channel
+
+
+    def load(self):
+        """ Get the handle's `Channel` or `SubChannel`, reopening the file
+            (if not already open in this process). No data is decoded. The
+            file may later be closed (see `endaq.ide.lazy.close_files()`);
+            use `to_numpy()` or `to_pandas()` to read the data.
+        """
+        with self._open() as (_doc, _index, channel):
+            return channel
+
+
+    def _read(self, raw=False):
+        """ Read the handle's data, with the file open once.
+
+            :return: The `Channel` or `SubChannel`, an array of sample
+                times, and a 2D array of values (see `to_numpy()`).
+        """
+        with self._open() as (doc, index, channel):
+            session_start = None
+            if doc.lastSession.utcStartTime:
+                session_start = datetime.datetime.utcfromtimestamp(doc.lastSession.utcStartTime)
+            start = parse_time(self.start, session_start)
+            end = parse_time(self.end, session_start)
+
+            t, values = index.read(channel, index.find(self.channel_id, start, end), raw=raw)
+
+        if start is not None or end is not None:
+            keep = np.ones(len(t), dtype=bool)
+            if start is not None:
+                keep &= t >= start
+            if end is not None:
+                keep &= t < end
+            t, values = t[keep], values[:, keep]
+        return channel, t, values.T
+
+
+    def to_numpy(self, raw=False):
+        """ Read the handle's data into NumPy arrays. Only the blocks in the
+            handle's interval are decoded.
+
+            :param raw: If `True`, get the raw (uncalibrated) values.
+            :return: An array of sample times (microseconds relative to the
+                start of the recording), and a 2D array of values with one
+                column per subchannel.
+        """
+        _channel, t, values = self._read(raw=raw)
+        return t, values
+
+
+    def to_pandas(self, time_mode="datetime", raw=False):
+        """ Read the handle's data into a pandas DataFrame, like
+            `to_pandas()`. Only the blocks in the handle's interval are
+            decoded.
+
+            :param time_mode: How to temporally index samples (see
+                `to_pandas()`).
+            :param raw: If `True`, get the raw (uncalibrated) values. The
+                calibration is stored in the DataFrame's `attrs`, under the
+                key ``"calibration"``.
+            :return: a `pandas.DataFrame` containing the channel's data
+        """
+        from .info import _make_frame, get_calibration
+
+        channel, t, values = self._read(raw=raw)
+        df = _make_frame(channel, t, values, time_mode)
+        if raw:
+            df.attrs['calibration'] = get_calibration(channel)
+        return df
+
+
+def get_channel_handles(dataset, measurement_type=ANY, subchannels=True, start=None, end=None):
+    """ Get picklable handles for the channels of a given type in a
+        `Dataset`, like `get_channels()`, for processing in other processes.
+
+        :param dataset: A `Dataset`, read from a local file or URL (it does
+            not have to be imported).
+        :param measurement_type: A `MeasurementType`, a measurement type
+            'key' string, or a string of multiple keys generated by adding
+            and/or subtracting `MeasurementType` objects to filter the
+            channels.
+        :param subchannels: If `False`, get handles for the parent channels
+            instead of their subchannels.
+        :param start: The start of the handles' interval, in any of the
+            forms accepted by `get_doc()`. Defaults to the start of the
+            recording.
+        :param end: The end of the handles' interval. Defaults to the end of
+            the recording.
+        :return: A list of `ChannelHandle` objects.
+    """
+    return [ChannelHandle.from_channel(ch, start=start, end=end)
+            for ch in get_channels(dataset, measurement_type, subchannels=subchannels)]
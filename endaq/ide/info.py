@@ -6,91 +6,30 @@ import typing
 
 from collections import defaultdict
 import datetime
-import string
+from functools import partial
+import os
 import warnings
 
 import numpy as np
+from numpy.lib import recfunctions as np_recfunctions
 import pandas as pd
 import idelib
 
+from .blocks import BlockIndex, _parent
 from .measurement import ANY, get_channels
+from .profiling import section, timed
+from .util import parse_time
 
 
 __all__ = [
+    "get_calibration",
     "get_channel_table",
+    "get_channel_tables",
+    "to_numpy",
     "to_pandas",
 ]
 
 
-# ============================================================================
-# Display formatting functions
-# ============================================================================
-
-def parse_time(t, datetime_start=None):
-    """ Convert a time in one of several user-friendly forms to microseconds
-        (the native time units used in `idelib`). Valid types are:
-
-        * `None`, `int`, or `float` (returns the same value)
-        * `str` (formatted as a time, e.g., `MM:SS`, `HH:MM:SS`,
-          `DDd HH:MM:SS`). More examples:
-
-            * ``":01"`` or ``":1"`` or ``"1s"`` (1 second)
-            * ``"22:11"`` (22 minutes, 11 seconds)
-            * ``"3:22:11"`` (3 hours, 22 minutes, 11 seconds)
-            * ``"1d 3:22:11"`` (3 hours, 22 minutes, 11 seconds)
-        * `datetime.timedelta` or `pandas.Timedelta`
-        * `datetime.datetime`
-
-        :param t: The time value to convert.
-        :param datetime_start: If `t` is a `datetime` object, the result will
-            be relative to `datetime_start`. It will default to the start of
-            the day portion of `t`. This has no effect on non-`datetime`
-            values of `t` .
-        :returns: The time in microseconds.
-    """
-    # TODO: Put this somewhere else? It will be useful elsewhere, and shouldn't
-    #   be bound to the `pandas` requirement in this module.
-
-    if t is None or isinstance(t, (int, float)):
-        return t
-
-    elif isinstance(t, str):
-        if not t:
-            return None
-        orig = t
-        t = t.strip().lower()
-        for c in ":dhms":
-            t = t.replace(c, ' ')
-        if not all(c in string.digits + ' ' for c in t):
-            raise ValueError(f"Bad time string for parse_time(): {orig!r}")
-
-        micros = 0
-        for part, mult in zip(reversed(t.split()), (1, 60, 3600, 86400)):
-            if not part:
-                continue
-            part = part.strip(string.ascii_letters + string.punctuation + string.whitespace)
-            micros += float(part) * mult
-        return micros * 10**6
-
-    elif isinstance(t, datetime.timedelta):
-        return t.total_seconds() * 10**6
-
-    elif isinstance(t, (datetime.time, datetime.datetime)):
-        if datetime_start is None:
-            # No starting time, assume midnight of same day.
-            datetime_start = datetime.datetime(t.year, t.month, t.day)
-
-        if isinstance(t, datetime.time):
-            # just time: make datetime
-            t = datetime.datetime.combine(datetime_start, t)
-
-        if isinstance(t, datetime.datetime):
-            # datetime: make timedelta
-            return (t - datetime_start).total_seconds() * 10**6
-
-    raise TypeError(f"Unsupported type for parse_time(): {type(t).__name__} ({t!r})")
-
-
 # ============================================================================
 # Display formatting functions
 # ============================================================================
@@ -144,6 +83,46 @@ def format_timedelta(val):
         return str(val)
 
 
+def _format_timedeltas(values):
+    """ Format an array of microsecond times like `format_timedelta()`,
+        vectorized. Values that aren't finite numbers are formatted
+        individually by `format_timedelta()`.
+
+        :param values: A sequence of times, in microseconds.
+        :return: A list of formatted strings.
+    """
+    values = np.asarray(values, dtype=object)
+    result = [None] * len(values)
+    numeric = np.array([isinstance(v, (int, float, np.number)) and not isinstance(v, bool)
+                        for v in values], dtype=bool)
+    if numeric.any():
+        t = values[numeric].astype(np.float64)
+        finite = np.isfinite(t)
+        numeric[numeric] = finite
+        ns = np.round(t[finite] * 1000).astype(np.int64)
+
+        # Floor division, like `pandas.Timedelta.components`
+        days, ns = np.divmod(ns, 86400 * 10**9)
+        hours, ns = np.divmod(ns, 3600 * 10**9)
+        minutes, ns = np.divmod(ns, 60 * 10**9)
+        seconds, ns = np.divmod(ns, 10**9)
+        millis = ns // 10**6
+
+        for i, d, h, m, sec, ms in zip(np.flatnonzero(numeric).tolist(), days.tolist(),
+                                       hours.tolist(), minutes.tolist(), seconds.tolist(),
+                                       millis.tolist()):
+            text = f"{m:02d}:{sec:02d}.{ms:04d}"
+            if h or d:
+                text = f"{h:02d}:{text}"
+                if d:
+                    text = f"{d}d {text}"
+            result[i] = text
+
+    for i in np.flatnonzero(~numeric).tolist():
+        result[i] = format_timedelta(values[i])
+    return result
+
+
 def format_timestamp(ts):
     """ Function for formatting start/end timestamps. Somewhat more condensed
         than the standard Pandas formatting.
@@ -173,9 +152,191 @@ TABLE_FORMAT = {
 }
 
 
+def _is_parsed(doc):
+    """ Check if a `Dataset`'s data has been imported. `get_doc()` records
+        this explicitly, since an import restricted to some channels or to
+        a time window can leave channels without data; for a `Dataset`
+        opened by other means, any imported data is taken as a sign.
+    """
+    parsed = getattr(doc, '_endaq_parsed', None)
+    if parsed is None:
+        return any(len(ch.getSession()) for ch in doc.channels.values())
+    return parsed
+
+
+def _get_cache(channel):
+    """ Get the data cache (see `endaq.ide.cache`) for a `Channel` or
+        `SubChannel` whose data has not been imported, if one exists.
+    """
+    if _is_parsed(channel.dataset):
+        return None
+    from .cache import get_cache
+    cache = get_cache(channel.dataset)
+    if cache is not None and _parent(channel).id in cache:
+        return cache
+    return None
+
+
+def _get_range_indices(times, start, end, single=False):
+    """ Get the first and last indices of sample times within an interval,
+        like `idelib.dataset.EventArray.getRangeIndices()`.
+
+        :param times: The sample times.
+        :param start: The start of the interval, or `None`.
+        :param end: The end of the interval, or `None`.
+        :param single: `True` if the data has one sample per block.
+    """
+    if single:
+        def block_index(t, first=0):
+            if t is None or t < times[0]:
+                return 0
+            elif t > times[-1]:
+                return len(times)
+            first = max(first, 1)
+            return first - 1 + int(np.searchsorted(times[first:], t, side='right'))
+
+        start_idx = block_index(start)
+        end_idx = len(times) if end is None else block_index(end, start_idx) + 1
+        return start_idx, end_idx
+
+    if start is None or start <= times[0]:
+        start_idx = 0
+    else:
+        start_idx = int(np.searchsorted(times, start, side='right'))
+    if end is None:
+        end_idx = len(times)
+    else:
+        end_idx = int(np.searchsorted(times, end, side='left'))
+    return max(0, start_idx), min(end_idx, len(times))
+
+
+def _channel_timing(source, session, start, end, index=None):
+    """ Get the timing of a `Channel` or `SubChannel`'s data within an
+        interval, for the channel table. The data comes from the imported
+        data, the cache (see `build_cache()`), or a `BlockIndex`.
+
+        :param source: The `Channel` or `SubChannel`.
+        :param session: The session ID, or `None` for the last session.
+        :param start: The start of the interval (microseconds), or `None`.
+        :param end: The end of the interval (microseconds), or `None`.
+        :param index: A `BlockIndex` of the file, used if the data has not
+            been imported and is not cached.
+        :return: The start, end, and duration of the data in the interval
+            (microseconds), the number of samples, and the sample rate.
+    """
+    range_start = range_end = duration = rate = None
+    samples = 0
+
+    data = source.getSession(session)
+
+    # Channels without imported data may have cached data (see `build_cache()`)
+    blocks = None
+    cache = None if session else _get_cache(source)
+    if cache is not None:
+        blocks = cache.blocks(_parent(source).id)
+    elif index is not None and not session and not _is_parsed(source.dataset):
+        blocks = index[_parent(source).id]
+
+    if blocks is not None:
+        data = BlockIndex.get_times(blocks)
+        get_range = partial(_get_range_indices, data, single=(blocks['samples'] == 1).all())
+        get_time = data.__getitem__
+    else:
+        get_range, get_time = data.getRangeIndices, lambda idx: data[idx][0]
+
+    if len(data):
+        if not start and not end:
+            start_idx, end_idx = 0, -1
+            samples = len(data)
+        else:
+            start_idx, end_idx = get_range(start, end)
+            end_idx = min(len(data) - 1, end_idx)
+            if end_idx < 0:
+                samples = len(data) - start_idx - 1
+            else:
+                samples = end_idx - start_idx
+
+        range_start = get_time(int(start_idx))
+        range_end = get_time(int(end_idx))
+        duration = range_end - range_start
+        rate = samples / (duration / 10 ** 6)
+
+    return range_start, range_end, duration, samples, rate
+
+
+def _channel_table_rows(sources, start=0, end=None, session=None, stats=False,
+                        index=None, result=None):
+    """ Generate the rows of a channel table. Used internally by
+        `get_channel_table()` and `get_channel_tables()`.
+
+        :param sources: The `Channel` and/or `SubChannel` objects.
+        :param index: A `BlockIndex`, for channels without imported data.
+        :param result: A dictionary of column lists to which to add the
+            rows. A new one is created if not provided.
+        :return: A dictionary of column lists.
+    """
+    if result is None:
+        result = defaultdict(list)
+
+    # Subchannels of the same channel share timing; compute it once.
+    timing = {}
+    for source in sources:
+        key = (_parent(source).id, _parent(source).dataset)
+        if key not in timing:
+            session_start = None
+            utc_start = source.getSession(session).session.utcStartTime
+            if utc_start:
+                session_start = datetime.datetime.utcfromtimestamp(utc_start)
+            timing[key] = _channel_timing(source, session,
+                                          parse_time(start, session_start),
+                                          parse_time(end, session_start),
+                                          index=index)
+        range_start, range_end, duration, samples, rate = timing[key]
+
+        result['channel'].append(source)
+        result['name'].append(source.name)
+        result['type'].append(source.units[0])
+        result['units'].append(source.units[1])
+        result['start'].append(range_start)
+        result['end'].append(range_end)
+        result['duration'].append(duration)
+        result['samples'].append(samples)
+        result['rate'].append(rate)
+
+        if stats:
+            from .stats import get_stats
+            session_start = None
+            if source.dataset.lastSession.utcStartTime:
+                session_start = datetime.datetime.utcfromtimestamp(
+                    source.dataset.lastSession.utcStartTime)
+            row = get_stats(source.dataset).range(source, parse_time(start, session_start),
+                                                  parse_time(end, session_start))
+            # A `Channel` with several subchannels has no single min/mean/max
+            for col in ('min', 'mean', 'max'):
+                result[col].append(row[col].iloc[0] if len(row) == 1 else None)
+
+    return result
+
+
+def _channel_table_frame(result):
+    """ Build a plain, typed `pandas.DataFrame` from channel table rows:
+        channels as "channel.subchannel" strings, times (microseconds) and
+        rates as floats (NaN for channels without data), and sample counts
+        as integers.
+    """
+    df = pd.DataFrame(result)
+    df['channel'] = [format_channel_id(ch) for ch in df['channel']]
+    for col in ('start', 'end', 'duration', 'rate', 'min', 'mean', 'max'):
+        if col in df:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(np.float64)
+    df['samples'] = df['samples'].astype(np.int64)
+    return df
+
+
+@timed
 def get_channel_table(dataset, measurement_type=ANY, start=0, end=None,
                       formatting=None, index=True, precision=4,
-                      timestamps=False, **kwargs):
+                      timestamps=False, stats=False, as_frame=False, **kwargs):
     """ Get summary data for all `SubChannel` objects in a `Dataset` that
         contain one or more type of sensor data. By using the optional
         `start` and `end` parameters, information can be retrieved for a
@@ -213,7 +374,19 @@ def get_channel_table(dataset, measurement_type=ANY, start=0, end=None,
             changed later.
         :param timestamps: If `True`, show the start and end as raw
             microsecond timestamps.
-        :returns: A table (`pandas.io.formats.style.Styler`) of summary data.
+        :param stats: If `True`, include the minimum, mean, and maximum of
+            each subchannel's data in the interval. These are computed from
+            cached per-block statistics (see `endaq.ide.stats`), so only the
+            data blocks at the ends of the interval are read.
+        :param as_frame: If `True`, return a plain `pandas.DataFrame`
+            instead of a styled table, with the channels as
+            "channel.subchannel" strings, times in microseconds, and typed
+            (`float64`/`int64`) numeric columns. Much faster to produce than
+            a styled table, for many channels or many files (see also
+            `get_channel_tables()`). `formatting`, `index`, `precision`, and
+            `timestamps` are ignored.
+        :returns: A table (`pandas.io.formats.style.Styler`) of summary data,
+            or a `pandas.DataFrame` if `as_frame` is `True`.
         :rtype: pandas.DataFrame
     """
     # We don't support multiple sessions on current Slam Stick/enDAQ recorders,
@@ -230,54 +403,19 @@ def get_channel_table(dataset, measurement_type=ANY, start=0, end=None,
     else:
         sources = dataset
 
-    result = defaultdict(list)
-    for source in sources:
-        range_start = range_end = duration = rate = session_start = None
-        samples = 0
-
-        data = source.getSession(session)
-        if data.session.utcStartTime:
-            session_start = datetime.datetime.utcfromtimestamp(data.session.utcStartTime)
-        start = parse_time(start, session_start)
-        end = parse_time(end, session_start)
-
-        if len(data):
-            if not start and not end:
-                start_idx, end_idx = 0, -1
-                samples = len(data)
-            else:
-                start_idx, end_idx = data.getRangeIndices(start, end)
-                end_idx = min(len(data) - 1, end_idx)
-                if end_idx < 0:
-                    samples = len(data) - start_idx - 1
-                else:
-                    samples = end_idx - start_idx
-
-            range_start = data[int(start_idx)][0]
-            range_end = data[int(end_idx)][0]
-            duration = range_end - range_start
-            rate = samples / (duration / 10 ** 6)
-
-        result['channel'].append(source)
-        result['name'].append(source.name)
-        result['type'].append(source.units[0])
-        result['units'].append(source.units[1])
-        result['start'].append(range_start)
-        result['end'].append(range_end)
-        result['duration'].append(duration)
-        result['samples'].append(samples)
-        result['rate'].append(rate)
+    result = _channel_table_rows(sources, start, end, session=session, stats=stats)
 
-        # # TODO: RESTORE AFTER FIX IN idelib
-        # dmin, dmean, dmax = data.getRangeMinMeanMax(start, end)
-        # result['min'].append(dmin)
-        # result['mean'].append(dmean)
-        # result['max'].append(dmax)
+    if as_frame:
+        return _channel_table_frame(result)
 
     if formatting is False:
         return pd.DataFrame(result).style
 
+    # Times are formatted in bulk, then looked up as each cell is rendered
     style = TABLE_FORMAT.copy()
+    for col in ('start', 'end', 'duration'):
+        formatted = dict(zip(result[col], _format_timedeltas(result[col])))
+        style[col] = partial(_lookup_format, formatted, format_timedelta)
     if timestamps:
         style.update({
             'start': format_timestamp,
@@ -293,9 +431,252 @@ def get_channel_table(dataset, measurement_type=ANY, start=0, end=None,
         return styled
 
 
+def _lookup_format(formatted, formatter, value):
+    """ Get a value's pre-formatted string, formatting it individually if it
+        wasn't pre-formatted. Used by `get_channel_table()`.
+    """
+    try:
+        return formatted[value]
+    except (KeyError, TypeError):
+        return formatter(value)
+
+
+@timed
+def get_channel_tables(sources, measurement_type=ANY, start=0, end=None, stats=False):
+    """ Get summary data for the subchannels in several recordings, as one
+        combined `pandas.DataFrame` (like ``get_channel_table(...,
+        as_frame=True)``), with the name of each row's file in an additional
+        ``path`` column. Recordings given as filenames are not imported;
+        their channels' timing is read from their data block headers (see
+        `endaq.ide.blocks`).
+
+        The `start` and `end` times may be specified in any of the forms
+        accepted by `get_channel_table()`, relative to each recording's
+        start.
+
+        :param sources: A list of `Dataset` objects and/or IDE filenames.
+        :param measurement_type: A `MeasurementType`, a measurement type
+            'key' string, or a string of multiple keys generated by adding
+            and/or subtracting `MeasurementType` objects to filter the
+            results. Any 'subtracted' types will be excluded.
+        :param start: The starting time. Defaults to the start of each
+            recording.
+        :param end: The ending time. Defaults to the end of each recording.
+        :param stats: If `True`, include the minimum, mean, and maximum of
+            each subchannel's data in the interval (see
+            `get_channel_table()`).
+        :return: A `pandas.DataFrame` of summary data, one row per
+            subchannel per recording.
+    """
+    from .files import get_doc
+
+    result = defaultdict(list)
+    for source in sources:
+        if isinstance(source, (str, os.PathLike)):
+            doc = get_doc(os.fspath(source), parsed=False)
+            opened = True
+        else:
+            doc = source
+            opened = False
+
+        try:
+            # Recordings without imported data are timed using their blocks
+            index = None
+            if not _is_parsed(doc):
+                index = BlockIndex(doc)
+
+            rows = len(result['channel'])
+            _channel_table_rows(get_channels(doc, measurement_type), start, end,
+                                stats=stats, index=index, result=result)
+            path = os.fspath(source) if opened else doc.filename
+            result['path'].extend([path] * (len(result['channel']) - rows))
+        finally:
+            if opened:
+                doc.close()
+
+    if not result:
+        return pd.DataFrame(columns=['path', 'channel', 'name', 'type', 'units', 'start',
+                                     'end', 'duration', 'samples', 'rate'])
+
+    path = result.pop('path')
+    df = _channel_table_frame(result)
+    df.insert(0, 'path', path)
+    return df
+
+
+def get_calibration(
+    channel: typing.Union[idelib.dataset.Channel, idelib.dataset.SubChannel],
+) -> dict:
+    """ Get the calibration of a channel's data: the transforms that
+        convert raw values (e.g., ADC counts, as returned by
+        ``to_pandas(channel, raw=True)``) to calibrated values.
+
+        :param channel: a `Channel` or `SubChannel` object
+        :return: a dictionary, keyed by subchannel name, of dictionaries
+            with the keys ``coefficients`` (for linear calibration,
+            ``(a, b)`` where ``value = a * raw + b``; for bivariate
+            calibration, ``(a, b, c, d)`` where
+            ``value = (a * y + b) * raw + c * y + d``, or `None` if the
+            calibration has no simple form), ``reference`` (the channel and
+            subchannel IDs of bivariate calibration's secondary input
+            ``y``, or `None`), and ``transform`` (a description of the
+            transform).
+    """
+    polys = channel.getSession()._fullXform.polys
+    if hasattr(channel, "subchannels"):
+        subchannels = channel.subchannels
+    else:
+        subchannels = [channel]
+
+    result = {}
+    for sch in subchannels:
+        poly = polys[sch.id]
+        coeffs = getattr(poly, '_fastCoeffs', None)
+        reference = None
+        if getattr(poly, '_noY', None) is False:
+            reference = (poly.channelId, poly.subchannelId)
+        result[sch.name] = {
+            'coefficients': tuple(coeffs) if coeffs else None,
+            'reference': reference,
+            'transform': str(poly),
+        }
+    return result
+
+
+def _session_times(session):
+    """ Generate the timestamps of all of an `EventArray`'s samples. This
+        produces the same values as `EventArray._inplaceTime()`, vectorized
+        over all blocks.
+    """
+    blocks = session._data
+    entries = np.empty(len(blocks), dtype=[('start', np.float64), ('end', np.float64),
+                                           ('samples', np.int64)])
+    entries['start'] = [d.startTime for d in blocks]
+    entries['end'] = [d.endTime for d in blocks]
+    entries['samples'] = [d.numSamples for d in blocks]
+    return BlockIndex.get_times(entries)
+
+
+""" The number of samples converted at once when reading a channel with
+    non-linear calibration as a type other than float64 (see `to_numpy()`).
+"""
+CALIBRATION_CHUNK = 2**16
+
+
+def _read_channel(channel, raw=False, dtype=None):
+    """ Read all of a channel's data, from the imported data or the cache.
+
+        :param channel: a `Channel` or `SubChannel` object
+        :param raw: If `True`, get the raw values, without calibration.
+        :param dtype: The NumPy dtype of the values. Defaults to the raw
+            data's type if `raw`, otherwise `float64`.
+        :return: An array of times (microseconds), and a 2D array of
+            values, one row per subchannel.
+    """
+    cache = _get_cache(channel)
+    if cache is not None:
+        with section("endaq.ide.cache.DataCache.read") as sect:
+            t, data = cache.read(channel, raw=raw, dtype=dtype)
+            sect.nbytes = data.nbytes
+        return t, data
+
+    session = channel.getSession()
+    if not len(session):
+        # idelib can't slice a channel with no imported data
+        rows = len(channel.subchannels) if hasattr(channel, "subchannels") else 1
+        if dtype is None:
+            dtype = np.float64
+            if raw:
+                dtype = session._npType[0] if session._npType.names else session._npType
+        return np.empty(0), np.empty((rows, 0), dtype=dtype)
+
+    calibration = None
+    if not raw and dtype is not None:
+        calibration = [cal['coefficients'] for cal in get_calibration(channel).values()]
+        if not all(coeffs and len(coeffs) == 2 for coeffs in calibration):
+            calibration = None
+
+    if not raw and calibration is None and dtype is None:
+        with section("idelib.dataset.EventArray.arraySlice") as sect:
+            data = session.arraySlice()
+            sect.nbytes = data.nbytes
+        return data[0], data[1:]
+
+    if not raw and calibration is None:
+        # Other calibration (e.g., bivariate) is applied by idelib, which
+        # produces float64; convert it a chunk at a time, so the whole
+        # channel is never held as float64 as well as `dtype`.
+        with section("idelib.dataset.EventArray.arraySlice") as sect:
+            t = np.empty(len(session))
+            out = None
+            for first in range(0, len(session), CALIBRATION_CHUNK):
+                chunk = session.arraySlice(first, first + CALIBRATION_CHUNK)
+                if out is None:
+                    out = np.empty((len(chunk) - 1, len(session)), dtype=dtype)
+                last = first + chunk.shape[1]
+                t[first:last] = chunk[0]
+                out[:, first:last] = chunk[1:]
+            sect.nbytes = t.nbytes + out.nbytes
+        return t, out
+
+    with section("idelib.dataset.EventArray._accessCache") as sect:
+        data = session._accessCache(0, len(session), 1)
+        if data.dtype.names:
+            data = np_recfunctions.structured_to_unstructured(data).T
+        else:
+            data = data.reshape(1, -1)
+        sect.nbytes = data.nbytes
+    with section("endaq.ide.info.times"):
+        t = _session_times(session) if len(session) else np.empty(0)
+
+    if raw:
+        if dtype is not None:
+            data = data.astype(dtype, copy=False)
+        return t, data
+
+    # Linear calibration, applied directly into an array of the final type
+    with section("endaq.ide.info.calibrate") as sect:
+        out = np.empty(data.shape, dtype=dtype)
+        for values, row, (a, b) in zip(data, out, calibration):
+            np.multiply(values, np.float64(a), out=row, casting='unsafe')
+            row += b
+        sect.nbytes = out.nbytes
+    return t, out
+
+
+@timed(nbytes=lambda result: result[0].nbytes + result[1].nbytes)
+def to_numpy(
+    channel: typing.Union[idelib.dataset.Channel, idelib.dataset.SubChannel],
+    raw: bool = False,
+    dtype: typing.Optional[np.typing.DTypeLike] = None,
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """ Read IDE data into NumPy arrays, without the overhead of building a
+        `pandas.DataFrame`.
+
+        :param channel: a `Channel` or `SubChannel` object, as produced from
+            `Dataset.channels` or `endaq.ide.get_channels`
+        :param raw: if `True`, get the raw values (e.g., ADC counts) in their
+            native integer or float type, without applying calibration. The
+            calibration can be retrieved with `get_calibration()`.
+        :param dtype: the NumPy dtype of the values, e.g., `numpy.float32`
+            to halve the memory used. Linear calibration is applied directly
+            into an array of this type; other calibration is computed as
+            `float64` and converted, `CALIBRATION_CHUNK` samples at a time.
+            Defaults to `float64` (or the raw data's native type, if `raw`).
+        :return: an array of sample times (microseconds relative to the
+            start of the recording), and a 2D array of values with one column
+            per subchannel
+    """
+    t, data = _read_channel(channel, raw=raw, dtype=dtype)
+    return t, data.T
+
+
+@timed(nbytes=lambda result: result.memory_usage().sum())
 def to_pandas(
     channel: typing.Union[idelib.dataset.Channel, idelib.dataset.SubChannel],
     time_mode: typing.Literal["seconds", "timedelta", "datetime"] = "datetime",
+    raw: bool = False,
+    dtype: typing.Optional[np.typing.DTypeLike] = None,
 ) -> pd.DataFrame:
     """ Read IDE data into a pandas DataFrame.
 
@@ -307,22 +688,73 @@ def to_pandas(
             - "seconds" - a `pandas.Float64Index` of relative timestamps, in seconds
             - "timedelta" - a `pandas.TimeDeltaIndex` of relative timestamps
             - "datetime" - a `pandas.DateTimeIndex` of absolute timestamps
+        :kwarg raw: if `True`, get the raw values (e.g., ADC counts) in their
+            native integer or float type, without applying calibration. The
+            calibration (see `get_calibration()`) is stored in the
+            DataFrame's `attrs`, under the key ``"calibration"``.
+        :kwarg dtype: the NumPy dtype of the data, e.g., `numpy.float32` to
+            halve the memory used. Linear calibration is applied directly
+            into an array of this type; other calibration is computed as
+            `float64` and converted, `CALIBRATION_CHUNK` samples at a time.
+            The time index is unaffected. Defaults to `float64` (or the raw
+            data's native type, if `raw`).
         :return: a `pandas.DataFrame` containing the channel's data
     """
-    data = channel.getSession().arraySlice()
-    t, data = data[0], data[1:].T
-
+    t, data = _read_channel(channel, raw=raw, dtype=dtype)
+    df = _make_frame(channel, t, data.T, time_mode)
+    if raw:
+        df.attrs['calibration'] = get_calibration(channel)
+    return df
+
+
+def _time_index(t, time_mode, utc_start=None):
+    """ Convert sample times to the values of a time index, as used by
+        `to_pandas()` and other functions that produce time-indexed data.
+
+        :param t: An array of sample times, in microseconds.
+        :param time_mode: How to temporally index samples (see
+            `to_pandas()`).
+        :param utc_start: The epoch timestamp corresponding to time 0, for
+            "datetime" indices.
+        :return: An array of index values.
+    """
     t = (1e3*t).astype("timedelta64[ns]")
     if time_mode == "seconds":
-        t = t / np.timedelta64(1, "s")
+        return t / np.timedelta64(1, "s")
     elif time_mode == "datetime":
-        t = t + np.datetime64(channel.dataset.lastUtcTime, "s")
+        return t + np.datetime64(utc_start, "s")
     elif time_mode != "timedelta":
         raise ValueError(f'invalid time mode "{time_mode}"')
-    
-    if hasattr(channel, "subchannels"):
-        columns = [sch.name for sch in channel.subchannels]
-    else:
-        columns = [channel.name]
+    return t
+
+
+def _make_frame(channel, t, data, time_mode="datetime", utc_start=None, columns=None):
+    """ Build a `pandas.DataFrame` of channel data, indexed by time. Used
+        internally by `to_pandas()` and other functions that produce
+        `DataFrame` objects from decoded IDE data.
+
+        :param channel: The `Channel` or `SubChannel` that produced the data.
+        :param t: An array of sample times, in microseconds.
+        :param data: A 2D array of values, one column per subchannel.
+        :param time_mode: How to temporally index samples (see
+            `to_pandas()`).
+        :param utc_start: The recording's start time, as an epoch
+            timestamp, for "datetime" indices. Defaults to the `Dataset`'s
+            `lastUtcTime`.
+        :param columns: The column names. Defaults to the names of the
+            channel's subchannels.
+        :return: a `pandas.DataFrame` containing the channel's data
+    """
+    if utc_start is None and time_mode == "datetime":
+        utc_start = channel.dataset.lastUtcTime
+    with section("endaq.ide.info.timestamps", nbytes=t.nbytes):
+        t = _time_index(t, time_mode, utc_start)
+
+    if columns is None:
+        if hasattr(channel, "subchannels"):
+            columns = [sch.name for sch in channel.subchannels]
+        else:
+            columns = [channel.name]
 
-    return pd.DataFrame(data, index=pd.Series(t, name="timestamp"), columns=columns)
+    with section("pandas.DataFrame", nbytes=data.nbytes):
+        return pd.DataFrame(data, index=pd.Series(t, name="timestamp"), columns=columns)
@@ -0,0 +1,299 @@
+"""
+integrity.py: Fast integrity checking of IDE recordings.
+
+A check walks every element in a file, reading only the element headers and
+the timestamps of data blocks (payloads are not decoded), so a whole file is
+checked in a fraction of the time it takes to import it. It finds:
+
+* Truncation (a final element extending past the end of the file)
+* Unknown or malformed elements, and data for undefined channels
+* Timestamp gaps and rollbacks in each channel's data
+* Sample rate drift (blocks whose sample rate differs from the channel's
+  typical rate)
+
+Many files can be checked in parallel::
+
+    reports = check_files(["recordings/"], workers=8)
+    damaged = [r.path for r in reports if not r.ok]
+"""
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import numpy as np
+import pandas as pd
+from idelib.importer import openFile
+
+from .blocks import BlockIndex
+from .util import expand_paths, validate, walk_elements
+
+__all__ = ['IntegrityReport', 'check_file', 'check_files']
+
+
+# ============================================================================
+#
+# ============================================================================
+
+""" The columns of `IntegrityReport.issues`. """
+ISSUE_COLUMNS = ['kind', 'offset', 'channel', 'time', 'detail']
+
+""" The columns of `IntegrityReport.channels`. """
+CHANNEL_COLUMNS = ['channel', 'blocks', 'samples', 'start', 'end', 'rate',
+                   'min_rate', 'max_rate', 'gaps', 'rollbacks']
+
+
+class IntegrityReport:
+    """ The results of checking an IDE file's integrity (see
+        `check_file()`).
+
+        :ivar path: The file's name (if checked from a file).
+        :ivar size: The size of the file, in bytes.
+        :ivar valid: `False` if the file could not be read as an IDE file
+            at all.
+        :ivar truncated: `True` if the file ends with an incomplete element.
+        :ivar elements: The number of complete elements in the file.
+        :ivar issues: A `pandas.DataFrame` of problems found, one per row,
+            with the columns ``kind``, ``offset`` (the element's position in
+            the file), ``channel``, ``time`` (microseconds, for timing
+            problems), and ``detail``.
+        :ivar channels: A `pandas.DataFrame` summarizing each channel's
+            data: the numbers of blocks and samples, start and end times
+            (microseconds), median, minimum and maximum block sample rates
+            (Hz), and the numbers of gaps and rollbacks.
+    """
+
+    def __init__(self, path=None, size=0):
+        self.path = path
+        self.size = size
+        self.valid = True
+        self.truncated = False
+        self.elements = 0
+        self.issues = pd.DataFrame(columns=ISSUE_COLUMNS)
+        self.channels = pd.DataFrame(columns=CHANNEL_COLUMNS)
+
+
+    def __repr__(self):
+        state = "OK" if self.ok else f"{len(self.issues)} issue(s)"
+        return f"<{type(self).__name__} {self.path or '(stream)'}: {state}>"
+
+
+    @property
+    def ok(self):
+        """ `True` if no problems were found. """
+        return self.valid and not self.truncated and not len(self.issues)
+
+
+def _check_timing(chid, entries, modulus, gap_factor, drift, issues):
+    """ Check one channel's block timestamps for gaps, rollbacks, and rate
+        drift.
+
+        :param chid: The channel ID.
+        :param entries: The channel's blocks: a structured array with the
+            fields ``offset``, ``start``, ``end``, ``samples``, and
+            ``wrapped`` (`True` if the block's timestamp was corrected for
+            timer rollover).
+        :param modulus: The channel's timer rollover period (microseconds).
+        :param issues: A list to which problems are added.
+        :return: A dictionary summarizing the channel (see
+            `CHANNEL_COLUMNS`).
+    """
+    starts = entries['start']
+    ends = entries['end']
+    samples = entries['samples']
+
+    # Block sample rates: within multi-sample blocks, or between
+    # single-sample blocks.
+    multi = (samples > 1) & (ends > starts)
+    if multi.any():
+        rates = (samples[multi] - 1) / (ends[multi] - starts[multi]) * 10**6
+        rate_offsets = entries['offset'][multi]
+        rate_times = starts[multi]
+    else:
+        # The final sample is usually recorded early, when recording stops,
+        # so the interval before it isn't a measure of the rate.
+        spans = np.diff(starts[:-1])
+        valid = spans > 0
+        rates = 10**6 / spans[valid]
+        rate_offsets = entries['offset'][1:-1][valid]
+        rate_times = starts[1:-1][valid]
+
+    rate = float(np.median(rates)) if len(rates) else None
+    summary = {
+        'channel': chid,
+        'blocks': len(entries),
+        'samples': int(samples.sum()),
+        'start': float(starts[0]) if len(entries) else None,
+        'end': float(ends[-1]) if len(entries) else None,
+        'rate': rate,
+        'min_rate': float(rates.min()) if len(rates) else None,
+        'max_rate': float(rates.max()) if len(rates) else None,
+        'gaps': 0,
+        'rollbacks': 0,
+    }
+
+    # Rollbacks: a block starting before the previous block started. With
+    # modulo timestamps, this looks like a rollover followed by a jump of
+    # most of the rollover period.
+    between = starts[1:] - ends[:-1]
+    backwards = starts[:-1] - starts[1:]
+    wrapped = entries['wrapped'][1:] & (between > modulus / 2)
+    backwards[wrapped] = modulus - between[wrapped]
+    rollbacks = np.flatnonzero((backwards > 0) | wrapped) + 1
+    for i in rollbacks.tolist():
+        issues.append(('rollback', int(entries['offset'][i]), chid, float(starts[i]),
+                       f"block starts {backwards[i - 1]:.0f} us before the previous one"))
+    summary['rollbacks'] = len(rollbacks)
+
+    if not rate:
+        return summary
+
+    # Gaps: more time between blocks than `gap_factor` sample periods
+    period = 10**6 / rate
+    gaps = np.flatnonzero((between > gap_factor * period) & ~wrapped) + 1
+    for i in gaps.tolist():
+        issues.append(('gap', int(entries['offset'][i]), chid, float(ends[i - 1]),
+                       f"{between[i - 1] / 10**6:.6f} s without data"))
+    summary['gaps'] = len(gaps)
+
+    # Drift: blocks whose sample rate is off by more than `drift`
+    if drift:
+        deviation = np.abs(rates - rate) / rate
+        for i in np.flatnonzero(deviation > drift).tolist():
+            issues.append(('drift', int(rate_offsets[i]), chid, float(rate_times[i]),
+                           f"{rates[i]:.6g} Hz ({deviation[i]:.1%} from {rate:.6g} Hz)"))
+
+    return summary
+
+
+def check_file(source, gap_factor=10, drift=0.05):
+    """ Check the integrity of an IDE file. Every element's header is read,
+        but data payloads are not, so the check is much faster than
+        importing the file.
+
+        :param source: The name of an IDE file, or a file-like stream.
+        :param gap_factor: Time between a channel's consecutive blocks
+            longer than this many sample periods is reported as a gap.
+        :param drift: Blocks whose sample rate differs from their channel's
+            median rate by more than this fraction are reported as drift.
+            `0` or `None` disables the drift check.
+        :return: An `IntegrityReport`.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as stream:
+            report = check_file(stream, gap_factor=gap_factor, drift=drift)
+        report.path = os.fspath(source)
+        return report
+
+    stream = source
+    length = stream.seek(0, os.SEEK_END)
+    report = IntegrityReport(getattr(stream, 'name', None), length)
+    issues = []
+
+    def invalid(detail):
+        report.valid = False
+        report.issues = pd.DataFrame([('invalid', 0, None, None, detail)], columns=ISSUE_COLUMNS)
+        return report
+
+    stream.seek(0)
+    try:
+        if not validate(stream):
+            return invalid("not an IDE file")
+        doc = openFile(stream)
+    except Exception as err:
+        return invalid(f"could not read file header ({type(err).__name__}: {err})")
+
+    index = BlockIndex(doc, update=False)
+    known = doc.ebmldoc.schema.elements
+    blocks = {}
+    pos = 0  # The end of the last complete element
+
+    for eid, offset, payload, size in walk_elements(stream, 0):
+        if payload + size > length:
+            kind = 'truncated' if eid in known else 'corrupt'
+            issues.append((kind, offset, None, None,
+                           f"element 0x{eid:X} ends {payload + size - length} bytes "
+                           f"past the end of the file"))
+            report.truncated = True
+            break
+
+        report.elements += 1
+        pos = payload + size
+        if eid not in known:
+            issues.append(('unknown', offset, None, None, f"unknown element ID 0x{eid:X}"))
+            continue
+        if eid != BlockIndex.BLOCK_ID:
+            continue
+
+        try:
+            ch, size, start, end, wrapped = index.read_timing(offset)
+        except Exception as err:
+            issues.append(('malformed', offset, None, None, f"{type(err).__name__}: {err}"))
+            continue
+
+        if ch not in doc.channels:
+            issues.append(('unknown channel', offset, ch, None, f"data for undefined channel {ch}"))
+            continue
+        if start is None or size is None:
+            missing = "timestamp" if start is None else "payload"
+            issues.append(('malformed', offset, ch, None, f"block without a {missing}"))
+            continue
+
+        sample_size = doc.channels[ch].parser.size
+        if not size or size % sample_size:
+            issues.append(('malformed', offset, ch, None,
+                           f"payload of {size} bytes is not a whole number of "
+                           f"{sample_size} byte samples"))
+
+        blocks.setdefault(ch, []).append((offset, start, end, size // sample_size, wrapped))
+    else:
+        # A partial element header at the end is also truncation
+        if pos < length:
+            issues.append(('truncated', pos, None, None,
+                           f"{length - pos} bytes of incomplete element header"))
+            report.truncated = True
+
+    dtype = [('offset', np.int64), ('start', np.float64), ('end', np.float64),
+             ('samples', np.int64), ('wrapped', bool)]
+    channels = []
+    for chid in sorted(blocks):
+        entries = np.array(blocks[chid], dtype=dtype)
+        modulus = index.time_modulus(chid)
+        channels.append(_check_timing(chid, entries, modulus, gap_factor, drift, issues))
+
+    issues.sort(key=lambda issue: issue[1])
+    report.issues = pd.DataFrame(issues, columns=ISSUE_COLUMNS)
+    report.channels = pd.DataFrame(channels, columns=CHANNEL_COLUMNS)
+    return report
+
+
+def _check(path, kwargs):
+    """ Check one file, for `check_files()`. Runs in worker processes. """
+    try:
+        return check_file(path, **kwargs)
+    except Exception as err:
+        report = IntegrityReport(path)
+        report.valid = False
+        report.issues = pd.DataFrame([('invalid', 0, None, None, f"{type(err).__name__}: {err}")],
+                                     columns=ISSUE_COLUMNS)
+        return report
+
+
+def check_files(paths, workers=None, **kwargs):
+    """ Check the integrity of many IDE files, optionally in parallel.
+
+        :param paths: A list of IDE filenames, directories (which are
+            searched recursively for IDE files), and/or 'glob' patterns. A
+            single string is also accepted.
+        :param workers: The number of processes to use. If `None` or 1,
+            files are checked in this process.
+        :param kwargs: Keyword arguments for `check_file()`.
+        :return: A list of `IntegrityReport` objects, sorted by filename.
+    """
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    paths = expand_paths([os.fspath(p) for p in paths])
+
+    if workers and workers > 1 and len(paths) > 1:
+        chunksize = max(1, len(paths) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+            return list(executor.map(_check, paths, [kwargs] * len(paths), chunksize=chunksize))
+    return [_check(path, kwargs) for path in paths]
@@ -0,0 +1,337 @@
+"""
+lazy.py: Lazily-evaluated, chunked channel data, using `dask` arrays (and,
+optionally, `xarray`). Each chunk is one or more whole data blocks, read and
+decoded only when the chunk is computed, so operations like ``mean()`` or
+``map_blocks()`` can run out-of-core and in parallel without loading the
+whole recording (as `to_pandas()` does).
+
+These functions require the optional dependencies `dask` and `xarray`
+(``pip install endaq-ide[dask]``).
+
+Workers keep the files they read open, for reuse by later chunks; the least
+recently used are closed when more than `MAX_OPEN_FILES` are open (once no
+chunk is reading them), and `close_files()` closes all of them (e.g., before
+deleting or replacing a file).
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+import datetime
+import os
+import threading
+
+import numpy as np
+from numpy.lib import recfunctions as np_recfunctions
+
+from .blocks import BlockIndex, _parent, calibrate
+from .info import _time_index
+from .measurement import ANY, get_channels
+from .util import parse_time
+
+__all__ = ['close_files', 'to_dask', 'to_xarray']
+
+
+# ============================================================================
+#
+# ============================================================================
+
+""" The default (approximate) number of samples in each chunk. Chunks
+    contain whole blocks, so they are usually a little larger.
+"""
+CHUNK_SIZE = 2**18
+
+""" The maximum number of files kept open by the workers in each process. """
+MAX_OPEN_FILES = 8
+
+# Files opened by `_open_file()`, keyed by source (see `_open_file()`), from
+# least to most recently used.
+_OPEN_FILES = OrderedDict()
+_OPEN_FILES_LOCK = threading.Lock()
+
+
+def _import(name):
+    """ Import an optional dependency, with a helpful error if missing. """
+    import importlib
+    try:
+        return importlib.import_module(name)
+    except ImportError as err:
+        raise ImportError(f"{name} is required for lazy channel data "
+                          f"(pip install endaq-ide[dask])") from err
+
+
+class _OpenFile:
+    """ A file opened by `_open_file()`, and the number of its users. """
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.index = BlockIndex(doc, update=False)
+        self.users = 0
+        self.closing = False  # Close when the last user is done
+
+
+def _release(entry):
+    """ Close a file removed from `_OPEN_FILES`, now or (if it is in use)
+        when its last user is done. Call with the lock held.
+    """
+    entry.closing = True
+    if not entry.users:
+        entry.doc.close()
+
+
+@contextmanager
+def _open_file(source):
+    """ Use an IDE file in a worker (thread or process), opening it once
+        per file. The least recently used file is closed (once no longer in
+        use) if more than `MAX_OPEN_FILES` are open.
+
+        :param source: A local file's name and modification time (which
+            is part of the key, so a changed file is reopened), or a URL.
+        :return: A context manager producing the `Dataset` and its
+            `BlockIndex`.
+    """
+    with _OPEN_FILES_LOCK:
+        entry = _OPEN_FILES.get(source)
+        if entry is not None:
+            _OPEN_FILES.move_to_end(source)
+            entry.users += 1
+
+    if entry is None:
+        # Opened without the lock, so other files can be used meanwhile
+        from .files import get_doc
+        if isinstance(source, str):
+            opened = _OpenFile(get_doc(url=source, parsed=False))
+        else:
+            opened = _OpenFile(get_doc(source[0], parsed=False))
+
+        with _OPEN_FILES_LOCK:
+            entry = _OPEN_FILES.get(source)
+            if entry is None:
+                entry = _OPEN_FILES[source] = opened
+                while len(_OPEN_FILES) > max(MAX_OPEN_FILES, 1):
+                    _release(_OPEN_FILES.popitem(last=False)[1])
+            else:
+                _OPEN_FILES.move_to_end(source)
+            entry.users += 1
+        if entry is not opened:
+            # Another thread opened it first
+            opened.doc.close()
+
+    try:
+        yield entry.doc, entry.index
+    finally:
+        with _OPEN_FILES_LOCK:
+            entry.users -= 1
+            if entry.closing and not entry.users:
+                entry.doc.close()
+
+
+def close_files():
+    """ Close the IDE files opened (in this process) to compute lazy
+        channel data or to read `ChannelHandle` data. Files still being
+        read are closed when their reads finish. They are reopened if used
+        again.
+    """
+    with _OPEN_FILES_LOCK:
+        while _OPEN_FILES:
+            _release(_OPEN_FILES.popitem()[1])
+
+
+def _read_chunk(source, channel_id, subchannels, entries, references, first, last):
+    """ Read and decode one chunk of a channel's data. Run by the `dask`
+        scheduler.
+
+        :param source: The IDE file's name and modification time, or a
+            `BlockIndex` (for files that can't be reopened by name).
+        :param channel_id: The channel's ID.
+        :param subchannels: The IDs of the subchannels to read, or `None`.
+        :param entries: The index entries of the blocks in the chunk.
+        :param references: Reference values for bivariate calibration.
+        :param first: The index of the chunk's first sample to keep.
+        :param last: The index after the chunk's last sample to keep.
+        :return: A 2D array of values, one column per subchannel.
+    """
+    if not isinstance(source, BlockIndex):
+        with _open_file(source) as (_doc, index):
+            return _read_chunk(index, channel_id, subchannels, entries, references, first, last)
+
+    channel = source.doc.channels[channel_id]
+    raw = source.read_raw(channel_id, entries)[first:last]
+    raw = np_recfunctions.structured_to_unstructured(raw).T
+    return calibrate(channel, raw, reference=references, subchannels=subchannels).T
+
+
+def _session_start(doc):
+    """ Get a `Dataset`'s session start as a `datetime`, for `parse_time()`. """
+    if doc.lastSession.utcStartTime:
+        return datetime.datetime.utcfromtimestamp(doc.lastSession.utcStartTime)
+    return None
+
+
+def _chunks(channel, start=None, end=None, chunk_size=CHUNK_SIZE, index=None):
+    """ Divide a channel's data into chunks of whole blocks.
+
+        :return: The `BlockIndex`, the sample times (microseconds), and a
+            list of (entries, first, last) tuples: each chunk's index
+            entries, and the range of its samples within the interval.
+    """
+    parent = _parent(channel)
+    doc = parent.dataset
+    index = index or BlockIndex(doc)
+
+    session_start = _session_start(doc)
+    start = parse_time(start, session_start)
+    end = parse_time(end, session_start)
+
+    entries = index[parent.id][index.find(parent.id, start, end)]
+    times = BlockIndex.get_times(entries)
+    keep = np.ones(len(times), dtype=bool)
+    if start is not None:
+        keep &= times >= start
+    if end is not None:
+        keep &= times < end
+
+    # Group blocks so each chunk has at least `chunk_size` samples
+    counts = entries['samples']
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    chunks = []
+    first_block = 0
+    while first_block < len(entries):
+        last_block = int(np.searchsorted(offsets, offsets[first_block] + chunk_size, side='left'))
+        last_block = min(max(last_block, first_block + 1), len(entries))
+        lo, hi = offsets[first_block], offsets[last_block]
+        kept = np.flatnonzero(keep[lo:hi])
+        if len(kept):
+            chunks.append((entries[first_block:last_block], int(kept[0]), int(kept[-1]) + 1))
+        first_block = last_block
+
+    return index, times[keep], chunks
+
+
+def to_dask(channel, start=None, end=None, chunk_size=CHUNK_SIZE, index=None,
+            times=False):
+    """ Get a channel's data as a lazily-evaluated `dask.array.Array`. Each
+        chunk contains one or more complete data blocks, which are read and
+        decoded only when the chunk is computed. The chunks can be computed
+        in parallel by any `dask` scheduler, including multiprocessing and
+        distributed ones (if the `Dataset` was read from a local file).
+
+        The `start` and `end` times may be specified in any of the forms
+        accepted by `get_doc()`. Samples at or after `start` and before
+        `end` are included.
+
+        :param channel: A `Channel` or `SubChannel`.
+        :param start: The start of the interval. Defaults to the start of
+            the recording.
+        :param end: The end of the interval. Defaults to the end of the
+            recording.
+        :param chunk_size: The approximate number of samples per chunk.
+            Chunks are aligned to data blocks.
+        :param index: An existing `BlockIndex` of the file, to avoid
+            indexing it again.
+        :param times: If `True`, also return the sample times.
+        :return: A 2D `dask` array of values, shaped (samples,
+            subchannels), like the `DataFrame` produced by `to_pandas()`.
+            If `times` is `True`, a tuple containing a NumPy array of sample
+            times (microseconds) and the `dask` array.
+    """
+    da = _import("dask.array")
+    dask = _import("dask")
+
+    parent = _parent(channel)
+    doc = parent.dataset
+    index, t, chunks = _chunks(channel, start, end, chunk_size, index)
+    subchannels = None if parent is channel else [channel.id]
+    ncols = 1 if subchannels else len(parent.subchannels)
+    references = index.get_references(parent)
+
+    # Reopen by name in each worker, so tasks can be sent to other processes
+    if doc.filename and os.path.isfile(doc.filename):
+        source = (os.path.abspath(doc.filename), os.stat(doc.filename).st_mtime_ns)
+    else:
+        source = index
+
+    read = dask.delayed(_read_chunk, pure=source is not index)
+    arrays = [da.from_delayed(read(source, parent.id, subchannels, entries, references, lo, hi),
+                              shape=(hi - lo, ncols), dtype=np.float64)
+              for entries, lo, hi in chunks]
+    if arrays:
+        values = da.concatenate(arrays, axis=0)
+    else:
+        values = da.empty((0, ncols), dtype=np.float64)
+
+    if times:
+        return t, values
+    return values
+
+
+def _to_data_array(channel, start, end, chunk_size, index, time_mode, suffix=""):
+    """ Build an `xarray.DataArray` of one `Channel` or `SubChannel`. The
+        `suffix` is appended to the names of its dimensions.
+    """
+    xr = _import("xarray")
+
+    parent = _parent(channel)
+    t, values = to_dask(channel, start, end, chunk_size=chunk_size, index=index, times=True)
+    if parent is channel:
+        names = [sch.name for sch in parent.subchannels]
+        units = [sch.units for sch in parent.subchannels]
+    else:
+        names = [channel.name]
+        units = [channel.units]
+
+    dims = ("time" + suffix, "subchannel" + suffix)
+    return xr.DataArray(
+        values,
+        dims=dims,
+        coords={dims[0]: _time_index(t, time_mode, parent.dataset.lastUtcTime),
+                dims[1]: names},
+        name=channel.name,
+        attrs={'channel_id': parent.id,
+               'measurement_types': [u[0] for u in units],
+               'units': [u[1] for u in units]})
+
+
+def to_xarray(dataset, measurement_type=ANY, start=None, end=None,
+              chunk_size=CHUNK_SIZE, time_mode="datetime"):
+    """ Get a recording's data as lazily-evaluated `xarray` objects, backed
+        by `dask` arrays (see `to_dask()`). Nothing is read until the data is
+        computed, so operations like ``mean()`` or ``resample()`` can run
+        out-of-core and in parallel.
+
+        The `start` and `end` times may be specified in any of the forms
+        accepted by `get_doc()`.
+
+        :param dataset: A `Dataset` (which does not have to be imported), or
+            a single `Channel` or `SubChannel`.
+        :param measurement_type: A `MeasurementType`, a measurement type
+            'key' string, or a string of multiple keys generated by adding
+            and/or subtracting `MeasurementType` objects to filter the
+            channels. Not used if `dataset` is a channel.
+        :param start: The start of the interval. Defaults to the start of
+            the recording.
+        :param end: The end of the interval. Defaults to the end of the
+            recording.
+        :param chunk_size: The approximate number of samples per chunk.
+        :param time_mode: How to index samples in time: ``"seconds"``
+            (relative to the start of the recording), ``"timedelta"``, or
+            ``"datetime"`` (absolute UTC times), as in `to_pandas()`.
+        :return: For a `Channel` or `SubChannel`, an `xarray.DataArray` with
+            the dimensions ``time`` and ``subchannel``, and the measurement
+            types and units as attributes. For a `Dataset`, an
+            `xarray.Dataset` with one such variable per channel, named
+            ``ch<ID>``, with dimensions ``time_<ID>`` and
+            ``subchannel_<ID>`` (channels have different sample times).
+    """
+    xr = _import("xarray")
+
+    if not hasattr(dataset, 'getPlots'):
+        return _to_data_array(dataset, start, end, chunk_size, None, time_mode)
+
+    index = BlockIndex(dataset)
+    variables = {}
+    for channel in get_channels(dataset, measurement_type, subchannels=False):
+        if not len(index[channel.id]):
+            continue
+        variables[f"ch{channel.id}"] = _to_data_array(channel, start, end, chunk_size, index,
+                                                      time_mode, f"_{channel.id}")
+
+    return xr.Dataset(variables)
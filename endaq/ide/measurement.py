@@ -12,7 +12,7 @@ __all__ = ['ANY', 'ACCELERATION', 'ALTITUDE', 'ANG_RATE', 'AUDIO', 'DIRECTION',
 from fnmatch import fnmatch
 from shlex import shlex
 
-from idelib.dataset import Dataset, Channel, SubChannel
+from .profiling import timed
 
 # ============================================================================
 #
@@ -152,6 +152,9 @@ class MeasurementType:
         if getattr(channel, '_measurementType', channel) == self:
             return True
 
+        # Imported here to keep importing `endaq.ide` fast.
+        from idelib.dataset import Channel, SubChannel
+
         if isinstance(channel, Channel):
             if not isinstance(channel, SubChannel):
                 return any(self.match(c) for c in channel.children)
@@ -305,6 +308,7 @@ def split_types(query):
     return inc, exc
 
 
+@timed
 def filter_channels(channels, measurement_type=ANY):
     """ Filter a list of `Channel` and/or `SubChannel` instances by their
         measurement type(s).
@@ -346,6 +350,7 @@ def filter_channels(channels, measurement_type=ANY):
     return result
 
 
+@timed
 def get_channels(dataset, measurement_type=ANY, subchannels=True):
     """ Get a list of `Channel` or `SubChannel` instances from a `Dataset` by
         their measurement type(s).
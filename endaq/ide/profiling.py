@@ -0,0 +1,321 @@
+"""
+profiling.py: Optional instrumentation of the package's main functions and
+hot paths (file validation, `openFile()`, `readData()`, `arraySlice()`,
+timestamp conversion, `DataFrame` construction, etc.).
+
+Instrumentation is off by default, and costs a single flag check per call
+when off. It can be turned on for a block of code::
+
+    from endaq.ide import profiling
+
+    with profiling.profile() as prof:
+        doc = get_doc("recording.ide")
+        df = to_pandas(doc.channels[8])
+    print(prof.report())
+    prof.dump_stats("recording.prof")  # For `pstats`, `snakeviz`, etc.
+
+or for a whole program, by setting the environment variable
+``ENDAQ_IDE_PROFILE``. If its value is ``1``, a report is written to
+`sys.stderr` when the program exits; if it is a filename ending with
+``.json``, the statistics are written to it as JSON; any other filename
+receives `cProfile`-compatible statistics.
+
+For each instrumented function or section, the number of calls, the wall
+and CPU time (both total and excluding instrumented calls within it), and
+the number of bytes processed are recorded.
+"""
+import atexit
+from contextlib import contextmanager
+import functools
+import os
+import sys
+import threading
+import time
+
+__all__ = ['Profile', 'profile', 'enable', 'disable', 'get_profile']
+
+
+# ============================================================================
+#
+# ============================================================================
+
+""" The name of the environment variable that enables profiling. """
+ENV_VAR = "ENDAQ_IDE_PROFILE"
+
+# The profile currently recording, or `None`. Checked by every
+# instrumented function, so it is a plain module global.
+_active = None
+
+_local = threading.local()
+
+
+class _Entry:
+    """ The accumulated statistics of one instrumented function or section. """
+    __slots__ = ('calls', 'wall', 'cpu', 'own_wall', 'own_cpu', 'bytes', 'location')
+
+    def __init__(self, location):
+        self.calls = 0
+        self.wall = self.cpu = 0.0
+        self.own_wall = self.own_cpu = 0.0
+        self.bytes = 0
+        self.location = location
+
+
+class Profile:
+    """ Statistics recorded from instrumented functions. """
+
+    def __init__(self):
+        self.entries = {}
+        self._lock = threading.Lock()
+
+
+    def add(self, name, location, wall, cpu, own_wall, own_cpu, nbytes):
+        """ Record one call. Used by the instrumentation. """
+        with self._lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                entry = self.entries[name] = _Entry(location)
+            entry.calls += 1
+            entry.wall += wall
+            entry.cpu += cpu
+            entry.own_wall += own_wall
+            entry.own_cpu += own_cpu
+            entry.bytes += nbytes or 0
+
+
+    def reset(self):
+        """ Discard all recorded statistics. """
+        with self._lock:
+            self.entries.clear()
+
+
+    def to_dict(self):
+        """ Get the recorded statistics.
+
+            :return: A dictionary, keyed by function/section name, of
+                dictionaries with the keys ``calls``, ``wall``, ``cpu``
+                (total seconds), ``own_wall``, ``own_cpu`` (seconds,
+                excluding instrumented calls within), and ``bytes``.
+        """
+        with self._lock:
+            return {name: {'calls': e.calls, 'wall': e.wall, 'cpu': e.cpu,
+                           'own_wall': e.own_wall, 'own_cpu': e.own_cpu,
+                           'bytes': e.bytes}
+                    for name, e in self.entries.items()}
+
+
+    def to_json(self, **kwargs):
+        """ Get the recorded statistics as JSON (see `Profile.to_dict()`).
+
+            :param kwargs: Keyword arguments for `json.dumps()`.
+        """
+        import json
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+    def create_stats(self):
+        """ Build `cProfile`-compatible statistics, in the attribute
+            `stats`. This makes a `Profile` usable as the argument to
+            `pstats.Stats`.
+        """
+        stats = {}
+        with self._lock:
+            for name, e in self.entries.items():
+                stats[e.location] = (e.calls, e.calls, e.own_wall, e.wall, {})
+        self.stats = stats
+
+
+    def get_stats(self):
+        """ Get the recorded statistics as a `pstats.Stats` object. """
+        import pstats
+        return pstats.Stats(self)
+
+
+    def dump_stats(self, filename):
+        """ Write the recorded statistics to a file, in the format written
+            by `cProfile` (readable by `pstats` and other tools).
+        """
+        self.get_stats().dump_stats(filename)
+
+
+    def report(self, sort='wall'):
+        """ Get a text table of the recorded statistics, one line per
+            function or section.
+
+            :param sort: The column by which to sort (in descending order).
+        """
+        rows = sorted(self.to_dict().items(), key=lambda item: item[1][sort], reverse=True)
+        width = max([len(name) for name, _ in rows] + [8])
+        lines = [f"{'function':<{width}} {'calls':>8} {'wall (s)':>10} {'cpu (s)':>10} "
+                 f"{'own (s)':>10} {'MiB':>10}"]
+        for name, e in rows:
+            lines.append(f"{name:<{width}} {e['calls']:>8} {e['wall']:>10.4f} {e['cpu']:>10.4f} "
+                         f"{e['own_wall']:>10.4f} {e['bytes'] / 2**20:>10.2f}")
+        return "\n".join(lines)
+
+
+# ============================================================================
+# Instrumentation
+# ============================================================================
+
+class _Section:
+    """ An instrumented section of code in progress. The code can set
+        `nbytes` to the number of bytes it processed.
+    """
+    __slots__ = ('nbytes', 'child_wall', 'child_cpu')
+
+    def __init__(self):
+        self.nbytes = 0
+        self.child_wall = self.child_cpu = 0.0
+
+
+class _NullSection:
+    """ Stand-in for `_Section` when profiling is off. """
+    __slots__ = ()
+
+    nbytes = property(lambda self: 0, lambda self, value: None)
+
+
+_NULL_SECTION = _NullSection()
+
+
+def _record(prof, name, location, section, wall, cpu):
+    """ Record a completed call, and charge its time to the enclosing one. """
+    stack = _local.stack
+    stack.pop()
+    if stack:
+        stack[-1].child_wall += wall
+        stack[-1].child_cpu += cpu
+    prof.add(name, location, wall, cpu, wall - section.child_wall,
+             cpu - section.child_cpu, section.nbytes)
+
+
+def _start():
+    """ Begin recording a call. """
+    section = _Section()
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(section)
+    return section, time.perf_counter(), time.thread_time()
+
+
+@contextmanager
+def section(name, nbytes=0):
+    """ Instrument a section of code. The context manager returns an object
+        whose `nbytes` attribute can be set to the number of bytes
+        processed.
+
+        :param name: The section's name, e.g., the function it calls.
+        :param nbytes: The number of bytes processed, if known in advance.
+    """
+    prof = _active
+    if prof is None:
+        yield _NULL_SECTION
+        return
+
+    sect, wall, cpu = _start()
+    sect.nbytes = nbytes
+    try:
+        yield sect
+    finally:
+        _record(prof, name, ("~", 0, name), sect,
+                time.perf_counter() - wall, time.thread_time() - cpu)
+
+
+def timed(func=None, nbytes=None):
+    """ Decorator to instrument a function.
+
+        :param nbytes: An optional function that gets the number of bytes
+            processed from the decorated function's result.
+    """
+    if func is None:
+        return functools.partial(timed, nbytes=nbytes)
+
+    name = f"{func.__module__}.{func.__qualname__}"
+    code = func.__code__
+    location = (code.co_filename, code.co_firstlineno, func.__name__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        prof = _active
+        if prof is None:
+            return func(*args, **kwargs)
+
+        sect, wall, cpu = _start()
+        try:
+            result = func(*args, **kwargs)
+            if nbytes is not None:
+                sect.nbytes = nbytes(result)
+            return result
+        finally:
+            _record(prof, name, location, sect,
+                    time.perf_counter() - wall, time.thread_time() - cpu)
+
+    return wrapper
+
+
+# ============================================================================
+#
+# ============================================================================
+
+def enable(prof=None):
+    """ Start recording statistics.
+
+        :param prof: The `Profile` in which to record them. Defaults to a
+            new `Profile`.
+        :return: The `Profile` recording the statistics.
+    """
+    global _active
+    _active = prof or Profile()
+    return _active
+
+
+def disable():
+    """ Stop recording statistics.
+
+        :return: The `Profile` that was recording, or `None`.
+    """
+    global _active
+    prof, _active = _active, None
+    return prof
+
+
+def get_profile():
+    """ Get the `Profile` currently recording statistics, or `None` if
+        profiling is off.
+    """
+    return _active
+
+
+@contextmanager
+def profile(prof=None):
+    """ Record statistics within a block of code. Profiling is restored to
+        its previous state afterwards.
+
+        :param prof: The `Profile` in which to record them. Defaults to a
+            new `Profile`.
+        :return: The `Profile` recording the statistics.
+    """
+    global _active
+    previous = _active
+    prof = enable(prof)
+    try:
+        yield prof
+    finally:
+        _active = previous
+
+
+def _write_at_exit(prof, destination):
+    """ Write the statistics recorded for the environment variable. """
+    if destination == "1":
+        print(prof.report(), file=sys.stderr)
+    elif destination.lower().endswith(".json"):
+        with open(destination, 'w', encoding='utf-8') as f:
+            f.write(prof.to_json(indent=1))
+    else:
+        prof.dump_stats(destination)
+
+
+if os.environ.get(ENV_VAR, "0") not in ("", "0"):
+    atexit.register(_write_at_exit, enable(), os.environ[ENV_VAR])
@@ -0,0 +1,343 @@
+"""
+spectral.py: Streaming spectral analysis (Welch power spectral density and
+spectrograms) of IDE channel data.
+
+The data is read block-by-block (see `endaq.ide.blocks`) and processed as a
+sequence of overlapping segments, so memory use is bounded by the segment
+length and batch size rather than the length of the recording. The FFTs of
+segments can be computed on several threads.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from .blocks import BlockIndex, _parent
+from .info import _make_frame
+from .util import parse_time
+
+__all__ = ['welch', 'spectrogram']
+
+
+# ============================================================================
+#
+# ============================================================================
+
+""" The number of data blocks read and decoded at a time. """
+BATCH_BLOCKS = 64
+
+""" The maximum number of segments processed in one FFT call. """
+BATCH_SEGMENTS = 256
+
+
+def get_window(window, nperseg):
+    """ Get a window function's coefficients. Windows are 'periodic' (as
+        used for spectral analysis, like `scipy.signal.get_window()`).
+
+        :param window: The name of a window (``"hann"``, ``"hamming"``,
+            ``"blackman"``, ``"bartlett"``, or ``"boxcar"``), or an array of
+            `nperseg` coefficients.
+        :param nperseg: The length of the window.
+        :return: An array of window coefficients.
+    """
+    if not isinstance(window, str):
+        window = np.asarray(window, dtype=np.float64)
+        if window.shape != (nperseg,):
+            raise ValueError(f"window must have {nperseg} coefficients, "
+                             f"not {window.shape}")
+        return window
+
+    functions = {
+        'hann': np.hanning,
+        'hanning': np.hanning,
+        'hamming': np.hamming,
+        'blackman': np.blackman,
+        'bartlett': np.bartlett,
+        'boxcar': np.ones,
+        'rectangular': np.ones,
+    }
+    func = functions.get(window.lower())
+    if func is None:
+        raise ValueError(f"Unknown window {window!r}; expected one of "
+                         f"{', '.join(functions)}")
+    return func(nperseg + 1)[:-1]
+
+
+class _Segmenter:
+    """ Splits a stream of channel data into overlapping segments, and
+        computes their one-sided power spectra.
+    """
+
+    def __init__(self, nsub, nperseg, noverlap, window, fs, scaling, detrend):
+        self.nperseg = nperseg
+        self.step = nperseg - noverlap
+        self.window = window
+        self.detrend = detrend
+
+        if detrend not in ('constant', False, None):
+            raise ValueError(f"detrend must be 'constant' or False, not {detrend!r}")
+        if scaling == 'density':
+            scale = 1.0 / (fs * (window * window).sum())
+        elif scaling == 'spectrum':
+            scale = 1.0 / window.sum() ** 2
+        else:
+            raise ValueError(f"scaling must be 'density' or 'spectrum', not {scaling!r}")
+
+        # One-sided spectrum: double everything but DC (and Nyquist, if present)
+        nfreq = nperseg // 2 + 1
+        self.scale = np.full(nfreq, 2 * scale)
+        self.scale[0] = scale
+        if nperseg % 2 == 0:
+            self.scale[-1] = scale
+
+        self.times = np.empty(0)
+        self.values = np.empty((nsub, 0))
+
+
+    def feed(self, times, values):
+        """ Add data to the stream, and get the complete segments (which are
+            views of the buffered data).
+
+            :return: The center time of each segment, and an array of
+                segments, shaped (segments, subchannels, nperseg).
+        """
+        self.times = np.concatenate((self.times, times))
+        self.values = np.concatenate((self.values, values), axis=1)
+
+        available = self.values.shape[1]
+        if available < self.nperseg:
+            return np.empty(0), np.empty((0, len(self.values), self.nperseg))
+
+        count = (available - self.nperseg) // self.step + 1
+        used = (count - 1) * self.step + self.nperseg
+        row_stride, sample_stride = self.values.strides
+        segments = np.lib.stride_tricks.as_strided(
+            self.values, shape=(count, len(self.values), self.nperseg),
+            strides=(sample_stride * self.step, row_stride, sample_stride),
+            writeable=False)
+        centers = self.times[self.nperseg // 2:used:self.step][:count]
+
+        # Keep the samples needed by the next segment
+        self.times = self.times[count * self.step:]
+        self.values = self.values[:, count * self.step:]
+        return centers, segments
+
+
+    def spectra(self, segments):
+        """ Compute the scaled power spectra of a set of segments.
+
+            :param segments: An array shaped (segments, subchannels,
+                nperseg).
+            :return: An array shaped (segments, subchannels, frequencies).
+        """
+        if self.detrend:
+            segments = segments - segments.mean(axis=-1, keepdims=True)
+        spectrum = np.fft.rfft(segments * self.window, axis=-1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        power *= self.scale
+        return power
+
+
+def _stream_spectra(channel, start, end, nperseg, overlap, window, scaling,
+                    detrend, workers, index, callback):
+    """ Read a channel's data block-by-block, and compute the power spectrum
+        of each segment. Common to `welch()` and `spectrogram()`.
+
+        :param callback: A function called (in order) with each batch's
+            segment center times and spectra.
+        :return: The frequencies of the spectra.
+    """
+    parent = _parent(channel)
+    doc = parent.dataset
+    index = index or BlockIndex(doc)
+
+    session_start = None
+    if doc.lastSession.utcStartTime:
+        session_start = datetime.datetime.utcfromtimestamp(doc.lastSession.utcStartTime)
+    start = parse_time(start, session_start)
+    end = parse_time(end, session_start)
+
+    if not 0 <= overlap < 1:
+        raise ValueError(f"overlap must be at least 0 and less than 1, not {overlap!r}")
+    nperseg = int(nperseg)
+    noverlap = min(int(nperseg * overlap), nperseg - 1)
+    window = get_window(window, nperseg)
+
+    blocks = index.find(parent.id, start, end)
+    entries = index[parent.id][blocks]
+    if not len(entries):
+        raise ValueError(f"No data in channel {parent.id} in the requested interval")
+
+    # Sample rate, from the blocks' timestamps
+    multi = entries['samples'] > 1
+    elapsed = (entries['end'] - entries['start'])[multi].sum()
+    if not elapsed:
+        raise ValueError(f"Cannot determine the sample rate of channel {parent.id}")
+    fs = (entries['samples'][multi] - 1).sum() / elapsed * 10**6
+
+    nsub = 1 if parent is not channel else len(parent.subchannels)
+    segmenter = _Segmenter(nsub, nperseg, noverlap, window, fs, scaling, detrend)
+    freqs = np.fft.rfftfreq(nperseg, 1 / fs)
+
+    executor = ThreadPoolExecutor(workers) if workers and workers > 1 else None
+    pending = deque()
+
+    def submit(centers, segments):
+        for i in range(0, len(segments), BATCH_SEGMENTS):
+            chunk = np.array(segments[i:i + BATCH_SEGMENTS])
+            if executor is None:
+                callback(centers[i:i + BATCH_SEGMENTS], segmenter.spectra(chunk))
+                continue
+            # Bound the number of batches in memory at once
+            while len(pending) >= 2 * workers:
+                callback(*_pop(pending))
+            pending.append((centers[i:i + BATCH_SEGMENTS],
+                            executor.submit(segmenter.spectra, chunk)))
+
+    try:
+        for first in range(0, len(entries), BATCH_BLOCKS):
+            times, values = index.read(channel, entries[first:first + BATCH_BLOCKS])
+            keep = slice(None)
+            if start is not None or end is not None:
+                keep = np.ones(len(times), dtype=bool)
+                if start is not None:
+                    keep &= times >= start
+                if end is not None:
+                    keep &= times < end
+            submit(*segmenter.feed(times[keep], values[:, keep]))
+
+        while pending:
+            callback(*_pop(pending))
+    finally:
+        if executor is not None:
+            # Don't compute the remaining batches if stopped early
+            for _centers, future in pending:
+                future.cancel()
+            executor.shutdown()
+
+    return freqs
+
+
+def _pop(pending):
+    """ Get the results of the oldest pending batch of spectra. """
+    centers, future = pending.popleft()
+    return centers, future.result()
+
+
+def _columns(channel):
+    """ Get the column names for a `Channel` or `SubChannel`'s data. """
+    parent = _parent(channel)
+    if parent is channel:
+        return [sch.name for sch in parent.subchannels]
+    return [channel.name]
+
+
+# ============================================================================
+#
+# ============================================================================
+
+def welch(channel, start=None, end=None, nperseg=1024, overlap=0.5,
+          window="hann", scaling="density", detrend="constant", workers=None,
+          index=None):
+    """ Compute the power spectral density of a channel's data using
+        Welch's method (the average of the power spectra of overlapping,
+        windowed segments). The data is processed block-by-block, so the
+        whole interval is never loaded into memory.
+
+        The `start` and `end` times may be specified in any of the forms
+        accepted by `get_doc()`. Samples at or after `start` and before
+        `end` are used.
+
+        :param channel: A `Channel` or `SubChannel`.
+        :param start: The start of the interval. Defaults to the start of
+            the recording.
+        :param end: The end of the interval. Defaults to the end of the
+            recording.
+        :param nperseg: The number of samples in each segment. The
+            frequency resolution is the sample rate divided by `nperseg`.
+        :param overlap: The fraction of each segment that overlaps the
+            next (0 to less than 1).
+        :param window: The window function name (e.g., ``"hann"``) or an
+            array of `nperseg` coefficients.
+        :param scaling: ``"density"`` for power spectral density (units²/Hz)
+            or ``"spectrum"`` for the power spectrum (units²).
+        :param detrend: ``"constant"`` to remove each segment's mean, or
+            `False` to use the data as-is.
+        :param workers: The number of threads used to compute FFTs.
+        :param index: An existing `BlockIndex` of the file, to avoid
+            indexing it again.
+        :return: A `pandas.DataFrame` indexed by frequency (Hz), with a
+            column for each subchannel.
+    """
+    total = 0
+    count = 0
+
+    def accumulate(_centers, spectra):
+        nonlocal total, count
+        total = total + spectra.sum(axis=0)
+        count += len(spectra)
+
+    freqs = _stream_spectra(
+        channel, start, end, nperseg, overlap, window, scaling, detrend,
+        workers, index, accumulate)
+
+    if not count:
+        raise ValueError(f"Not enough data for one segment of {nperseg} samples")
+
+    return pd.DataFrame((total / count).T, index=pd.Index(freqs, name="frequency (Hz)"),
+                        columns=_columns(channel))
+
+
+def spectrogram(channel, start=None, end=None, nperseg=1024, overlap=0.5,
+                window="hann", scaling="density", detrend="constant",
+                time_mode="datetime", workers=None, index=None):
+    """ Compute the spectrogram (the short-time power spectra) of a
+        channel's data. The data is processed block-by-block; only the
+        resulting spectra are kept in memory.
+
+        The `start` and `end` times may be specified in any of the forms
+        accepted by `get_doc()`. See `welch()` for descriptions of the
+        other parameters.
+
+        :param channel: A `Channel` or `SubChannel`.
+        :param start: The start of the interval. Defaults to the start of
+            the recording.
+        :param end: The end of the interval. Defaults to the end of the
+            recording.
+        :param time_mode: How to index the segments' center times:
+            ``"seconds"`` (relative to the start of the recording),
+            ``"timedelta"``, or ``"datetime"`` (absolute UTC times).
+        :return: A `pandas.DataFrame` indexed by time, with a column for
+            each frequency (Hz). If `channel` is a `Channel`, the columns
+            are a `pandas.MultiIndex` of subchannel name and frequency.
+    """
+    if time_mode not in ("seconds", "timedelta", "datetime"):
+        raise ValueError(f'invalid time mode "{time_mode}"')
+
+    times = []
+    results = []
+
+    def collect(centers, spectra):
+        times.append(centers)
+        results.append(spectra)
+
+    freqs = _stream_spectra(
+        channel, start, end, nperseg, overlap, window, scaling, detrend,
+        workers, index, collect)
+
+    names = _columns(channel)
+    times = np.concatenate(times) if times else np.empty(0)
+    if results:
+        spectra = np.concatenate(results)
+    else:
+        spectra = np.empty((0, len(names), len(freqs)))
+
+    if len(names) == 1 and _parent(channel) is not channel:
+        return _make_frame(channel, times, spectra[:, 0, :], time_mode,
+                           columns=pd.Index(freqs, name="frequency (Hz)"))
+
+    columns = pd.MultiIndex.from_product([names, freqs], names=["channel", "frequency (Hz)"])
+    return _make_frame(channel, times, spectra.reshape(len(spectra), -1), time_mode,
+                       columns=columns)
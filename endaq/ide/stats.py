@@ -0,0 +1,270 @@
+"""
+stats.py: Per-block summary statistics, for quickly computing the minimum,
+mean, maximum and RMS of channel data over arbitrary intervals.
+
+The statistics of each `ChannelDataBlock` (minimum, maximum, sum, sum of
+squares, and number of samples, for each subchannel) are computed once, and
+can optionally be cached in a 'sidecar' file. The statistics for an
+interval are then found by combining the aggregates of the blocks entirely
+within it; only the partial blocks at the ends of the interval are decoded.
+"""
+import datetime
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from .blocks import BlockIndex, _parent
+from .util import parse_time
+
+__all__ = ['BlockStats', 'get_stats']
+
+
+# ============================================================================
+#
+# ============================================================================
+
+""" The version of the statistics sidecar file format. Files with a
+    different version are ignored (and replaced).
+"""
+STATS_VERSION = 1
+
+""" The suffix added to an IDE filename to produce its sidecar's name. """
+SIDECAR_SUFFIX = ".stats.npz"
+
+""" The maximum number of blocks to decode at once while computing block
+    statistics.
+"""
+BATCH_SIZE = 512
+
+
+class BlockStats:
+    """ Summary statistics of each data block in an IDE file, for computing
+        interval statistics without decoding every sample. Statistics are
+        computed for each channel when first needed.
+
+        Example usage::
+
+            stats = BlockStats(doc)
+            stats.range(doc.channels[8], "1:00", "2:00")
+    """
+
+    def __init__(self, doc, cache=False, index=None):
+        """ Constructor.
+
+            :param doc: A `Dataset`, which does not have to be imported.
+            :param cache: If `True`, statistics are loaded from (and saved
+                to) a sidecar file next to the IDE file. A directory name
+                may be used to keep the sidecar files elsewhere. If `False`
+                (default), statistics are only kept in memory.
+            :param index: An existing `BlockIndex` of the file, to avoid
+                indexing it again.
+        """
+        self.doc = doc
+        self.index = index or BlockIndex(doc)
+        self._stats = {}
+        self.filename = None
+
+        if cache and doc.filename and os.path.isfile(doc.filename):
+            name = os.path.basename(doc.filename) + SIDECAR_SUFFIX
+            if isinstance(cache, (str, os.PathLike)):
+                self.filename = os.path.join(cache, name)
+            else:
+                self.filename = os.path.join(os.path.dirname(doc.filename), name)
+            self._load()
+
+
+    def _source_info(self):
+        """ Get the size and modification time of the IDE file, used to
+            check if a sidecar file is current.
+        """
+        stat = os.stat(self.doc.filename)
+        return np.array([STATS_VERSION, stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+    def _load(self):
+        """ Load cached statistics from the sidecar file, if it exists and
+            matches the IDE file.
+        """
+        try:
+            with np.load(self.filename) as cached:
+                if not np.array_equal(cached['_source'], self._source_info()):
+                    return
+                for key in cached.files:
+                    if key.startswith('_'):
+                        continue
+                    chid, field = key.split('_', 1)
+                    self._stats.setdefault(int(chid), {})[field] = cached[key]
+        except (OSError, KeyError, ValueError):
+            self._stats.clear()
+
+        for chid in list(self._stats):
+            if len(self._stats[chid].get('count', ())) != len(self.index[chid]):
+                del self._stats[chid]
+
+
+    def save(self):
+        """ Write the computed statistics to the sidecar file. Failure to
+            write the file (e.g., because the directory is read-only) is
+            reported as a warning.
+        """
+        if not self.filename:
+            return
+        arrays = {'_source': self._source_info()}
+        for chid, fields in self._stats.items():
+            for field, arr in fields.items():
+                arrays[f"{chid}_{field}"] = arr
+        try:
+            tmp = self.filename + ".tmp"
+            with open(tmp, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp, self.filename)
+        except OSError as err:
+            warnings.warn(f"Could not save block statistics to {self.filename}: {err}")
+
+
+    def compute(self, channel_id):
+        """ Compute the statistics of each of a channel's data blocks.
+
+            :param channel_id: The channel's ID.
+            :return: A dictionary of arrays: ``min``, ``max``, ``sum``, and
+                ``sumsq`` (shaped subchannels x blocks), and ``count`` (the
+                number of samples in each block).
+        """
+        channel = self.doc.channels[channel_id]
+        entries = self.index[channel_id]
+        nsub = len(channel.subchannels)
+        nblocks = len(entries)
+
+        result = {
+            'min': np.empty((nsub, nblocks)),
+            'max': np.empty((nsub, nblocks)),
+            'sum': np.empty((nsub, nblocks)),
+            'sumsq': np.empty((nsub, nblocks)),
+            'count': entries['samples'].astype(np.int64),
+        }
+
+        for first in range(0, nblocks, BATCH_SIZE):
+            batch = slice(first, min(first + BATCH_SIZE, nblocks))
+            _t, values = self.index.read(channel, batch)
+            counts = entries['samples'][batch]
+            offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            result['min'][:, batch] = np.minimum.reduceat(values, offsets, axis=1)
+            result['max'][:, batch] = np.maximum.reduceat(values, offsets, axis=1)
+            result['sum'][:, batch] = np.add.reduceat(values, offsets, axis=1)
+            result['sumsq'][:, batch] = np.add.reduceat(values * values, offsets, axis=1)
+
+        return result
+
+
+    def get(self, channel_id, compute=True):
+        """ Get the statistics of each of a channel's data blocks, computing
+            (and caching) them if required. See `BlockStats.compute()`.
+
+            :param channel_id: The channel's ID.
+            :param compute: If `False`, only previously computed (or cached)
+                statistics are returned; `None` is returned if there are
+                none.
+        """
+        stats = self._stats.get(channel_id)
+        if stats is None and compute:
+            stats = self._stats[channel_id] = self.compute(channel_id)
+            self.save()
+        return stats
+
+
+    def range(self, channel, start=None, end=None):
+        """ Get the minimum, mean, maximum, RMS, and number of samples of a
+            channel's data within an interval. Samples at or after `start`
+            and before `end` are included.
+
+            :param channel: A `Channel` or `SubChannel`.
+            :param start: The start of the interval. It may be specified in
+                any of the forms accepted by `get_doc()`. Defaults to the
+                start of the recording.
+            :param end: The end of the interval. Defaults to the end of the
+                recording.
+            :return: A `pandas.DataFrame` with a row for each subchannel and
+                columns ``min``, ``mean``, ``max``, ``rms``, and ``count``.
+        """
+        parent = _parent(channel)
+        session_start = None
+        if self.doc.lastSession.utcStartTime:
+            session_start = datetime.datetime.utcfromtimestamp(self.doc.lastSession.utcStartTime)
+        start = parse_time(start, session_start)
+        end = parse_time(end, session_start)
+
+        entries = self.index[parent.id]
+        stats = self.get(parent.id)
+        nsub = len(parent.subchannels)
+
+        # Blocks that overlap the interval, and those entirely within it
+        overlapping = np.ones(len(entries), dtype=bool)
+        inside = np.ones(len(entries), dtype=bool)
+        if start is not None:
+            overlapping &= entries['end'] >= start
+            inside &= entries['start'] >= start
+        if end is not None:
+            overlapping &= entries['start'] < end
+            inside &= entries['end'] < end
+        inside &= overlapping
+        partial = overlapping & ~inside
+
+        dmin = np.full(nsub, np.inf)
+        dmax = np.full(nsub, -np.inf)
+        dsum = np.zeros(nsub)
+        dsumsq = np.zeros(nsub)
+        count = 0
+
+        if inside.any():
+            dmin = np.minimum(dmin, stats['min'][:, inside].min(axis=1))
+            dmax = np.maximum(dmax, stats['max'][:, inside].max(axis=1))
+            dsum += stats['sum'][:, inside].sum(axis=1)
+            dsumsq += stats['sumsq'][:, inside].sum(axis=1)
+            count += int(stats['count'][inside].sum())
+
+        if partial.any():
+            t, values = self.index.read(parent, entries[partial])
+            keep = np.ones(len(t), dtype=bool)
+            if start is not None:
+                keep &= t >= start
+            if end is not None:
+                keep &= t < end
+            values = values[:, keep]
+            if values.shape[1]:
+                dmin = np.minimum(dmin, values.min(axis=1))
+                dmax = np.maximum(dmax, values.max(axis=1))
+                dsum += values.sum(axis=1)
+                dsumsq += (values * values).sum(axis=1)
+                count += values.shape[1]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = pd.DataFrame({
+                'min': dmin if count else np.nan,
+                'mean': dsum / count if count else np.nan,
+                'max': dmax if count else np.nan,
+                'rms': np.sqrt(dsumsq / count) if count else np.nan,
+                'count': count,
+            }, index=[sch.name for sch in parent.subchannels])
+
+        if parent is not channel:
+            result = result.iloc[[channel.id]]
+        return result
+
+
+def get_stats(doc, cache=False):
+    """ Get the `BlockStats` for a `Dataset`. The object is kept with the
+        `Dataset`, so subsequent calls return the same one.
+
+        :param doc: A `Dataset`, which does not have to be imported.
+        :param cache: If `True` (or a directory name), statistics are loaded
+            from (and saved to) a sidecar file (see `BlockStats`). Only
+            used when the `BlockStats` is first created.
+        :return: A `BlockStats` object.
+    """
+    stats = getattr(doc, '_endaq_block_stats', None)
+    if stats is None:
+        stats = BlockStats(doc, cache=cache)
+        doc._endaq_block_stats = stats
+    return stats
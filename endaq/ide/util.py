@@ -2,15 +2,26 @@
 Some general-purpose IDE file manipulation funcions.
 """
 
+import datetime
+import glob
+import io
+import os
+import string
+import threading
+
 from ebmlite import loadSchema
+from ebmlite.decoding import readElementID, readElementSize
+
+from .profiling import timed
 
-__all__ = ['validate']
+__all__ = ['SharedFile', 'expand_paths', 'validate', 'parse_time', 'parse_times']
 
 
 # ============================================================================
 #
 # ============================================================================
 
+@timed
 def validate(stream, from_pos=False, lookahead=25, percent=.5):
     """
     Determine if a stream contains IDE data.
@@ -27,7 +38,8 @@ def validate(stream, from_pos=False, lookahead=25, percent=.5):
         have been created using a different version of the schema.
     :return: `True` if validation passed, `False` if it failed.
     """
-    # TODO: Make validation more thorough, test for corrupt files?
+    # For a thorough check of the whole file (truncation, corruption,
+    # timing problems), see `endaq.ide.integrity.check_file()`.
 
     orig_pos = stream.tell()
     if not from_pos:
@@ -52,3 +64,457 @@ def validate(stream, from_pos=False, lookahead=25, percent=.5):
     finally:
         stream.seek(orig_pos)
 
+
+
+def walk_elements(stream, offset=None):
+    """
+    Iterate over the top-level EBML elements in a stream, reading only their
+    headers (ID and size). Element payloads are skipped, not read, making
+    this considerably faster than iterating over a parsed EBML `Document`.
+
+    :param stream: A file-like stream (something that supports the methods
+        `tell()`, `seek()`, and `read()`).
+    :param offset: The position of the first element to read. Defaults to
+        the stream's current position.
+    :yields: A tuple for each element: its EBML ID, its offset, the offset
+        of its payload, and the size of its payload. The last element of a
+        damaged file may have a payload that extends past the end of the
+        stream.
+    """
+    if offset is None:
+        offset = stream.tell()
+    length = stream.seek(0, os.SEEK_END)
+
+    while offset < length:
+        stream.seek(offset)
+        try:
+            eid, idlen = readElementID(stream)
+            size, sizelen = readElementSize(stream)
+        except (IOError, TypeError):
+            # Partial header at the end of the file (TypeError comes from
+            # `ord()` on an empty read).
+            break
+        if size is None:
+            # 'Infinite' elements never occur at the root level of an IDE.
+            break
+        payload = offset + idlen + sizelen
+        yield eid, offset, payload, size
+        offset = payload + size
+
+
+def expand_paths(patterns):
+    """ Expand a list of filenames and/or 'glob' patterns (including
+        recursive ``**`` patterns) into a sorted list of unique filenames.
+
+        :param patterns: A list of filenames and/or patterns. Directories
+            are searched (recursively) for IDE files.
+        :return: A list of filenames.
+    """
+    found = []
+    for pattern in patterns:
+        pattern = os.path.expanduser(pattern)
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "**", "*.ide")
+        matches = glob.glob(pattern, recursive=True)
+        found.extend(m for m in matches if os.path.isfile(m))
+    return sorted(set(found))
+
+
+# ============================================================================
+# Thread-safe file access
+# ============================================================================
+
+class SharedFile(io.RawIOBase):
+    """
+    A read-only binary file that can be read by several threads at once.
+    Each thread has its own position, and reads are positional
+    (`os.pread()`, or a separate file handle per thread where that isn't
+    available), so threads never move each other's position and reads need
+    no lock. Opening a `Dataset` on a `SharedFile` (see `get_doc()`) lets
+    several threads read its data concurrently.
+    """
+
+    def __init__(self, filename):
+        """
+        Constructor.
+
+        :param filename: The name of the file.
+        """
+        super().__init__()
+        self.name = os.path.abspath(os.fspath(filename))
+        self._file = open(self.name, 'rb')
+        self._fd = self._file.fileno()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._handles = []  # Per-thread files, if `os.pread()` is unavailable
+
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name!r}>"
+
+
+    def readable(self):
+        return True
+
+
+    def seekable(self):
+        return True
+
+
+    def fileno(self):
+        return self._fd
+
+
+    def tell(self):
+        """ Get the current thread's position. """
+        return getattr(self._local, 'pos', 0)
+
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """ Set the current thread's position. """
+        if whence == os.SEEK_CUR:
+            offset += self.tell()
+        elif whence == os.SEEK_END:
+            offset += os.fstat(self._fd).st_size
+        elif whence != os.SEEK_SET:
+            raise ValueError(f"invalid whence ({whence})")
+        if offset < 0:
+            raise ValueError(f"negative seek position {offset}")
+        self._local.pos = offset
+        return offset
+
+
+    def pread(self, size, offset):
+        """
+        Read from a given position, without changing the position of any
+        thread.
+
+        :param size: The number of bytes to read.
+        :param offset: The position from which to read.
+        :return: The data read (may be shorter than `size` at the end of
+            the file).
+        """
+        if hasattr(os, 'pread'):
+            return os.pread(self._fd, size, offset)
+
+        f = getattr(self._local, 'file', None)
+        if f is None:
+            f = self._local.file = open(self.name, 'rb')
+            with self._lock:
+                self._handles.append(f)
+        f.seek(offset)
+        return f.read(size)
+
+
+    def read(self, size=-1):
+        pos = self.tell()
+        if size is None or size < 0:
+            size = max(0, os.fstat(self._fd).st_size - pos)
+        data = self.pread(size, pos)
+        self._local.pos = pos + len(data)
+        return data
+
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+    def close(self):
+        if not self.closed:
+            with self._lock:
+                for f in self._handles:
+                    f.close()
+                self._handles = []
+            self._file.close()
+        super().close()
+
+
+# ============================================================================
+# Time parsing
+# ============================================================================
+
+@timed
+def parse_time(t, datetime_start=None):
+    """ Convert a time in one of several user-friendly forms to microseconds
+        (the native time units used in `idelib`). Valid types are:
+
+        * `None`, `int`, or `float` (returns the same value)
+        * `str` (formatted as a time, e.g., `MM:SS`, `HH:MM:SS`,
+          `DDd HH:MM:SS`). More examples:
+
+            * ``":01"`` or ``":1"`` or ``"1s"`` (1 second)
+            * ``"22:11"`` (22 minutes, 11 seconds)
+            * ``"3:22:11"`` (3 hours, 22 minutes, 11 seconds)
+            * ``"1d 3:22:11"`` (3 hours, 22 minutes, 11 seconds)
+        * `datetime.timedelta` or `pandas.Timedelta`
+        * `datetime.datetime`
+
+        :param t: The time value to convert.
+        :param datetime_start: If `t` is a `datetime` object, the result will
+            be relative to `datetime_start`. It will default to the start of
+            the day portion of `t`. This has no effect on non-`datetime`
+            values of `t` .
+        :returns: The time in microseconds.
+    """
+    if t is None or isinstance(t, (int, float)):
+        return t
+
+    elif isinstance(t, str):
+        if not t:
+            return None
+        orig = t
+        t = t.strip().lower()
+        for c in ":dhms":
+            t = t.replace(c, ' ')
+        if not all(c in string.digits + ' ' for c in t):
+            raise ValueError(f"Bad time string for parse_time(): {orig!r}")
+
+        micros = 0
+        for part, mult in zip(reversed(t.split()), (1, 60, 3600, 86400)):
+            if not part:
+                continue
+            part = part.strip(string.ascii_letters + string.punctuation + string.whitespace)
+            micros += float(part) * mult
+        return micros * 10**6
+
+    elif isinstance(t, datetime.timedelta):
+        return t.total_seconds() * 10**6
+
+    elif isinstance(t, (datetime.time, datetime.datetime)):
+        if datetime_start is None:
+            # No starting time, assume midnight of same day.
+            datetime_start = datetime.datetime(t.year, t.month, t.day)
+
+        if isinstance(t, datetime.time):
+            # just time: make datetime
+            t = datetime.datetime.combine(datetime_start, t)
+
+        if isinstance(t, datetime.datetime):
+            # datetime: make timedelta
+            return (t - datetime_start).total_seconds() * 10**6
+
+    raise TypeError(f"Unsupported type for parse_time(): {type(t).__name__} ({t!r})")
+
+
+""" The value used by `parse_times()` for missing times (`None`, `NaN`,
+    `NaT` or empty strings). The same as NumPy's integer representation of
+    `NaT`.
+"""
+MISSING_TIME = -2**63
+
+# Multipliers (in seconds) of the parts of a time string, from the right.
+_TIME_PARTS = (1, 60, 3600, 86400)
+
+
+def _parse_time_strings(strings):
+    """ Convert an array of time strings (see `parse_time()`) to floating
+        point microseconds. Empty strings become `NaN`. The strings are
+        converted to a 2D array of character codes, and the numbers in each
+        row are accumulated one column at a time.
+    """
+    import numpy as np
+
+    strings = np.char.strip(np.asarray(strings, dtype=str))
+    if strings.dtype.itemsize == 0:
+        return np.full(len(strings), np.nan)
+    chars = strings.view(np.uint32).reshape(len(strings), -1)
+
+    digit = (chars >= ord('0')) & (chars <= ord('9'))
+    sep = np.isin(chars, [ord(c) for c in " :dhmsDHMS"]) | (chars == 0)
+    bad = ~(digit | sep).all(axis=1)
+    if bad.any():
+        raise ValueError(f"Bad time string for parse_times(): {strings[bad][0]!r}")
+
+    # Number of parts in each string, and each part's index from the right
+    starts = digit.copy()
+    starts[:, 1:] &= ~digit[:, :-1]
+    counts = starts.sum(axis=1)
+    from_right = counts[:, None] - np.cumsum(starts, axis=1)
+
+    ends = digit.copy()
+    ends[:, :-1] &= ~digit[:, 1:]
+    mults = np.zeros(chars.shape, dtype=np.float64)
+    for n, mult in enumerate(_TIME_PARTS):
+        mults[ends & (from_right == n)] = mult
+
+    values = np.where(digit, chars - ord('0'), 0).astype(np.float64)
+    current = np.zeros(len(chars), dtype=np.float64)
+    result = np.zeros(len(chars), dtype=np.float64)
+    for col in range(chars.shape[1]):
+        d = digit[:, col]
+        current[d] = current[d] * 10 + values[d, col]
+        result += current * mults[:, col]
+        current[ends[:, col]] = 0
+
+    result[counts == 0] = np.nan
+    return result * 10**6
+
+
+def _naive_utc(values):
+    """ Convert an array-like of datetimes to naive (UTC) `datetime64[us]`. """
+    import pandas as pd
+
+    values = pd.to_datetime(pd.Series(values, dtype=object), utc=True)
+    return values.dt.tz_localize(None).to_numpy(dtype="datetime64[us]")
+
+
+@timed(nbytes=lambda result: result.nbytes)
+def parse_times(times, datetime_start=None):
+    """ Convert an array of times, in any of the forms accepted by
+        `parse_time()`, to microseconds. The conversion is done in bulk,
+        which is much faster than calling `parse_time()` on each value.
+
+        Values are converted the same way as `parse_time()`, with the
+        exception of timezone-aware `datetime` values, which are converted to
+        UTC (naive `datetime` values are assumed to be UTC).
+
+        :param times: A list, tuple, `pandas.Series` or `pandas.Index`, or
+            1D NumPy array of times. Types may be mixed.
+        :param datetime_start: The start time for `datetime` (and
+            `datetime.time`) values; see `parse_time()`. Required for
+            `datetime.time` values.
+        :return: A NumPy `int64` array of times in microseconds, rounded
+            to the nearest microsecond (halves are rounded up). Missing
+            values (`None`, `NaN`, `NaT`, or empty strings) are
+            `MISSING_TIME`. Times that don't fit in an `int64` raise a
+            `ValueError`.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if isinstance(times, (pd.Series, pd.Index)):
+        if isinstance(times.dtype, pd.DatetimeTZDtype):
+            times = times.tz_convert('UTC').tz_localize(None) if isinstance(times, pd.Index) \
+                else times.dt.tz_convert('UTC').dt.tz_localize(None)
+        times = times.to_numpy()
+    try:
+        values = np.asarray(times)
+    except ValueError:
+        # Ragged; contains sequences (which will fail below)
+        values = np.empty(len(times), dtype=object)
+        values[:] = list(times)
+    if values.ndim == 0:
+        values = values.reshape(1)
+    elif values.ndim > 1:
+        raise ValueError(f"parse_times() requires a 1D array of times, not {values.ndim}D")
+
+    kind = values.dtype.kind
+    if kind in 'iub':
+        return values.astype(np.int64)
+    elif kind == 'f':
+        return _round_micros(values)
+    elif kind == 'm':
+        return values.astype("timedelta64[us]").view(np.int64)
+    elif kind == 'M':
+        return _datetime_offsets(values.astype("datetime64[us]"), datetime_start)
+    elif kind in 'US':
+        return _round_micros(_parse_time_strings(values.astype(str)))
+    elif kind != 'O':
+        raise TypeError(f"Unsupported type for parse_times(): {values.dtype}")
+
+    # Object array: group the values by type, and convert each group in bulk.
+    types = [type(v) for v in values]
+    categories = {t: _time_category(t) for t in set(types)}
+    for t, cat in categories.items():
+        if cat is None:
+            bad = values[types.index(t)]
+            raise TypeError(f"Unsupported type for parse_times(): {t.__name__} ({bad!r})")
+
+    result = np.full(len(values), MISSING_TIME, dtype=np.int64)
+    if len(categories) == 1:
+        cats = np.full(len(values), next(iter(categories.values())), dtype=object)
+    else:
+        cats = np.array([categories[t] for t in types], dtype=object)
+
+    is_str = cats == 'str'
+    is_number = cats == 'number'
+    is_delta = cats == 'timedelta'
+    is_delta64 = cats == 'timedelta64'
+    is_datetime = cats == 'datetime'
+    is_time = cats == 'time'
+
+    if is_str.any():
+        result[is_str] = _round_micros(_parse_time_strings(values[is_str].astype(str)))
+
+    if is_number.any():
+        result[is_number] = _round_micros(values[is_number].astype(np.float64))
+
+    if is_delta.any():
+        result[is_delta] = [(td.days * 86400 + td.seconds) * 10**6 + td.microseconds
+                            for td in values[is_delta]]
+
+    if is_delta64.any():
+        result[is_delta64] = values[is_delta64].astype("timedelta64[us]").view(np.int64)
+
+    if is_datetime.any():
+        result[is_datetime] = _datetime_offsets(_naive_utc(values[is_datetime]), datetime_start)
+
+    if is_time.any():
+        if datetime_start is None:
+            raise ValueError("parse_times(): datetime_start is required for datetime.time values")
+        start = _naive_utc([datetime_start])[0]
+        start_of_day = (start - start.astype("datetime64[D]")).astype(np.int64)
+        tod = np.array([((t.hour * 60 + t.minute) * 60 + t.second) * 10**6 + t.microsecond
+                        for t in values[is_time]], dtype=np.int64)
+        result[is_time] = tod - start_of_day
+
+    return result
+
+
+def _round_micros(values):
+    """ Round an array of floating point microseconds to `int64`, with
+        halves rounded up (i.e., toward positive infinity). `NaN` becomes
+        `MISSING_TIME`; values out of range (including infinity) raise a
+        `ValueError`.
+    """
+    import numpy as np
+
+    result = np.full(len(values), MISSING_TIME, dtype=np.int64)
+    ok = ~np.isnan(values)
+    rounded = np.floor(values[ok] + 0.5)
+    bad = ~((rounded > MISSING_TIME) & (rounded < 2**63))
+    if bad.any():
+        raise ValueError(f"Time out of range for parse_times(): {float(rounded[bad][0])!r} microseconds")
+    result[ok] = rounded
+    return result
+
+
+def _time_category(t):
+    """ Get the category of a type, for grouping values in `parse_times()`,
+        or `None` if the type isn't supported.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if t is type(None) or t is type(pd.NaT):
+        return 'missing'
+    elif issubclass(t, str):
+        return 'str'
+    elif issubclass(t, np.timedelta64):
+        return 'timedelta64'
+    elif issubclass(t, (int, float, np.number)):
+        return 'number'
+    elif issubclass(t, datetime.timedelta):
+        return 'timedelta'
+    elif issubclass(t, (datetime.datetime, np.datetime64)):
+        return 'datetime'
+    elif issubclass(t, datetime.time):
+        return 'time'
+    return None
+
+
+def _datetime_offsets(values, datetime_start=None):
+    """ Convert an array of naive `datetime64[us]` values to microseconds
+        relative to `datetime_start`, or to the midnight of each value's day.
+    """
+    import numpy as np
+
+    if datetime_start is None:
+        start = values.astype("datetime64[D]").astype("datetime64[us]")
+    else:
+        start = _naive_utc([datetime_start])[0]
+    result = (values - start).astype(np.int64)
+    result[np.isnat(values)] = MISSING_TIME
+    return result
@@ -21,6 +21,19 @@ TEST_REQUIRES = [
 EXAMPLE_REQUIRES = [
     ]
 
+ASYNC_REQUIRES = [
+    "aiohttp",
+    ]
+
+PARQUET_REQUIRES = [
+    "pyarrow",
+    ]
+
+DASK_REQUIRES = [
+    "dask[array]",
+    "xarray",
+    ]
+
 setuptools.setup(
         name='endaq-ide',
         version='1.1.0',
@@ -46,5 +59,13 @@ setuptools.setup(
         extras_require={
             'test': INSTALL_REQUIRES + TEST_REQUIRES,
             'example': INSTALL_REQUIRES + EXAMPLE_REQUIRES,
+            'async': INSTALL_REQUIRES + ASYNC_REQUIRES,
+            'parquet': INSTALL_REQUIRES + PARQUET_REQUIRES,
+            'dask': INSTALL_REQUIRES + DASK_REQUIRES,
+            },
+        entry_points={
+            'console_scripts': [
+                'endaq-ide=endaq.ide.cli:main',
+                ],
             },
 )
@@ -0,0 +1,177 @@
+import asyncio
+import functools
+import http.server
+import os.path
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+from endaq.ide import aio, files, info
+
+
+IDE_FILENAME = os.path.join(os.path.dirname(__file__), "test.ide")
+
+
+@pytest.fixture(scope="module")
+def server():
+    """ A local HTTP server, serving the test directory. """
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler,
+                                directory=os.path.dirname(IDE_FILENAME))
+    handler.func.log_message = lambda *args: None
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    httpd.handle_error = lambda *args: None  # e.g., cancelled downloads
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+@pytest.fixture(scope="module")
+def expected():
+    return files.get_doc(IDE_FILENAME)
+
+
+def assert_same(doc, expected):
+    assert doc.channels.keys() == expected.channels.keys()
+    for chid, ch in expected.channels.items():
+        assert np.array_equal(doc.channels[chid].getSession().arraySlice(),
+                              ch.getSession().arraySlice())
+
+
+def test_get_doc_async_file(expected):
+    doc = asyncio.run(aio.get_doc_async(IDE_FILENAME))
+    assert_same(doc, expected)
+
+    doc = asyncio.run(aio.get_doc_async(IDE_FILENAME, parsed=False))
+    assert len(doc.channels[32].getSession()) == 0
+
+    with pytest.raises(TypeError):
+        asyncio.run(aio.get_doc_async(IDE_FILENAME, filename=IDE_FILENAME))
+
+
+def test_get_doc_async_url(server, expected, tmp_path):
+    doc = asyncio.run(aio.get_doc_async(f"{server}/test.ide"))
+    assert_same(doc, expected)
+
+    doc = asyncio.run(aio.get_doc_async(url=f"{server}/test.ide", localfile=tmp_path))
+    assert os.path.isfile(tmp_path / "test.ide")
+    assert_same(doc, expected)
+
+    with pytest.raises(ValueError):
+        asyncio.run(aio.get_doc_async(f"{server}/missing.ide"))
+
+    # A failed download shouldn't leave a partial file
+    with pytest.raises(ValueError):
+        asyncio.run(aio.get_doc_async(f"{server}/missing.ide", localfile=tmp_path / "missing.ide"))
+    assert not os.path.exists(tmp_path / "missing.ide")
+
+
+def test_get_doc_async_buffered(server, expected, monkeypatch, tmp_path):
+    """ Test downloads written in several pieces. """
+    monkeypatch.setattr(aio, "WRITE_SIZE", 10000)
+    doc = asyncio.run(aio.get_doc_async(f"{server}/test.ide", localfile=tmp_path))
+    assert_same(doc, expected)
+    doc.close()
+    with open(tmp_path / "test.ide", 'rb') as f, open(IDE_FILENAME, 'rb') as original:
+        assert f.read() == original.read()
+
+
+def test_get_doc_async_shared(server, expected, tmp_path):
+    from endaq.ide.util import SharedFile
+
+    doc = asyncio.run(aio.get_doc_async(IDE_FILENAME, shared=True))
+    assert isinstance(doc.ebmldoc.stream, SharedFile)
+    assert_same(doc, expected)
+
+    doc = asyncio.run(aio.get_doc_async(f"{server}/test.ide", localfile=tmp_path, shared=True))
+    assert isinstance(doc.ebmldoc.stream, SharedFile)
+    assert_same(doc, expected)
+
+    with pytest.warns(UserWarning, match="local file"):
+        doc = asyncio.run(aio.get_doc_async(f"{server}/test.ide", shared=True))
+    assert_same(doc, expected)
+
+
+def test_get_doc_async_import_fails(server, tmp_path):
+    """ A download that can't be imported is discarded. """
+    localfile = tmp_path / "not_ide.ide"
+    with pytest.raises(ValueError):
+        asyncio.run(aio.get_doc_async(f"{server}/test_aio.py", localfile=localfile))
+    assert not os.path.exists(localfile)
+
+    async def cancel():
+        task = asyncio.create_task(aio.get_doc_async(f"{server}/test.ide", localfile=tmp_path))
+        while not os.path.exists(tmp_path / "test.ide"):
+            await asyncio.sleep(0.001)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    # Cancelled during the download or the import; either way, the file
+    # is removed (once the import has stopped).
+    asyncio.run(cancel())
+    for _ in range(100):
+        if not os.path.exists(tmp_path / "test.ide"):
+            break
+        threading.Event().wait(0.05)
+    assert not os.path.exists(tmp_path / "test.ide")
+
+
+def test_get_doc_async_no_aiohttp(server, expected, monkeypatch):
+    """ Test downloading without `aiohttp` (using `requests` in a thread). """
+    monkeypatch.setitem(sys.modules, 'aiohttp', None)
+    doc = asyncio.run(aio.get_doc_async(f"{server}/test.ide"))
+    assert_same(doc, expected)
+
+
+def test_get_url_cancel(server, tmp_path):
+    """ A cancelled download (in a thread) should stop and remove its
+        partial file.
+    """
+    from concurrent.futures import CancelledError
+
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(CancelledError):
+        files._get_url(f"{server}/test.ide", localfile=tmp_path, cancel=cancel)
+    assert not os.path.exists(tmp_path / "test.ide")
+
+
+def test_get_doc_async_concurrent(server, expected):
+    async def fetch_all():
+        limit = asyncio.Semaphore(2)
+        jobs = [aio.get_doc_async(f"{server}/test.ide", limit=limit) for _ in range(3)]
+        jobs.extend(aio.get_doc_async(IDE_FILENAME, limit=limit) for _ in range(3))
+        return await asyncio.gather(*jobs)
+
+    for doc in asyncio.run(fetch_all()):
+        assert_same(doc, expected)
+
+
+def test_get_doc_async_cancel():
+    async def cancel():
+        limit = asyncio.Semaphore(1)
+        await limit.acquire()
+        task = asyncio.create_task(aio.get_doc_async(IDE_FILENAME, limit=limit))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        # Cancel during the import
+        limit.release()
+        task = asyncio.create_task(aio.get_doc_async(IDE_FILENAME, limit=limit))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not limit.locked()
+
+    asyncio.run(cancel())
+
+
+def test_to_pandas_async(expected):
+    df = asyncio.run(aio.to_pandas_async(expected.channels[32], time_mode="seconds"))
+    assert df.equals(info.to_pandas(expected.channels[32], time_mode="seconds"))
@@ -0,0 +1,77 @@
+import os.path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from endaq.ide import align, files
+
+from .test_concat import _shifted
+
+
+IDE_FILENAME = os.path.join(os.path.dirname(__file__), "test.ide")
+
+
+@pytest.fixture
+def docs(tmp_path):
+    """ The test file, and a copy of it with a UTC start time 2 seconds
+        later (as if from a second recorder with an unsynchronized clock).
+    """
+    result = [files.get_doc(IDE_FILENAME, parsed=False),
+              files.get_doc(_shifted(tmp_path, 2), parsed=False)]
+    yield result
+    for doc in result:
+        doc.close()
+
+
+def test_get_offsets(docs):
+    assert align.get_offsets(docs) == [0, 2 * 10**6]
+
+    # The recordings' data are actually identical, so cross-correlation
+    # should find them to be simultaneous.
+    offsets = align.get_offsets(docs, refine=True, start="2s", end="15s", max_lag=5)
+    assert offsets[0] == 0
+    assert abs(offsets[1]) < 1000
+
+
+def test_align_docs(docs):
+    df = align.align_docs(docs, start="5s", end="6s", rate=1000, time_mode="seconds")
+    assert len(df) == 1000
+    assert df.index[0] == pytest.approx(5)
+    assert df.index[1] - df.index[0] == pytest.approx(0.001)
+    assert list(df.columns.levels[0]) == ["later.ide", "test.ide"]
+    assert list(df["test.ide"].columns) == ["X (16g)", "Y (16g)", "Z (16g)",
+                                            "X (8g)", "Y (8g)", "Z (8g)"]
+
+    # With UTC-based offsets, the copy's data is 2 seconds later
+    earlier = align.align_docs(docs[:1], start="3s", end="4s", rate=1000, time_mode="seconds")
+    np.testing.assert_allclose(df["later.ide"].values, earlier["test.ide"].values)
+
+    # With refined offsets, the two are the same
+    offsets = align.get_offsets(docs, refine=True, start="2s", end="15s", max_lag=5)
+    df = align.align_docs(docs, start="5s", end="6s", rate=1000, offsets=offsets)
+    np.testing.assert_allclose(df["later.ide"].values, df["test.ide"].values, atol=0.01)
+
+    # No data from the copy before it started
+    df = align.align_docs(docs, end="1s", rate=100, method="previous")
+    assert df["later.ide"].isna().all().all()
+    assert not df["test.ide"].iloc[-1].isna().any()
+
+    with pytest.raises(ValueError):
+        align.align_docs(docs, method="nearest")
+
+
+def test_align_docs_empty_timebase(docs, monkeypatch):
+    """ Test the default window when the first recording has no channels. """
+    expected = align.align_docs(docs, rate=100)
+    channels = align._channels
+    monkeypatch.setattr(align, "_channels",
+                        lambda doc, *args: [] if doc is docs[0] else channels(doc, *args))
+
+    df = align.align_docs(docs, rate=100)
+    assert list(df.columns.levels[0]) == ["later.ide"]
+    assert df["later.ide"].iloc[0].notna().any()
+
+    # The window is the copy's data, 2 seconds later in the first's time
+    assert df.index[0] - expected.index[0] == pd.Timedelta(seconds=2)
+    assert df.index[-1] - expected.index[-1] == pd.Timedelta(seconds=2)
@@ -0,0 +1,166 @@
+import os.path
+import shutil
+
+import numpy as np
+import pytest
+
+from endaq.ide import cache, files, info
+
+
+IDE_FILENAME = os.path.join(os.path.dirname(__file__), "test.ide")
+
+
+@pytest.fixture
+def ide_copy(tmp_path):
+    filename = tmp_path / "test.ide"
+    shutil.copy(IDE_FILENAME, filename)
+    return str(filename)
+
+
+@pytest.fixture
+def cached(ide_copy):
+    """ A copy of the test file with a cache, the file fully imported, and
+        the file opened without importing data.
+    """
+    cache.build_cache(ide_copy)
+    imported = files.get_doc(ide_copy)
+    unparsed = files.get_doc(ide_copy, parsed=False)
+    yield imported, unparsed
+    imported.close()
+    unparsed.close()
+
+
+def test_build_cache(ide_copy):
+    path = cache.build_cache(ide_copy)
+    assert path == ide_copy + cache.CACHE_SUFFIX
+    assert os.path.isfile(os.path.join(path, cache.METADATA_NAME))
+
+    doc = files.get_doc(ide_copy, parsed=False)
+    dc = cache.get_cache(doc)
+    assert dc is not None
+    assert sorted(dc.channels) == sorted(doc.channels)
+    assert cache.get_cache(doc) is dc
+
+    # Rebuilding replaces the existing cache
+    assert cache.build_cache(doc, channels=[32]) == path
+    assert cache.get_cache(doc).channels == [32]
+    assert not [f for f in os.listdir(os.path.dirname(path)) if f.startswith("test.ide.cache.")]
+
+
+def test_build_cache_closes(ide_copy, monkeypatch):
+    opened = []
+
+    def get_doc(*args, **kwargs):
+        opened.append(get_doc_orig(*args, **kwargs))
+        return opened[-1]
+
+    get_doc_orig = files.get_doc
+    monkeypatch.setattr(files, "get_doc", get_doc)
+
+    # Only a file opened by build_cache() is closed by it
+    cache.build_cache(ide_copy)
+    assert len(opened) == 1
+    assert opened[0].ebmldoc.stream.closed
+
+    doc = get_doc_orig(ide_copy, parsed=False)
+    cache.build_cache(doc)
+    assert not doc.ebmldoc.stream.closed
+    doc.close()
+
+
+def test_read(cached):
+    imported, unparsed = cached
+    dc = cache.get_cache(unparsed)
+    for chid, channel in imported.channels.items():
+        data = channel.getSession().arraySlice()
+        times, values = dc.read(unparsed.channels[chid])
+        np.testing.assert_array_equal(times, data[0])
+        np.testing.assert_array_equal(values, data[1:])
+
+        # Partial reads of a subchannel
+        keep = (data[0] >= 2_000_000) & (data[0] < 9_000_000)
+        times, values = dc.read(unparsed.channels[chid][0], 2_000_000, 9_000_000)
+        np.testing.assert_array_equal(times, data[0][keep])
+        np.testing.assert_array_equal(values[0], data[1][keep])
+
+    times, values = dc.read(unparsed.channels[32], raw=True)
+    assert values.dtype == np.int16
+    assert values.shape == (3, len(times))
+
+
+def test_to_pandas(cached):
+    imported, unparsed = cached
+    for chid in imported.channels:
+        for time_mode in ("seconds", "datetime"):
+            expected = info.to_pandas(imported.channels[chid], time_mode)
+            assert info.to_pandas(unparsed.channels[chid], time_mode).equals(expected)
+        expected = info.to_pandas(imported.channels[chid][1])
+        assert info.to_pandas(unparsed.channels[chid][1]).equals(expected)
+        expected = info.to_pandas(imported.channels[chid], raw=True)
+        result = info.to_pandas(unparsed.channels[chid], raw=True)
+        assert result.equals(expected)
+        assert result.attrs == expected.attrs
+        expected = info.to_pandas(imported.channels[chid], dtype=np.float32)
+        result = info.to_pandas(unparsed.channels[chid], dtype=np.float32)
+        assert all(dtype == np.float32 for dtype in result.dtypes)
+        np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(), rtol=1e-6)
+        assert result.index.equals(expected.index)
+
+
+@pytest.mark.parametrize("start, end", [(0, None), (2_000_000, 5_000_000),
+                                        ("0:03", "0:10"), (1_234_567.5, None),
+                                        (945343, 1954833)])
+def test_channel_table(cached, start, end):
+    imported, unparsed = cached
+    expected = info.get_channel_table(imported, start=start, end=end, formatting=False).data
+    result = info.get_channel_table(unparsed, start=start, end=end, formatting=False).data
+    assert result.drop(columns='channel').equals(expected.drop(columns='channel'))
+
+
+def test_partial_import(ide_copy):
+    """ Test that channels left empty by an import restricted to some
+        channels or to a time window don't use the cache.
+    """
+    cache.build_cache(ide_copy)
+
+    doc = files.get_doc(ide_copy, channels=[32])
+    try:
+        assert len(info.to_pandas(doc.channels[32])) == len(doc.channels[32].getSession())
+        assert info.to_pandas(doc.channels[80]).empty
+        table = info.get_channel_table(doc, formatting=False).data
+        assert (table.loc[table['channel'].map(lambda ch: ch.parent.id) == 80, 'samples'] == 0).all()
+        assert (table.loc[table['channel'].map(lambda ch: ch.parent.id) == 32, 'samples'] > 0).all()
+    finally:
+        doc.close()
+
+    doc = files.get_doc(ide_copy, start="1:00")
+    try:
+        assert all(info.to_pandas(ch).empty for ch in doc.channels.values())
+        table = info.get_channel_table(doc, formatting=False).data
+        assert (table['samples'] == 0).all()
+    finally:
+        doc.close()
+
+
+def test_stale_cache(ide_copy):
+    cache.build_cache(ide_copy)
+    with open(ide_copy, 'ab') as f:
+        f.write(b'\x00')
+    doc = files.get_doc(ide_copy, parsed=False)
+    assert cache.get_cache(doc) is None
+
+
+def test_no_cache(ide_copy):
+    doc = files.get_doc(ide_copy, parsed=False)
+    assert cache.get_cache(doc) is None
+
+
+def test_cache_directory(ide_copy, tmp_path):
+    cachedir = tmp_path / "caches"
+    cachedir.mkdir()
+    path = cache.build_cache(ide_copy, directory=str(cachedir))
+    assert os.path.dirname(path) == str(cachedir)
+
+    doc = files.get_doc(ide_copy, parsed=False)
+    assert cache.get_cache(doc) is None
+    assert cache.get_cache(doc, directory=str(cachedir)) is not None
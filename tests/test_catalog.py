@@ -0,0 +1,172 @@
+import datetime
+import os.path
+import shutil
+
+import idelib
+import numpy as np
+import pandas as pd
+import pytest
+
+from endaq.ide import catalog, info
+from endaq.ide.measurement import ACCELERATION, PRESSURE
+
+
+IDE_FILENAME = os.path.join(os.path.dirname(__file__), "test.ide")
+
+
+@pytest.fixture
+def recordings(tmp_path):
+    """ A directory tree containing several copies of the test IDE file and a
+        file that isn't an IDE.
+    """
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "b").mkdir()
+    paths = [tmp_path / "one.ide",
+             tmp_path / "a" / "two.ide",
+             tmp_path / "a" / "b" / "three.ide"]
+    for p in paths:
+        shutil.copy(IDE_FILENAME, p)
+    (tmp_path / "a" / "bogus.ide").write_bytes(b"not an IDE file" * 10)
+    return tmp_path, sorted(str(p) for p in paths)
+
+
+def test_scan_file():
+    record, channels = catalog._scan_file(IDE_FILENAME)
+    assert record['valid'] == 1
+    assert record['serial'] == '10913'
+    assert record['product'] == 'S2-D8D16'
+    assert record['utc_start'] == 1613047222
+    assert record['duration'] == record['end'] - record['start']
+
+    rates = {(c['channel'], c['subchannel']): c['rate'] for c in channels}
+    assert rates[(32, 0)] == pytest.approx(395, rel=0.05)
+    assert {c['measurement_type'] for c in channels if c['channel'] == 32} == {'acc'}
+
+
+def test_catalog_query(recordings):
+    root, paths = recordings
+    with catalog.build_catalog(root) as cat:
+        assert len(cat) == 3
+        assert cat.get(os.path.join(root, "a", "bogus.ide"))['valid'] == 0
+
+        assert cat.query() == paths
+        assert cat.query(serial=10913) == paths
+        assert cat.query(serial=12345) == []
+        assert cat.query(product="S2-%") == paths
+
+        assert cat.query(measurement_type=ACCELERATION, min_rate=100) == paths
+        assert cat.query(measurement_type="accel", min_rate=100) == paths
+        assert cat.query(measurement_type=ACCELERATION, min_rate=5000) == []
+        assert cat.query(measurement_type=PRESSURE, min_rate=100) == []
+        assert cat.query(measurement_type=ACCELERATION+PRESSURE, min_rate=100) == paths
+        assert cat.query(measurement_type=PRESSURE+ACCELERATION, min_rate=100) == paths
+        assert cat.query(measurement_type="*-acc", min_rate=100) == []
+        with pytest.raises(TypeError):
+            cat.query(measurement_type="bogus")
+
+        assert cat.query(start=datetime.datetime(2021, 2, 1),
+                         end=datetime.datetime(2021, 3, 1)) == paths
+        assert cat.query(start=datetime.datetime(2021, 3, 1)) == []
+        assert cat.query(end=1613047222 - 1) == []
+
+        info = cat.get(paths[0])
+        assert info['serial'] == '10913'
+        assert len(info['channels']) == 16
+
+
+def test_scan_file_error(monkeypatch):
+    """ Any error reading a file should mark it invalid, not stop the scan. """
+    import struct
+
+    def _fail(*args, **kwargs):
+        raise struct.error("unpack requires a buffer of 4 bytes")
+
+    monkeypatch.setattr(catalog, "openFile", _fail)
+    record, channels = catalog._scan_file(IDE_FILENAME)
+    assert record['valid'] == 0
+    assert record['error'] == "error: unpack requires a buffer of 4 bytes"
+    assert channels == []
+
+
+def test_catalog_update(recordings, tmp_path):
+    root, paths = recordings
+    database = str(tmp_path / "catalog.db")
+
+    with catalog.Catalog(database) as cat:
+        assert cat.update(root) == 4
+        assert cat.update(root) == 0
+
+    # Modify one file, delete another
+    os.utime(paths[0], (0, 0))
+    os.remove(paths[1])
+
+    with catalog.Catalog(database) as cat:
+        assert cat.update(root) == 1
+        assert cat.query() == [paths[0], paths[2]]
+        assert cat.get(paths[1]) is None
+
+
+def test_catalog_workers(recordings):
+    root, paths = recordings
+    with catalog.build_catalog(root, workers=2) as cat:
+        assert cat.query(serial=10913) == paths
+
+
+@pytest.fixture
+def sequence(tmp_path):
+    """ Two consecutive recordings: the test file, and a copy with its
+        session start time moved 60 seconds later.
+    """
+    data = bytearray(open(IDE_FILENAME, 'rb').read())
+    utc = (1613047222).to_bytes(4, 'big')
+    pos = data.index(utc)
+    data[pos:pos+4] = (1613047222 + 60).to_bytes(4, 'big')
+    shutil.copy(IDE_FILENAME, tmp_path / "first.ide")
+    (tmp_path / "second.ide").write_bytes(data)
+    return tmp_path
+
+
+def test_get_interval(sequence):
+    expected = info.to_pandas(idelib.importFile(IDE_FILENAME).channels[32])
+    start = datetime.datetime(2021, 2, 11, 12, 40, 25)
+    end = datetime.datetime(2021, 2, 11, 12, 40, 30)
+
+    # Interval within only the first file
+    result = catalog.get_interval(sequence, start, end, channels=[32])
+    window = expected[(expected.index >= start) & (expected.index < end)]
+    assert result.columns.tolist() == expected.columns.tolist()
+    assert np.array_equal(result.index.values, window.index.values)
+    assert np.array_equal(result.to_numpy(), window.to_numpy())
+
+    # Interval spanning both files
+    offset = pd.Timedelta(seconds=60)
+    start = datetime.datetime(2021, 2, 11, 12, 40, 30)
+    end = start + datetime.timedelta(seconds=65)
+    with catalog.build_catalog(sequence) as cat:
+        result = catalog.get_interval(cat, start, end, channels=[32])
+    first = expected[expected.index >= start]
+    second = expected[expected.index + offset < end]
+    assert len(result) == len(first) + len(second)
+    assert result.index.is_monotonic_increasing
+    assert np.array_equal(result.index.values[len(first):], (second.index + offset).values)
+
+    # Measurement type selection, and no matching files
+    result = catalog.get_interval(sequence, start, end, measurement_type=ACCELERATION)
+    assert len(result.columns) == 6
+    assert catalog.get_interval(sequence, end=datetime.datetime(2020, 1, 1)).empty
+
+
+def test_get_interval_no_utc(sequence):
+    """ A recording without a UTC start time is skipped. """
+    data = bytearray(open(IDE_FILENAME, 'rb').read())
+    pos = data.index((1613047222).to_bytes(4, 'big'))
+    data[pos:pos+4] = bytes(4)
+    (sequence / "no_utc.ide").write_bytes(data)
+    with open(sequence / "no_utc.ide", 'rb') as f:
+        assert not idelib.importer.openFile(f).lastSession.utcStartTime
+
+    expected = catalog.get_interval(sequence / "first.ide", channels=[32])
+    assert isinstance(expected.index, pd.DatetimeIndex)
+    result = catalog.get_interval([sequence / "first.ide", sequence / "no_utc.ide"],
+                                  channels=[32])
+    assert result.equals(expected)
@@ -0,0 +1,121 @@
+import io
+import json
+import os.path
+import shutil
+
+import pandas as pd
+import pytest
+from idelib.importer import importFile
+
+from endaq.ide import cli, info
+
+
+IDE_FILENAME = os.path.join(os.path.dirname(__file__), "test.ide")
+
+
+@pytest.fixture
+def recordings(tmp_path):
+    (tmp_path / "sub").mkdir()
+    paths = [tmp_path / "a.ide", tmp_path / "b.ide", tmp_path / "sub" / "c.ide"]
+    for p in paths:
+        shutil.copy(IDE_FILENAME, p)
+    return tmp_path
+
+
+def run(*argv):
+    """ Run the command-line tool, returning the exit status and output. """
+    stdout, stderr = io.StringIO(), io.StringIO()
+    status = cli.main([str(a) for a in argv], stdout=stdout, stderr=stderr)
+    return status, stdout.getvalue(), stderr.getvalue()
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_info(recordings, jobs):
+    status, out, err = run("info", "-j", jobs, recordings)
+    assert status == 0
+    lines = out.splitlines()
+    assert lines[0].startswith("path\tserial")
+    assert len(lines) == 4
+    assert lines[1].split("\t")[1] == "10913"
+    assert "3 of 3 files" in err
+
+    status, out, err = run("info", "--json", "-q", recordings / "a.ide")
+    result = json.loads(out)
+    assert result['serial'] == "10913"
+    assert len(result['channels']) == 16
+    assert err == ""
+
+
+def test_table(recordings):
+    status, out, err = run("table", "-t", "acc", recordings / "a.ide")
+    assert status == 0
+    table = pd.read_csv(io.StringIO(out))
+    assert table['channel'].tolist() == [32.0, 32.1, 32.2, 80.0, 80.1, 80.2]
+    assert (table['samples'][:3] == 7113).all()
+
+
+def test_extract(recordings, tmp_path):
+    outdir = tmp_path / "out"
+    status, out, err = run("extract", "-s", "5", "-e", "10", "-c", "32", "-o", outdir,
+                           recordings / "a.ide")
+    assert status == 0
+    extracted = outdir / "a_extract.ide"
+    assert out.strip() == str(extracted)
+    with importFile(str(extracted)) as doc:
+        assert 0 < len(doc.channels[32].getSession()) < 7113
+        assert len(doc.channels[80].getSession()) == 0
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_export(recordings, tmp_path, fmt):
+    if fmt == "parquet":
+        pytest.importorskip("pyarrow")
+    outdir = tmp_path / "out"
+    status, out, err = run("export", "-f", fmt, "-c", "32,80", "--time-mode", "seconds",
+                           "-o", outdir, recordings / "a.ide")
+    assert status == 0
+    assert sorted(os.listdir(outdir)) == [f"a_ch32.{fmt}", f"a_ch80.{fmt}"]
+
+    with importFile(IDE_FILENAME) as doc:
+        expected = info.to_pandas(doc.channels[32], time_mode="seconds")
+    if fmt == "csv":
+        result = pd.read_csv(outdir / "a_ch32.csv", index_col=0)
+    else:
+        result = pd.read_parquet(outdir / "a_ch32.parquet")
+    assert result.shape == expected.shape
+    assert result.to_numpy() == pytest.approx(expected.to_numpy())
+
+
+def test_export_dtype(recordings, tmp_path):
+    pytest.importorskip("pyarrow")
+    outdir = tmp_path / "out"
+    status, out, err = run("export", "-f", "parquet", "-c", "32", "--dtype", "float32",
+                           "-o", outdir, recordings / "a.ide")
+    assert status == 0
+    result = pd.read_parquet(outdir / "a_ch32.parquet")
+    assert all(dtype == "float32" for dtype in result.dtypes)
+
+
+def test_check(recordings):
+    data = (recordings / "b.ide").read_bytes()
+    (recordings / "b.ide").write_bytes(data[:-100])
+    status, out, err = run("check", "-j", 2, recordings)
+    assert status == 0
+    lines = out.splitlines()
+    assert lines[0] == cli.CHECK_HEADER
+    assert len(lines) == 2
+    assert lines[1].startswith(f"{recordings / 'b.ide'},truncated,")
+
+
+def test_errors(recordings, tmp_path):
+    (recordings / "bad.ide").write_bytes(b"not an IDE" * 100)
+    status, out, err = run("info", recordings)
+    assert status == 1
+    assert "bad.ide" in err
+    assert "3 of 4 files" in err
+
+    status, out, err = run("info", tmp_path / "nothing*.ide")
+    assert status == 2
+
+    with pytest.raises(SystemExit):
+        run("export", "-c", "x", recordings)
@@ -0,0 +1,114 @@
+import io
+import os.path
+
+import numpy as np
+import pytest
+
+from endaq.ide import concat, files, info
+from endaq.ide.util import walk_elements
+
+
+IDE_FILENAME = os.path.join(os.path.dirname(__file__), "test.ide")
+
+
+def _shifted(tmp_path, seconds, name="later.ide"):
+    """ Make a copy of the test file, recorded `seconds` later. """
+    with open(IDE_FILENAME, 'rb') as f:
+        data = bytearray(f.read())
+    doc = files.get_doc(IDE_FILENAME, parsed=False)
+    eid = doc.ebmldoc.schema['TimeBaseUTC'].id
+    doc.close()
+
+    for el, _offset, payload, size in walk_elements(io.BytesIO(bytes(data)), 0):
+        if el == eid:
+            utc = int.from_bytes(data[payload:payload + size], 'big', signed=True)
+            data[payload:payload + size] = (utc + seconds).to_bytes(size, 'big', signed=True)
+
+    path = tmp_path / name
+    path.write_bytes(bytes(data))
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def original():
+    doc = files.get_doc(IDE_FILENAME)
+    yield doc
+    doc.close()
+
+
+@pytest.mark.parametrize("seconds", [100, 1000])
+def test_concat_docs_file(tmp_path, original, seconds):
+    """ Test merging recordings into one file, including with a gap longer
+        than the timestamp rollover period.
+    """
+    later = _shifted(tmp_path, seconds)
+    out = tmp_path / "merged.ide"
+
+    # Given out of order; merged in order of start time
+    written, blocks = concat.concat_docs([later, IDE_FILENAME], out=str(out))
+    assert written == os.path.getsize(out)
+
+    merged = files.get_doc(str(out))
+    try:
+        assert blocks == 2 * sum(len(ch.getSession()._data) for ch in original.channels.values())
+        assert merged.lastSession.utcStartTime == original.lastSession.utcStartTime
+
+        for chid in original.channels:
+            expected = info.to_pandas(original.channels[chid], time_mode="seconds")
+            result = info.to_pandas(merged.channels[chid], time_mode="seconds")
+            n = len(expected)
+            assert len(result) == 2 * n
+            np.testing.assert_array_equal(result.values[:n], expected.values)
+            np.testing.assert_array_equal(result.values[n:], expected.values)
+            np.testing.assert_allclose(result.index[:n], expected.index, atol=1e-4)
+            np.testing.assert_allclose(result.index[n:], expected.index + seconds, atol=1e-4)
+    finally:
+        merged.close()
+
+
+def test_concat_docs_virtual(tmp_path, original):
+    later = _shifted(tmp_path, 100)
+    ch = original.channels[32]
+
+    with concat.concat_docs([IDE_FILENAME, later]) as multi:
+        assert len(multi.docs) == 2
+        assert multi.offsets == [0, 100 * 10**6]
+        assert multi.utc_start == original.lastSession.utcStartTime
+
+        expected = info.to_pandas(ch, time_mode="seconds")
+        result = multi.to_pandas(ch, time_mode="seconds")
+        n = len(expected)
+        assert len(result) == 2 * n
+        np.testing.assert_allclose(result.values[n:], expected.values)
+        np.testing.assert_allclose(result.index[n:], expected.index + 100, atol=1e-4)
+
+        # A window within the second recording
+        t, values = multi.read(ch[0], start=101 * 10**6, end=103 * 10**6)
+        assert t[0] >= 101 * 10**6 and t[-1] < 103 * 10**6
+        assert values.shape == (1, len(t))
+        t0, expected = info.to_numpy(ch[0])
+        keep = (t0 >= 10**6) & (t0 < 3 * 10**6)
+        np.testing.assert_allclose(t, t0[keep] + 100 * 10**6)
+        np.testing.assert_allclose(values[0], expected[keep][:, 0])
+
+        # A window in the gap between them
+        t, values = multi.read(32, start=50 * 10**6, end=60 * 10**6)
+        assert len(t) == 0 and values.shape == (3, 0)
+
+    assert not multi._opened
+
+
+def test_concat_docs_incompatible(tmp_path):
+    later = _shifted(tmp_path, 100)
+
+    with pytest.raises(ValueError, match="overlaps"):
+        concat.concat_docs([IDE_FILENAME, _shifted(tmp_path, 5, "overlap.ide")])
+
+    doc = files.get_doc(later, parsed=False)
+    doc.channels[32].subchannels[0].name = "Q"
+    with pytest.raises(ValueError, match="channel 32 has a different subchannels"):
+        concat.concat_docs([IDE_FILENAME, doc])
+    doc.close()
+
+    with pytest.raises(ValueError):
+        concat.concat_docs([])
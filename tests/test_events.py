@@ -0,0 +1,151 @@
+import os.path
+import shutil
+
+import numpy as np
+import pytest
+
+from endaq.ide import events, files, stats
+from endaq.ide.blocks import BlockIndex
+
+
+IDE_FILENAME = os.path.join(os.path.dirname(__file__), "test.ide")
+
+
+@pytest.fixture
+def doc(tmp_path):
+    filename = tmp_path / "test.ide"
+    shutil.copy(IDE_FILENAME, filename)
+    return files.get_doc(str(filename))
+
+
+def brute_force(channel, threshold, min_gap=0, absolute=True):
+    """ Find events by checking every sample. """
+    data = channel.getSession().arraySlice()
+    t, values = data[0], data[1:]
+    if absolute:
+        values = np.abs(values)
+    hits = np.flatnonzero((values >= threshold).any(axis=0))
+
+    found = []
+    for i in hits:
+        if found and (i - found[-1][-1] == 1 or t[i] - t[found[-1][-1]] <= min_gap):
+            found[-1].append(i)
+        else:
+            found.append([i])
+    return [(t[idx[0]], t[idx[-1]], values[:, idx].max(), len(idx)) for idx in found]
+
+
+@pytest.mark.parametrize("channel_id, threshold", [(32, 1.6), (32, 0.9), (80, 0.5)])
+@pytest.mark.parametrize("min_gap", [0, 200_000, "1s"])
+def test_find_events(doc, channel_id, threshold, min_gap):
+    channel = doc.channels[channel_id]
+    result = events.find_events(channel, threshold, min_gap=min_gap, cache=False)
+    expected = brute_force(channel, threshold, 1_000_000 if min_gap == "1s" else min_gap)
+
+    assert len(result) == len(expected) > 0
+    np.testing.assert_allclose(result['start'], [e[0] for e in expected])
+    np.testing.assert_allclose(result['end'], [e[1] for e in expected])
+    np.testing.assert_allclose(result['peak'], [e[2] for e in expected])
+    assert list(result['samples']) == [e[3] for e in expected]
+    assert (result['duration'] == result['end'] - result['start']).all()
+    assert ((result['peak_time'] >= result['start']) & (result['peak_time'] <= result['end'])).all()
+
+
+def test_find_events_subchannel(doc):
+    sub = doc.channels[32][2]
+    result = events.find_events(sub, 1.6, cache=False)
+    assert (result['subchannel'] == sub.name).all()
+    assert len(result) == len(brute_force(sub, 1.6))
+
+
+def test_find_events_interval(doc):
+    channel = doc.channels[32]
+    everything = events.find_events(channel, 0.9, cache=False)
+    middle = everything['start'].iloc[len(everything) // 2]
+    result = events.find_events(channel, 0.9, start=middle, end="0:15", cache=False)
+    assert result['start'].iloc[0] == middle
+    assert (result['end'] < 15_000_000).all()
+
+
+def test_find_events_skips_blocks(doc, monkeypatch):
+    """ Only blocks containing exceedances should be read. """
+    channel = doc.channels[32]
+    block_stats = stats.get_stats(doc, cache=False)
+    block_stats.get(32)
+    index = block_stats.index
+    read = []
+    original = index.read
+
+    def read_blocks(ch, blocks=None, raw=False):
+        read.append(len(blocks))
+        return original(ch, blocks, raw)
+
+    index.read = read_blocks
+    result = events.find_events(channel, 1.6)
+    assert len(result)
+    assert 0 < sum(read) < len(index[32]) // 4
+
+
+@pytest.mark.parametrize("channel_id", [32, 80])
+def test_find_events_single_pass(doc, monkeypatch, channel_id):
+    """ Without computed statistics, each block should be decoded at most
+        once; blocks with recorder-written minimums and maximums below the
+        threshold shouldn't be decoded at all. (The test file's channel 80
+        has recorder-written values that don't match its data; they should
+        be ignored.)
+    """
+    channel = doc.channels[channel_id]
+    index = stats.get_stats(doc).index
+    _lows, _highs, present = index.read_min_max(channel_id)
+    assert present.any() == (channel_id == 32)
+
+    read = []
+    original = index.read
+
+    def read_blocks(ch, blocks=None, raw=False):
+        read.extend(blocks['offset'].tolist())
+        return original(ch, blocks, raw)
+
+    monkeypatch.setattr(index, "read", read_blocks)
+    result = events.find_events(channel, 1.6)
+    assert len(result) == len(brute_force(channel, 1.6))
+    assert len(read) == len(set(read))
+    assert stats.get_stats(doc).get(channel_id, compute=False) is None
+
+    skipped = set(index[channel_id]['offset'].tolist()) - set(read)
+    assert skipped <= set(index[channel_id]['offset'][present].tolist())
+    assert len(skipped) > 0 if channel_id == 32 else not skipped
+
+
+def test_read_min_max_invalid_later(tmp_path):
+    """ Recorder-written values that are wrong after the first block (here,
+        the last block's maximums are its minimums) aren't used.
+    """
+    filename = tmp_path / "bad_max.ide"
+    shutil.copy(IDE_FILENAME, filename)
+    doc = files.get_doc(str(filename), parsed=False)
+    index = BlockIndex(doc)
+    assert index.read_min_max(32)[2].any()
+    offset = [off for off in index._minmax[32] if off >= 0][-1]
+    size = doc.channels[32].getSession()._npType.itemsize
+    doc.close()
+
+    with open(filename, 'r+b') as f:
+        f.seek(offset)
+        minimums = f.read(size)
+        f.seek(offset + 2 * size)
+        f.write(minimums)
+
+    doc = files.get_doc(str(filename))
+    try:
+        _lows, _highs, present = BlockIndex(doc).read_min_max(32)
+        assert not present.any()
+        assert len(events.find_events(doc.channels[32], 1.6)) == len(brute_force(doc.channels[32], 1.6))
+    finally:
+        doc.close()
+
+
+def test_find_events_none(doc):
+    result = events.find_events(doc.channels[32], 1000, cache=False)
+    assert list(result.columns) == events.EVENT_COLUMNS
+    assert len(result) == 0
@@ -0,0 +1,123 @@
+import gzip
+import io
+import os.path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from endaq.ide import export, files, get_channels, info
+
+
+IDE_FILENAME = os.path.join(os.path.dirname(__file__), "test.ide")
+
+
+@pytest.fixture
+def test_IDE():
+    doc = files.get_doc(IDE_FILENAME)
+    yield doc
+    doc.close()
+
+
+def read_csv(text, time_mode="seconds"):
+    result = pd.read_csv(io.StringIO(text), index_col=0)
+    if time_mode == "timedelta":
+        result.index = pd.to_timedelta(result.index)
+    elif time_mode == "datetime":
+        result.index = pd.to_datetime(result.index)
+    return result
+
+
+@pytest.mark.parametrize("time_mode", ["seconds", "timedelta", "datetime"])
+@pytest.mark.parametrize("subchannel", [False, True])
+def test_export_csv(test_IDE, time_mode, subchannel):
+    channel = test_IDE.channels[32]
+    if subchannel:
+        channel = channel.subchannels[2]
+
+    out = io.StringIO()
+    rows = export.export_csv(channel, out, time_mode=time_mode)
+    result = read_csv(out.getvalue(), time_mode)
+    expected = info.to_pandas(channel, time_mode=time_mode)
+
+    assert rows == len(expected)
+    assert result.columns.tolist() == expected.columns.tolist()
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(), rtol=1e-8)
+    if time_mode == "seconds":
+        np.testing.assert_allclose(result.index, expected.index, rtol=0, atol=1e-9)
+    else:
+        assert (result.index == expected.index).all()
+
+
+def test_export_csv_interval(test_IDE):
+    channel = test_IDE.channels[80]
+    out = io.StringIO()
+    export.export_csv(channel, out, start="0:02", end=5_500_000, time_mode="seconds")
+    result = read_csv(out.getvalue())
+
+    expected = info.to_pandas(channel, time_mode="seconds")
+    expected = expected[(expected.index >= 2) & (expected.index < 5.5)]
+    assert len(result) == len(expected)
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(), rtol=1e-8)
+
+
+def test_export_csv_gzip(test_IDE, tmp_path):
+    filename = tmp_path / "ch59.csv.gz"
+    rows = export.export_csv(test_IDE.channels[59], str(filename), time_mode="seconds")
+    with gzip.open(filename, 'rt') as f:
+        result = read_csv(f.read())
+    assert rows == len(result) == len(test_IDE.channels[59].getSession())
+
+    # Binary streams, compressed or not
+    for compression in (None, "gzip"):
+        out = io.BytesIO()
+        export.export_csv(test_IDE.channels[59], out, compression=compression)
+        data = out.getvalue()
+        if compression:
+            data = gzip.decompress(data)
+        assert len(read_csv(data.decode('utf-8'))) == rows
+
+
+@pytest.mark.parametrize("align", ["previous", "linear"])
+def test_export_csv_aligned(test_IDE, align):
+    channels = [test_IDE.channels[32], test_IDE.channels[36][0], test_IDE.channels[59]]
+    out = io.StringIO()
+    export.export_csv(channels, out, time_mode="seconds", align=align,
+                      reference=test_IDE.channels[32])
+    result = read_csv(out.getvalue())
+
+    # The reference channel's own times and values
+    expected = info.to_pandas(test_IDE.channels[32], time_mode="seconds")
+    assert len(result) == len(expected)
+    np.testing.assert_allclose(result.iloc[:, :3].to_numpy(), expected.to_numpy(), rtol=1e-8)
+    times = expected.index.to_numpy()
+
+    for column, channel in ((3, test_IDE.channels[36][0]), (5, test_IDE.channels[59][1])):
+        other = info.to_pandas(channel, time_mode="seconds")
+        if align == "previous":
+            aligned = pd.merge_asof(pd.DataFrame(index=expected.index), other,
+                                    left_index=True, right_index=True)
+            aligned = aligned.iloc[:, 0].to_numpy()
+        else:
+            aligned = np.interp(times, other.index, other.iloc[:, 0],
+                                left=np.nan, right=np.nan)
+        np.testing.assert_allclose(result.iloc[:, column].to_numpy(), aligned, rtol=1e-7)
+
+
+def test_export_csv_dataset(test_IDE):
+    out = io.StringIO()
+    rows = export.export_csv(test_IDE, out, measurement_type="acc")
+    result = read_csv(out.getvalue(), "datetime")
+    assert rows == len(result)
+    expected = [f"{sch.parent.id}.{sch.id}: {sch.name}"
+                for sch in get_channels(test_IDE, "acc", subchannels=True)]
+    assert result.columns.tolist() == expected
+
+
+def test_export_csv_errors(test_IDE):
+    with pytest.raises(ValueError):
+        export.export_csv(test_IDE.channels[32], io.StringIO(), time_mode="bogus")
+    with pytest.raises(ValueError):
+        export.export_csv(test_IDE.channels[32], io.StringIO(), align="bogus")
+    with pytest.raises(TypeError):
+        export.export_csv(test_IDE.channels[32], io.StringIO(), compression="gzip")
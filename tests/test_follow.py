@@ -0,0 +1,134 @@
+import os.path
+
+import numpy as np
+import pandas as pd
+import pytest
+from idelib.importer import importFile
+
+from endaq.ide import follow, info
+from endaq.ide.blocks import BlockIndex
+from endaq.ide.util import walk_elements
+
+
+IDE_FILENAME = os.path.join(os.path.dirname(__file__), "test.ide")
+
+
+@pytest.fixture
+def test_IDE():
+    with importFile(IDE_FILENAME) as ds:
+        yield ds
+
+
+@pytest.fixture
+def ide_bytes():
+    with open(IDE_FILENAME, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def first_block():
+    """ The offset and size of the first `ChannelDataBlock` element. """
+    with open(IDE_FILENAME, 'rb') as f:
+        for eid, offset, payload, size in walk_elements(f, 0):
+            if eid == BlockIndex.BLOCK_ID:
+                return offset, payload + size - offset
+
+
+def test_follower_partial(test_IDE, ide_bytes, first_block, tmp_path):
+    """ Test reading a file in several pieces, some of which end partway
+        through an element.
+    """
+    filename = tmp_path / "growing.ide"
+    block_offset, block_size = first_block
+
+    # Cut points: mid-metadata, mid-block, and a few arbitrary ones
+    cuts = [block_offset // 2,
+            block_offset + block_size // 2,
+            len(ide_bytes) // 3,
+            len(ide_bytes) // 2 + 7,
+            len(ide_bytes)]
+
+    frames = {}
+    with follow.Follower(filename, time_mode="seconds") as follower:
+        # File doesn't exist yet
+        assert follower.poll() == {}
+
+        pos = 0
+        for n, cut in enumerate(cuts):
+            with open(filename, 'ab') as f:
+                f.write(ide_bytes[pos:cut])
+            pos = cut
+
+            result = follower.poll()
+            if n < 2:
+                # Metadata incomplete, or first block incomplete
+                assert result == {}
+                continue
+
+            assert follower.offset <= cut
+            for chid, df in result.items():
+                frames.setdefault(chid, []).append(df)
+
+        # Nothing new
+        assert follower.poll() == {}
+
+    for chid, ch in test_IDE.channels.items():
+        expected = info.to_pandas(ch, time_mode="seconds")
+        result = pd.concat(frames[chid])
+        assert result.columns.tolist() == expected.columns.tolist()
+        assert np.array_equal(result.index.values, expected.index.values)
+        assert np.array_equal(result.to_numpy(), expected.to_numpy())
+
+
+def test_follower_arrays(test_IDE):
+    with follow.Follower(IDE_FILENAME, channels=[32], time_mode=None, raw=True) as follower:
+        result = follower.poll()
+
+    assert list(result) == [32]
+    t, values = result[32]
+    expected = test_IDE.channels[32].getSession()
+    assert len(t) == len(expected)
+    assert values.shape == (len(expected.parent.subchannels), len(expected))
+    assert np.array_equal(values[0], expected._accessCache(None, None, None)['0'])
+
+
+def test_follow(test_IDE):
+    results = list(follow.follow(IDE_FILENAME, interval=0, timeout=0))
+    assert len(results) == 1
+    assert set(results[0]) == set(test_IDE.channels)
+
+
+def test_block_index_bivariate():
+    """ Test bivariate calibration (applied to one of channel 80's
+        subchannels, with the temperature as the secondary input) against
+        `idelib`.
+    """
+    from idelib.importer import openFile, readData
+    from idelib.transforms import Bivariate
+
+    def _open():
+        doc = openFile(open(IDE_FILENAME, 'rb'))
+        poly = Bivariate([0.5, 2.0, 3.0, 1.0], calId=1000, dataset=doc,
+                         channelId=36, subchannelId=1)
+        doc.channels[80].subchannels[0].setTransform(poly)
+        return doc
+
+    imported = _open()
+    readData(imported)
+    expected = imported.channels[80].getSession().arraySlice()
+
+    doc = _open()
+    index = BlockIndex(doc)
+    assert index.get_references(doc.channels[80]) == \
+        {(36, 1): imported.channels[36][1].getSession().getMean()}
+
+    t, values = index.read(doc.channels[80])
+    np.testing.assert_array_equal(t, expected[0])
+    np.testing.assert_allclose(values, expected[1:])
+
+    t, values = index.read(doc.channels[80][0], index.find(80, 2 * 10**6, 3 * 10**6))
+    keep = np.isin(expected[0], t)
+    np.testing.assert_allclose(values[0], expected[1][keep])
+
+    imported.close()
+    doc.close()
@@ -0,0 +1,186 @@
+import http.server
+import os.path
+import re
+import threading
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from endaq.ide import files, gdrive
+
+
+IDE_FILENAME = os.path.join(os.path.dirname(__file__), "test.ide")
+
+FILE_ID = "1abcDEFghiJKL_mno-pqr"
+TOKEN = "t0k3n"
+
+
+class MockDriveHandler(http.server.BaseHTTPRequestHandler):
+    """ A minimal imitation of Google Drive's download server. Files are
+        'too large to scan for viruses,' so requests without a confirmation
+        token get an intermediate page. The style of confirmation page and
+        support for ranged requests are set on the server.
+    """
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        server.requests.append((url.path, query, self.headers.get('Range')))
+
+        if query.get('id') != FILE_ID:
+            self.send_error(404)
+            return
+
+        if url.path == "/uc" and query.get('confirm') != TOKEN:
+            self.send_warning()
+        elif url.path in ("/uc", "/download") and query.get('confirm') == TOKEN:
+            self.send_file()
+        else:
+            self.send_error(404)
+
+    def send_warning(self):
+        if self.server.style == "form":
+            body = (f'<html><body><p>Google Drive can&#39;t scan this file for viruses.</p>'
+                    f'<form id="download-form" action="/download" method="get">'
+                    f'<input type="submit" value="Download anyway"/>'
+                    f'<input type="hidden" name="id" value="{FILE_ID}">'
+                    f'<input type="hidden" name="confirm" value="{TOKEN}">'
+                    f'<input type="hidden" name="uuid" value="1234-5678"></form>'
+                    f'</body></html>').encode()
+        else:
+            body = (f'<html><body><a href="/uc?export=download&amp;confirm={TOKEN}&amp;'
+                    f'id={FILE_ID}">Download anyway</a></body></html>').encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if self.server.style == "cookie":
+            self.send_header('Set-Cookie', f'download_warning_{FILE_ID}={TOKEN}; Path=/')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_file(self):
+        data = self.server.data
+        first, last = 0, len(data) - 1
+        byte_range = self.headers.get('Range')
+        if self.server.ranges and byte_range:
+            m = re.match(r"bytes=(\d+)-(\d+)", byte_range)
+            first, last = int(m.group(1)), min(int(m.group(2)), last)
+            if self.server.fail_ranges and first > 0:
+                self.send_response(500)
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {first}-{last}/{len(data)}")
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Disposition', 'attachment; filename="test.ide"')
+        self.send_header('Content-Length', str(last + 1 - first))
+        if self.server.ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        self.wfile.write(data[first:last + 1])
+
+
+@pytest.fixture
+def drive(monkeypatch):
+    with open(IDE_FILENAME, 'rb') as f:
+        data = f.read()
+
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), MockDriveHandler)
+    httpd.data = data
+    httpd.style = "form"
+    httpd.ranges = True
+    httpd.fail_ranges = False
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setattr(gdrive, "DRIVE_URL", f"http://127.0.0.1:{httpd.server_address[1]}/uc")
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+SHARED_URL = f"https://drive.google.com/file/d/{FILE_ID}/view"
+
+
+@pytest.mark.parametrize("style", ["form", "cookie", "link"])
+def test_gdrive_confirm(drive, style):
+    drive.style = style
+    response, name = gdrive.gdrive_download(SHARED_URL, None)
+    assert name == "test.ide"
+    assert response.content == drive.data
+
+    # Intermediate page, then the file
+    assert len(drive.requests) == 2
+    assert drive.requests[1][1]['confirm'] == TOKEN
+
+
+def test_gdrive_bad_id(drive):
+    with pytest.raises(ValueError):
+        gdrive.gdrive_download(SHARED_URL.replace(FILE_ID, "nope"), None)
+    with pytest.raises(ValueError):
+        gdrive.gdrive_download("https://drive.google.com/", None)
+
+
+@pytest.mark.parametrize("ranges", [True, False])
+def test_get_url_parallel(drive, monkeypatch, tmp_path, ranges):
+    """ Test downloading in ranges, and falling back to one request when
+        ranges aren't supported.
+    """
+    drive.ranges = ranges
+    monkeypatch.setattr(files, "RANGE_SIZE", 10000)
+
+    stream, total = files._get_url(SHARED_URL, localfile=tmp_path)
+    assert total == len(drive.data)
+    assert stream.read() == drive.data
+    stream.close()
+    assert (tmp_path / "test.ide").read_bytes() == drive.data
+
+    ranged = [r for r in drive.requests if r[2]]
+    if ranges:
+        assert len(ranged) == -(-len(drive.data) // 10000)
+    else:
+        assert len(ranged) <= 1
+
+
+def test_get_url_parallel_failure(drive, monkeypatch, tmp_path):
+    """ A failed range should stop the download, remove the partial file,
+        and close all the sessions used.
+    """
+    import requests
+
+    drive.fail_ranges = True
+    monkeypatch.setattr(files, "RANGE_SIZE", 10000)
+
+    sessions = []
+
+    class Session(requests.Session):
+        def __init__(self):
+            super().__init__()
+            self.closed = False
+            sessions.append(self)
+
+        def close(self):
+            self.closed = True
+            super().close()
+
+    monkeypatch.setattr(requests, "Session", Session)
+
+    with pytest.raises(ValueError, match="stopped honoring"):
+        files._get_url(SHARED_URL, localfile=tmp_path)
+    assert not (tmp_path / "test.ide").exists()
+    assert len(sessions) > 1
+    assert all(s.closed for s in sessions)
+
+
+def test_get_doc_gdrive_mock(drive, monkeypatch):
+    monkeypatch.setattr(files, "RANGE_SIZE", 2**15)
+    doc = files.get_doc(SHARED_URL)
+    expected = files.get_doc(IDE_FILENAME)
+    assert doc.channels.keys() == expected.channels.keys()
+    assert len(doc.channels[32].getSession()) == len(expected.channels[32].getSession())
@@ -1,9 +1,14 @@
+import io
 import os.path
+import tempfile
 import unittest
 
+import numpy as np
 from idelib.dataset import Dataset
+from idelib import importer
 from idelib.importer import importFile
-from endaq.ide import files
+from endaq.ide import files, info
+from endaq.ide.util import walk_elements
 
 
 IDE_FILENAME = os.path.join(os.path.dirname(__file__), "test.ide")
@@ -56,6 +61,57 @@ class GetDocTests(unittest.TestCase):
         self.assertRaises(ValueError, files.get_doc, __file__)
 
 
+    def test_get_doc_shared(self):
+        """ Test concurrent reads from threads, with a shared `Dataset`. """
+        from concurrent.futures import ThreadPoolExecutor
+        from endaq.ide import info
+        from endaq.ide.blocks import BlockIndex
+        from endaq.ide.util import SharedFile
+
+        doc = files.get_doc(IDE_FILENAME, shared=True)
+        self.assertIsInstance(doc.ebmldoc.stream, SharedFile)
+        self.assertEqual(doc.filename, os.path.abspath(IDE_FILENAME))
+
+        channels = [32, 80, 59, 36] * 4
+        expected = [info.to_pandas(self.dataset.channels[chid]) for chid in channels]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda chid: info.to_pandas(doc.channels[chid]), channels))
+        for chid, a, b in zip(channels, expected, results):
+            self.assertTrue(a.equals(b), f"Concurrent read of channel {chid} did not match")
+
+        index = BlockIndex(files.get_doc(IDE_FILENAME, parsed=False, shared=True))
+        blocks = [index.find(32, t, t + 10**6) for t in range(0, 18 * 10**6, 10**6)]
+        expected = [index.read(index.doc.channels[32], b)[1] for b in blocks]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda b: index.read(index.doc.channels[32], b)[1], blocks))
+        for a, b in zip(expected, results):
+            self.assertTrue(np.array_equal(a, b))
+        index.doc.close()
+        doc.close()
+
+
+    def test_get_doc_workers(self):
+        """ Test decoding a file using multiple processes. """
+        for kwargs in ({}, {'start': "2s", 'end': "10s"}, {'start': 945343, 'end': 1954833},
+                       {'channels': [32, 36]}):
+            doc1 = files.get_doc(IDE_FILENAME, **kwargs)
+            for workers in (1, 2):
+                doc2 = files.get_doc(IDE_FILENAME, workers=workers, **kwargs)
+                self.assertListEqual(list(doc1.channels), list(doc2.channels))
+                self.assertEqual(len(doc2.channels[80].getSession()), 0)
+
+                for chid, ch in doc1.channels.items():
+                    expected = info.to_pandas(ch)
+                    result = info.to_pandas(doc2.channels[chid])
+                    self.assertEqual(len(expected), len(result),
+                                     f"Decoding channel {chid} had different length ({kwargs})")
+                    if len(expected):
+                        self.assertTrue(expected.equals(result),
+                                        f"Decoding channel {chid} had different data ({kwargs})")
+                doc2.close()
+            doc1.close()
+
+
     def test_get_doc_url(self):
         """ Test getting an IDE from a URL. """
         # This is admittedly a simplistic test, but it reveals a great deal.
@@ -89,5 +145,134 @@ class GetDocTests(unittest.TestCase):
                         "Google Drive copy contents did not match that of local copy")
 
 
+class ExtractWindowsTests(unittest.TestCase):
+
+    @staticmethod
+    def elements(stream):
+        """ Get the raw bytes of each element in an IDE stream. """
+        result = []
+        for _eid, offset, payload, size in walk_elements(stream, 0):
+            stream.seek(offset)
+            result.append(stream.read(payload + size - offset))
+        return result
+
+
+    def test_extract_windows_single(self):
+        """ Test that one window produces the same elements as `extract_time()`. """
+        for start, end in ((1_000_000, 2_000_000), (0, "3s"), ("12s", None), (5_000_000, 5_500_000)):
+            expected = io.BytesIO()
+            size = files.extract_time(IDE_FILENAME, expected, start, end)
+            result = io.BytesIO()
+            written = files.extract_windows(IDE_FILENAME, result, [(start, end)])
+            self.assertEqual(written, size)
+            self.assertListEqual(sorted(self.elements(expected)), sorted(self.elements(result)),
+                                 f"extract_windows() differed from extract_time() ({start}, {end})")
+
+
+    def test_extract_windows_multiple(self):
+        """ Test that several windows are merged into one valid file. """
+        windows = [(1_000_000, 2_000_000), (10_000_000, 11_000_000), (10_500_000, 12_000_000)]
+        expected = set()
+        for start, end in windows:
+            out = io.BytesIO()
+            files.extract_time(IDE_FILENAME, out, start, end)
+            expected.update(self.elements(out))
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            filename = os.path.join(tempdir, "highlights.ide")
+            written = files.extract_windows(IDE_FILENAME, filename, windows)
+            self.assertEqual(written, os.path.getsize(filename))
+
+            with open(filename, 'rb') as f:
+                result = self.elements(f)
+            self.assertSetEqual(expected, set(result))
+
+            doc = files.get_doc(filename)
+            try:
+                for chid in (32, 80):
+                    t = doc.channels[chid].getSession().arraySlice()[0]
+                    self.assertTrue((np.diff(t) > 0).all())
+                    for start, end in windows:
+                        self.assertTrue(((t >= start) & (t <= end)).any())
+                    self.assertFalse(((t > 5_000_000) & (t < 8_000_000)).any())
+            finally:
+                doc.close()
+
+
+    def test_extract_windows_options(self):
+        """ Test channel selection, padding, and DataFrame windows. """
+        import pandas as pd
+
+        windows = pd.DataFrame({'start': [2_000_000, 9_000_000], 'end': [3_000_000, 10_000_000]})
+        with tempfile.TemporaryDirectory() as tempdir:
+            filename = os.path.join(tempdir, "ch32.ide")
+            files.extract_windows(IDE_FILENAME, filename, windows, channels=[32])
+            doc = files.get_doc(filename)
+            try:
+                self.assertGreater(len(doc.channels[32].getSession()), 0)
+                self.assertEqual(len(doc.channels[80].getSession()), 0)
+            finally:
+                doc.close()
+
+        plain = files.extract_windows(IDE_FILENAME, io.BytesIO(), windows)
+        padded = files.extract_windows(IDE_FILENAME, io.BytesIO(), windows, pad="2s")
+        self.assertGreater(padded, plain)
+
+
+    def test_extract_closes(self):
+        """ Test that files opened by the extract functions are closed. """
+        from unittest import mock
+
+        for func, args in ((files.extract_time, ()), (files.extract_windows, ([(0, None)],))):
+            opened = []
+
+            def openFile(*a, **kw):
+                opened.append(importer.openFile(*a, **kw))
+                return opened[-1]
+
+            with mock.patch.object(files, 'openFile', openFile):
+                func(IDE_FILENAME, io.BytesIO(), *args)
+            self.assertEqual(len(opened), 1)
+            self.assertTrue(opened[0].ebmldoc.stream.closed, func.__name__)
+
+        # A Dataset passed in is left open
+        doc = files.get_doc(IDE_FILENAME, parsed=False)
+        try:
+            files.extract_time(doc, io.BytesIO())
+            files.extract_windows(doc, io.BytesIO(), [(0, None)])
+            self.assertFalse(doc.ebmldoc.stream.closed)
+        finally:
+            doc.close()
+
+
+    def test_extract_windows_block_end(self):
+        """ Test omitting blocks with children after their payloads. """
+        from ebmlite.encoding import encodeId, encodeSize
+        from endaq.ide.blocks import BlockIndex
+
+        # Append a `Void` element to every `ChannelDataBlock`
+        with open(IDE_FILENAME, 'rb') as f:
+            data = f.read()
+        modified = bytearray()
+        for eid, offset, payload, size in walk_elements(io.BytesIO(data), 0):
+            if eid == BlockIndex.BLOCK_ID:
+                body = data[payload:payload + size] + b'\xec\x82\x00\x00'
+                modified += encodeId(eid) + encodeSize(len(body)) + body
+            else:
+                modified += data[offset:payload + size]
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            filename = os.path.join(tempdir, "void.ide")
+            with open(filename, 'wb') as f:
+                f.write(modified)
+
+            expected = io.BytesIO()
+            size = files.extract_time(filename, expected, 10_000_000, 11_000_000)
+            result = io.BytesIO()
+            written = files.extract_windows(filename, result, [(10_000_000, 11_000_000)])
+            self.assertEqual(written, size)
+            self.assertListEqual(sorted(self.elements(expected)), sorted(self.elements(result)))
+
+
 if __name__ == '__main__':
     unittest.main()
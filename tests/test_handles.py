@@ -0,0 +1,81 @@
+from concurrent.futures import ProcessPoolExecutor
+import os.path
+import pickle
+
+import numpy as np
+import pytest
+
+from endaq.ide import files, handles, info
+
+
+IDE_FILENAME = os.path.join(os.path.dirname(__file__), "test.ide")
+
+
+@pytest.fixture(scope="module")
+def doc():
+    doc = files.get_doc(IDE_FILENAME)
+    yield doc
+    doc.close()
+
+
+def _mean(handle):
+    """ Used by `test_handles_multiprocessing()` (must be importable). """
+    return handle.to_pandas().mean().tolist()
+
+
+def test_channel_handle(doc):
+    ch = doc.channels[32]
+    handle = handles.ChannelHandle.from_channel(ch)
+    assert handle.source == os.path.abspath(IDE_FILENAME)
+    assert (handle.channel_id, handle.subchannel_id) == (32, None)
+
+    copy = pickle.loads(pickle.dumps(handle))
+    assert copy == handle
+    assert hash(copy) == hash(handle)
+    assert copy.load().id == 32
+    assert copy.load().dataset is not doc
+
+    expected = info.to_pandas(ch, time_mode="seconds")
+    result = copy.to_pandas(time_mode="seconds")
+    np.testing.assert_array_equal(result.values, expected.values)
+    np.testing.assert_array_equal(result.index, expected.index)
+    assert list(result.columns) == list(expected.columns)
+
+    raw = copy.to_pandas(raw=True)
+    np.testing.assert_array_equal(raw.values, info.to_pandas(ch, raw=True).values)
+    assert 'calibration' in raw.attrs
+
+
+def test_channel_handle_window(doc):
+    sch = doc.channels[80][2]
+    handle = handles.ChannelHandle.from_channel(sch, start="2s", end="5s")
+    assert handle.subchannel_id == 2
+
+    t, values = pickle.loads(pickle.dumps(handle)).to_numpy()
+    t0, expected = info.to_numpy(sch)
+    keep = (t0 >= 2 * 10**6) & (t0 < 5 * 10**6)
+    np.testing.assert_array_equal(t, t0[keep])
+    np.testing.assert_array_equal(values, expected[keep])
+
+    handle.session = 99
+    with pytest.raises(ValueError):
+        handle.load()
+
+
+def test_get_channel_handles(doc):
+    result = handles.get_channel_handles(doc, "accel")
+    assert [(h.channel_id, h.subchannel_id) for h in result] == [
+        (32, 0), (32, 1), (32, 2), (80, 0), (80, 1), (80, 2)]
+
+    result = handles.get_channel_handles(doc, "accel", subchannels=False)
+    assert [h.subchannel_id for h in result] == [None, None]
+
+
+def test_handles_multiprocessing(doc):
+    channels = handles.get_channel_handles(doc, subchannels=False, end="10s")
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        means = list(executor.map(_mean, channels))
+
+    assert means == [_mean(h) for h in channels]
+    for handle, mean in zip(channels, means):
+        assert not np.isnan(mean).any()
@@ -0,0 +1,37 @@
+import subprocess
+import sys
+
+import pytest
+
+import endaq.ide
+from endaq.ide import files, info, util
+
+
+def test_lazy_import():
+    """ Importing the package shouldn't import its heavy dependencies. """
+    script = ("import sys, endaq.ide; "
+              "print(','.join(m for m in ('pandas', 'requests', 'idelib') if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", script], check=True,
+                         capture_output=True, text=True).stdout.strip()
+    assert out == ""
+
+
+def test_lazy_attributes():
+    assert endaq.ide.get_doc is files.get_doc
+    assert endaq.ide.to_pandas is info.to_pandas
+    assert endaq.ide.util is util
+    assert 'get_channel_table' in dir(endaq.ide)
+    assert info.parse_time is util.parse_time
+    assert endaq.ide.find_events is endaq.ide.events.find_events
+    assert endaq.ide.Catalog is endaq.ide.catalog.Catalog
+
+    # Every submodule is accessible; `follow` is the module, not the function
+    for name in endaq.ide._SUBMODULES:
+        assert getattr(endaq.ide, name).__name__ == f"endaq.ide.{name}"
+
+    with pytest.raises(AttributeError):
+        endaq.ide.bogus
+
+    namespace = {}
+    exec("from endaq.ide import *", namespace)
+    assert set(endaq.ide.__all__) <= set(namespace)
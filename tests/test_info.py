@@ -76,6 +76,13 @@ class ChannelTableFormattingTests(unittest.TestCase):
         self.assertEqual(info.format_timedelta(None), "None")
 
 
+    def test_format_timedeltas(self):
+        values = [0, 1, 999.4, 1500.6, 59999999, 3600e6 + 1, 86400e6 * 3 + 12345678.9,
+                  -1500, 10**12, np.int64(7), None]
+        self.assertListEqual(info._format_timedeltas(values),
+                             [info.format_timedelta(v) for v in values])
+
+
     def test_format_timestamp(self):
         for i in range(0, 10000, 123):
             self.assertTrue(info.format_timestamp(i).startswith(str(i)))
@@ -125,6 +132,38 @@ class ChannelTableTests(unittest.TestCase):
         self.assertListEqual(list(ct3.data['end']), list(ct2.data['end']))
 
 
+    def test_channel_table_as_frame(self):
+        ct = info.get_channel_table(self.dataset, start="2s", end="10s", formatting=False).data
+        df = info.get_channel_table(self.dataset, start="2s", end="10s", as_frame=True)
+
+        self.assertListEqual(list(df.columns), list(ct.columns))
+        self.assertListEqual(list(df['channel']), [info.format_channel_id(ch) for ch in ct['channel']])
+        self.assertEqual(df['samples'].dtype, np.int64)
+        for col in ('start', 'end', 'duration', 'rate'):
+            self.assertEqual(df[col].dtype, np.float64)
+            np.testing.assert_array_equal(df[col], ct[col].astype(np.float64))
+
+
+    def test_get_channel_tables(self):
+        """ Test a combined table of several files, imported or not. """
+        expected = info.get_channel_table(self.dataset, "accel", start="2s", end="10s",
+                                          as_frame=True)
+        df = info.get_channel_tables([IDE_FILENAME, self.dataset], "accel",
+                                     start="2s", end="10s")
+
+        n = len(expected)
+        self.assertEqual(len(df), 2 * n)
+        self.assertListEqual(list(df.columns), ['path'] + list(expected.columns))
+        self.assertListEqual(list(df['path']), [IDE_FILENAME] * n + [self.dataset.filename] * n)
+        for half in (df.iloc[:n], df.iloc[n:]):
+            half = half.drop(columns='path').reset_index(drop=True)
+            self.assertListEqual(list(half['channel']), list(expected['channel']))
+            self.assertListEqual(list(half['samples']), list(expected['samples']))
+            np.testing.assert_allclose(half[['start', 'end', 'rate']], expected[['start', 'end', 'rate']])
+
+        self.assertEqual(len(info.get_channel_tables([])), 0)
+
+
 @pytest.mark.parametrize("time_mode, subchannel", [
     ("seconds", False),
     ("timedelta", False),
@@ -153,5 +192,83 @@ def test_to_pandas(test_IDE, time_mode, subchannel):
     assert np.all(result.to_numpy() == eventarray.arrayValues().T)
 
 
+@pytest.mark.parametrize("subchannel", [False, True])
+def test_to_pandas_raw(test_IDE, subchannel):
+    channel = test_IDE.channels[32]
+    if subchannel:
+        channel = channel.subchannels[1]
+
+    raw = info.to_pandas(channel, time_mode="seconds", raw=True)
+    calibrated = info.to_pandas(channel, time_mode="seconds")
+
+    assert all(dtype == np.int16 for dtype in raw.dtypes)
+    assert np.array_equal(raw.index.values, calibrated.index.values)
+    assert list(raw.attrs['calibration']) == raw.columns.tolist()
+
+    # Applying the coefficients reproduces the calibrated values
+    for name, cal in raw.attrs['calibration'].items():
+        a, b = cal['coefficients']
+        assert cal['reference'] is None
+        assert np.allclose(a * raw[name].to_numpy() + b, calibrated[name].to_numpy())
+
+
+def test_to_numpy(test_IDE):
+    for channel in test_IDE.channels.values():
+        data = channel.getSession().arraySlice()
+        times, values = info.to_numpy(channel)
+        assert np.array_equal(times, data[0])
+        assert np.array_equal(values, data[1:].T)
+
+        raw_times, raw = info.to_numpy(channel, raw=True)
+        assert np.array_equal(raw_times, times)
+        assert raw.shape == values.shape
+        native = channel.getSession()._npType[0]
+        assert (raw.dtype.kind, raw.dtype.itemsize) == (native.kind, native.itemsize)
+
+
+@pytest.mark.parametrize("subchannel", [False, True])
+def test_to_pandas_dtype(test_IDE, subchannel):
+    for channel in test_IDE.channels.values():
+        if subchannel:
+            channel = channel.subchannels[-1]
+        expected = info.to_pandas(channel, time_mode="datetime")
+        result = info.to_pandas(channel, time_mode="datetime", dtype=np.float32)
+
+        assert all(dtype == np.float32 for dtype in result.dtypes)
+        assert np.allclose(result.to_numpy(), expected.to_numpy(), rtol=1e-6, atol=1e-6)
+
+        # The time index keeps full (nanosecond) precision
+        assert result.index.dtype == expected.index.dtype
+        assert np.array_equal(result.index.values, expected.index.values)
+
+    # float64 via the direct calibration is identical to the default
+    channel = test_IDE.channels[32]
+    expected = info.to_pandas(channel, time_mode="seconds")
+    assert info.to_pandas(channel, time_mode="seconds", dtype=np.float64).equals(expected)
+    raw = info.to_pandas(channel, time_mode="seconds", raw=True, dtype=np.float32)
+    assert all(dtype == np.float32 for dtype in raw.dtypes)
+
+
+def test_to_numpy_dtype_nonlinear(test_IDE, monkeypatch):
+    """ Test non-linear calibration (converted a chunk at a time). """
+    channel = test_IDE.channels[32]
+    expected = channel.getSession().arraySlice()
+
+    # Make the calibration appear to have no simple (linear) form
+    calibration = info.get_calibration(channel)
+    for cal in calibration.values():
+        cal['coefficients'] = None
+    monkeypatch.setattr(info, "get_calibration", lambda _channel: calibration)
+    monkeypatch.setattr(info, "CALIBRATION_CHUNK", 1000)
+
+    t, values = info.to_numpy(channel, dtype=np.float32)
+    assert values.dtype == np.float32
+    np.testing.assert_array_equal(t, expected[0])
+    np.testing.assert_array_equal(values, expected[1:].T.astype(np.float32))
+
+    t, values = info.to_numpy(channel.subchannels[1], dtype=np.float32)
+    np.testing.assert_array_equal(values[:, 0], expected[2].astype(np.float32))
+
+
 if __name__ == '__main__':
     unittest.main()
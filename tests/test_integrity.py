@@ -0,0 +1,148 @@
+import io
+import os.path
+import shutil
+
+import pytest
+
+from endaq.ide import files, integrity
+from endaq.ide.blocks import BlockIndex
+from endaq.ide.util import walk_elements
+
+
+IDE_FILENAME = os.path.join(os.path.dirname(__file__), "test.ide")
+
+
+@pytest.fixture(scope="module")
+def ide_data():
+    with open(IDE_FILENAME, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture(scope="module")
+def blocks():
+    """ The offsets of channel 32's blocks, and the end offset of every
+        element in the test file.
+    """
+    doc = files.get_doc(IDE_FILENAME, parsed=False)
+    offsets = [int(o) for o in BlockIndex(doc)[32]['offset']]
+    with open(IDE_FILENAME, 'rb') as f:
+        ends = {offset: payload + size for _eid, offset, payload, size in walk_elements(f, 0)}
+    doc.close()
+    return offsets, ends
+
+
+def test_read_timing():
+    """ Block timing read without indexing matches the index. """
+    doc = files.get_doc(IDE_FILENAME, parsed=False)
+    try:
+        expected = BlockIndex(doc)
+        index = BlockIndex(doc, update=False)
+        for chid in expected.channels:
+            for entry in expected[chid]:
+                ch, size, start, end, wrapped = index.read_timing(int(entry['offset']))
+                assert (ch, size, int(start), int(end)) == (chid, entry['size'], entry['start'],
+                                                            entry['end'])
+                assert not wrapped
+            assert index.time_modulus(chid) > expected[chid]['end'][-1]
+    finally:
+        doc.close()
+
+
+def test_check_file():
+    report = integrity.check_file(IDE_FILENAME)
+    assert report.ok
+    assert report.valid and not report.truncated
+    assert report.path == IDE_FILENAME
+    assert report.size == os.path.getsize(IDE_FILENAME)
+    assert report.issues.empty
+
+    doc = files.get_doc(IDE_FILENAME)
+    channels = report.channels.set_index('channel')
+    for chid, ch in doc.channels.items():
+        assert channels.loc[chid, 'samples'] == len(ch.getSession())
+    assert channels.loc[32, 'rate'] == pytest.approx(394, abs=1)
+    assert (channels['gaps'] == 0).all()
+    doc.close()
+
+
+@pytest.mark.parametrize("missing", [1, 27, 200])
+def test_truncated(ide_data, missing):
+    report = integrity.check_file(io.BytesIO(ide_data[:-missing]))
+    assert report.valid
+    assert report.truncated
+    assert not report.ok
+    assert 'truncated' in report.issues['kind'].tolist()
+
+
+def test_invalid():
+    report = integrity.check_file(io.BytesIO(b"not an IDE file" * 100))
+    assert not report.valid
+    assert report.issues['kind'].tolist() == ['invalid']
+
+
+def test_unexpected_errors(monkeypatch):
+    """ Test that any error reading a file is reported, not raised. """
+    def fail(*args, **kwargs):
+        raise RuntimeError("unexpected")
+
+    monkeypatch.setattr(BlockIndex, "_read_header", fail)
+    report = integrity.check_file(IDE_FILENAME)
+    assert not report.ok
+    assert set(report.issues['kind']) == {'malformed'}
+    assert report.issues['detail'].str.contains("RuntimeError").all()
+
+    monkeypatch.setattr(integrity, "openFile", fail)
+    report = integrity.check_file(IDE_FILENAME)
+    assert not report.valid
+    assert report.issues['kind'].tolist() == ['invalid']
+
+    monkeypatch.setattr(integrity, "check_file", fail)
+    report = integrity.check_files([IDE_FILENAME])[0]
+    assert not report.valid
+    assert "RuntimeError" in report.issues['detail'][0]
+
+
+def test_unknown_element(ide_data, blocks):
+    offsets, _ends = blocks
+    data = bytearray(ide_data)
+    data[offsets[3]] = 0xED
+    report = integrity.check_file(io.BytesIO(bytes(data)))
+    issues = report.issues.set_index('offset')
+    assert issues.loc[offsets[3], 'kind'] == 'unknown'
+
+    # Losing the block leaves a gap in the channel's data
+    assert issues.loc[offsets[4], 'kind'] == 'gap'
+    assert issues.loc[offsets[4], 'channel'] == 32
+
+
+def test_gap_and_rollback(ide_data, blocks):
+    offsets, ends = blocks
+
+    # Remove a block
+    a = offsets[2]
+    report = integrity.check_file(io.BytesIO(ide_data[:a] + ide_data[ends[a]:]))
+    assert report.issues['kind'].tolist() == ['gap']
+    assert report.channels.set_index('channel').loc[32, 'gaps'] == 1
+
+    # Swap two blocks: a gap, a rollback, and another gap
+    b = offsets[3]
+    data = (ide_data[:a] + ide_data[b:ends[b]] + ide_data[ends[a]:b]
+            + ide_data[a:ends[a]] + ide_data[ends[b]:])
+    report = integrity.check_file(io.BytesIO(data))
+    assert report.issues['kind'].tolist() == ['gap', 'rollback', 'gap']
+    rollback = report.issues.iloc[1]
+    assert rollback['offset'] == a + (ends[b] - b) + (b - ends[a])
+    assert rollback['channel'] == 32
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_check_files(tmp_path, ide_data, workers):
+    (tmp_path / "sub").mkdir()
+    shutil.copy(IDE_FILENAME, tmp_path / "a.ide")
+    shutil.copy(IDE_FILENAME, tmp_path / "sub" / "b.ide")
+    (tmp_path / "c.ide").write_bytes(ide_data[:-100])
+
+    reports = integrity.check_files(tmp_path, workers=workers)
+    assert [os.path.basename(r.path) for r in reports] == ["a.ide", "c.ide", "b.ide"]
+    assert [r.ok for r in reports] == [True, False, True]
+    assert reports[1].truncated
@@ -0,0 +1,147 @@
+import os.path
+import shutil
+
+import numpy as np
+import pytest
+
+from endaq.ide import files, info
+
+dask = pytest.importorskip("dask")
+xr = pytest.importorskip("xarray")
+from endaq.ide import lazy  # noqa: E402
+
+
+IDE_FILENAME = os.path.join(os.path.dirname(__file__), "test.ide")
+
+
+@pytest.fixture(scope="module")
+def imported():
+    doc = files.get_doc(IDE_FILENAME)
+    yield doc
+    doc.close()
+
+
+@pytest.fixture(scope="module")
+def unparsed():
+    doc = files.get_doc(IDE_FILENAME, parsed=False)
+    yield doc
+    doc.close()
+
+
+@pytest.mark.parametrize("channel_id", [32, 80, 36, 70, 59, 76])
+def test_to_dask(imported, unparsed, channel_id):
+    data = imported.channels[channel_id].getSession().arraySlice()
+    times, values = lazy.to_dask(unparsed.channels[channel_id], chunk_size=500, times=True)
+
+    assert isinstance(values, dask.array.Array)
+    assert values.shape == (len(data[0]), len(data) - 1)
+    np.testing.assert_array_equal(times, data[0])
+    np.testing.assert_array_equal(values.compute(), data[1:].T)
+
+
+def test_to_dask_chunks(unparsed):
+    """ Chunks should consist of whole blocks. """
+    entries = lazy.BlockIndex(unparsed)[32]
+    values = lazy.to_dask(unparsed.channels[32], chunk_size=1500)
+    boundaries = set(np.cumsum(entries['samples']).tolist())
+    assert len(values.chunks[0]) > 1
+    assert all(b in boundaries for b in np.cumsum(values.chunks[0]).tolist())
+    assert all(c >= 1500 for c in values.chunks[0][:-1])
+
+
+def test_to_dask_interval(imported, unparsed):
+    data = imported.channels[80].getSession().arraySlice()
+    keep = (data[0] >= 2_000_000) & (data[0] < 9_000_000)
+    times, values = lazy.to_dask(unparsed.channels[80][1], "0:02", "0:09",
+                                 chunk_size=300, times=True)
+    np.testing.assert_array_equal(times, data[0][keep])
+    np.testing.assert_array_equal(values.compute()[:, 0], data[2][keep])
+
+
+def test_to_dask_processes(imported, unparsed):
+    values = lazy.to_dask(unparsed.channels[32], chunk_size=2000)
+    result = values.mean(axis=0).compute(scheduler="processes", num_workers=2)
+    expected = imported.channels[32].getSession().arraySlice()[1:].mean(axis=1)
+    np.testing.assert_allclose(result, expected)
+
+
+def test_close_files(tmp_path, monkeypatch, imported):
+    copy = tmp_path / "copy.ide"
+    shutil.copy(IDE_FILENAME, copy)
+    expected = imported.channels[32].getSession().arraySlice()[1:].mean(axis=1)
+
+    lazy.close_files()
+    monkeypatch.setattr(lazy, "MAX_OPEN_FILES", 1)
+    docs = [files.get_doc(name, parsed=False) for name in (IDE_FILENAME, str(copy))]
+    try:
+        opened = []
+        for doc in docs:
+            values = lazy.to_dask(doc.channels[32], chunk_size=2000)
+            result = values.mean(axis=0).compute(scheduler="threads")
+            np.testing.assert_allclose(result, expected)
+            assert len(lazy._OPEN_FILES) == 1
+            opened.append(next(iter(lazy._OPEN_FILES.values())).doc)
+
+        # The first file was closed when the second was opened
+        assert opened[0].ebmldoc.stream.closed
+        assert not opened[1].ebmldoc.stream.closed
+
+        lazy.close_files()
+        assert not lazy._OPEN_FILES
+        assert opened[1].ebmldoc.stream.closed
+
+        # Files are reopened if used again
+        result = lazy.to_dask(docs[1].channels[32]).mean(axis=0).compute(scheduler="threads")
+        np.testing.assert_allclose(result, expected)
+    finally:
+        lazy.close_files()
+        for doc in docs:
+            doc.close()
+
+
+def test_close_files_in_use(monkeypatch):
+    lazy.close_files()
+    monkeypatch.setattr(lazy, "MAX_OPEN_FILES", 1)
+    source = (IDE_FILENAME, os.stat(IDE_FILENAME).st_mtime_ns)
+    try:
+        with lazy._open_file(source) as (doc, _index):
+            # Evicting or closing a file being read defers closing it
+            with lazy._open_file((IDE_FILENAME, -1)):
+                pass
+            lazy.close_files()
+            assert not doc.ebmldoc.stream.closed
+        assert doc.ebmldoc.stream.closed
+    finally:
+        lazy.close_files()
+
+
+def test_to_xarray_channel(imported, unparsed):
+    expected = info.to_pandas(imported.channels[32])
+    result = lazy.to_xarray(unparsed.channels[32], chunk_size=2000)
+
+    assert isinstance(result, xr.DataArray)
+    assert result.dims == ("time", "subchannel")
+    assert list(result["subchannel"].values) == list(expected.columns)
+    assert result.attrs["units"] == ["g", "g", "g"]
+    np.testing.assert_array_equal(result["time"].values, expected.index.values)
+    np.testing.assert_array_equal(result.values, expected.values)
+
+    resampled = result.resample(time="1s").mean().compute()
+    expected_resampled = expected.resample("1s").mean()
+    np.testing.assert_allclose(resampled.values, expected_resampled.values)
+
+
+def test_to_xarray_dataset(imported, unparsed):
+    result = lazy.to_xarray(unparsed, measurement_type="acc", time_mode="seconds")
+    assert isinstance(result, xr.Dataset)
+    assert sorted(result.data_vars) == ["ch32", "ch80"]
+
+    for chid in (32, 80):
+        expected = info.to_pandas(imported.channels[chid], time_mode="seconds")
+        var = result[f"ch{chid}"]
+        assert var.dims == (f"time_{chid}", f"subchannel_{chid}")
+        np.testing.assert_allclose(var[f"time_{chid}"].values, expected.index.values)
+        np.testing.assert_allclose(var.mean(f"time_{chid}").values, expected.mean().values)
+
+    with pytest.raises(ValueError):
+        lazy.to_xarray(unparsed.channels[32], time_mode="bogus")
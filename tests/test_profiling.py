@@ -0,0 +1,92 @@
+import json
+import os.path
+import pstats
+import subprocess
+import sys
+
+import pytest
+
+from endaq.ide import files, info, profiling, util
+
+
+IDE_FILENAME = os.path.join(os.path.dirname(__file__), "test.ide")
+
+
+def test_disabled():
+    assert profiling.get_profile() is None
+    with profiling.section("nothing") as sect:
+        sect.nbytes = 100
+    assert profiling.get_profile() is None
+
+
+def test_profile():
+    with profiling.profile() as prof:
+        assert profiling.get_profile() is prof
+        doc = files.get_doc(IDE_FILENAME)
+        info.to_pandas(doc.channels[32])
+        info.get_channel_table(doc)
+    assert profiling.get_profile() is None
+
+    stats = prof.to_dict()
+    for name in ("endaq.ide.files.get_doc", "endaq.ide.util.validate",
+                 "idelib.importer.openFile", "idelib.importer.readData",
+                 "endaq.ide.info.to_pandas", "idelib.dataset.EventArray.arraySlice",
+                 "endaq.ide.info.timestamps", "pandas.DataFrame",
+                 "endaq.ide.info.get_channel_table", "endaq.ide.measurement.get_channels"):
+        assert name in stats, name
+        assert stats[name]['calls'] >= 1
+
+    get_doc = stats["endaq.ide.files.get_doc"]
+    assert get_doc['wall'] >= stats["idelib.importer.readData"]['wall']
+    assert get_doc['own_wall'] < get_doc['wall']
+    assert stats["idelib.importer.readData"]['bytes'] == os.path.getsize(IDE_FILENAME)
+    assert stats["idelib.dataset.EventArray.arraySlice"]['bytes'] > 0
+
+    # Statistics are no longer recorded
+    util.parse_time("1:00")
+    assert prof.to_dict()["endaq.ide.util.parse_time"] == stats["endaq.ide.util.parse_time"]
+
+
+def test_exports(tmp_path):
+    with profiling.profile() as prof:
+        util.parse_time("1:00")
+        util.parse_times(["1:00", "2:00"])
+
+    assert json.loads(prof.to_json()) == prof.to_dict()
+    assert "endaq.ide.util.parse_times" in prof.report()
+    assert prof.to_dict()["endaq.ide.util.parse_times"]['bytes'] == 16
+
+    filename = str(tmp_path / "test.prof")
+    prof.dump_stats(filename)
+    stats = pstats.Stats(filename)
+    assert any(func[2] == "parse_time" for func in stats.stats)
+
+    prof.reset()
+    assert prof.to_dict() == {}
+
+
+def test_nested_profiles():
+    outer = profiling.Profile()
+    with profiling.profile(outer):
+        with profiling.profile() as inner:
+            util.parse_time("1:00")
+        assert profiling.get_profile() is outer
+        util.parse_time("2:00")
+
+    assert inner.to_dict()["endaq.ide.util.parse_time"]['calls'] == 1
+    assert outer.to_dict()["endaq.ide.util.parse_time"]['calls'] == 1
+
+
+@pytest.mark.parametrize("suffix", [".json", ".prof"])
+def test_environment_variable(tmp_path, suffix):
+    filename = str(tmp_path / ("profile" + suffix))
+    env = dict(os.environ, **{profiling.ENV_VAR: filename})
+    script = f"from endaq.ide import get_doc; get_doc({IDE_FILENAME!r})"
+    subprocess.run([sys.executable, "-c", script], env=env, check=True,
+                   cwd=os.path.dirname(os.path.dirname(__file__)))
+
+    if suffix == ".json":
+        with open(filename) as f:
+            assert "endaq.ide.files.get_doc" in json.load(f)
+    else:
+        assert any(func[2] == "get_doc" for func in pstats.Stats(filename).stats)
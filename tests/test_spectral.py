@@ -0,0 +1,117 @@
+import os.path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from endaq.ide import files, spectral
+from endaq.ide.blocks import BlockIndex
+
+
+IDE_FILENAME = os.path.join(os.path.dirname(__file__), "test.ide")
+
+
+@pytest.fixture(scope="module")
+def doc():
+    return files.get_doc(IDE_FILENAME)
+
+
+@pytest.fixture(scope="module")
+def index(doc):
+    return BlockIndex(doc)
+
+
+def reference(doc, index, channel_id, start, end, nperseg, step, window):
+    """ Welch segments computed from all the data at once. """
+    data = doc.channels[channel_id].getSession().arraySlice()
+    t, values = data[0], data[1:]
+    values = values[:, (t >= start) & (t < end)]
+
+    entries = index[channel_id][index.find(channel_id, start, end)]
+    multi = entries['samples'] > 1
+    fs = (entries['samples'][multi] - 1).sum() / (entries['end'] - entries['start'])[multi].sum() * 1e6
+
+    segments = np.lib.stride_tricks.sliding_window_view(values, nperseg, axis=1)[:, ::step]
+    segments = segments - segments.mean(axis=-1, keepdims=True)
+    power = np.abs(np.fft.rfft(segments * window, axis=-1)) ** 2 / (fs * (window ** 2).sum())
+    power[..., 1:-1] *= 2
+    return np.fft.rfftfreq(nperseg, 1 / fs), power
+
+
+@pytest.mark.parametrize("channel_id", [32, 80])
+def test_welch(doc, index, channel_id):
+    start, end = 1_000_000, 15_000_000
+    result = spectral.welch(doc.channels[channel_id], start, end, nperseg=256, index=index)
+    freqs, power = reference(doc, index, channel_id, start, end, 256, 128,
+                             np.hanning(257)[:-1])
+
+    assert list(result.columns) == [sch.name for sch in doc.channels[channel_id].subchannels]
+    np.testing.assert_allclose(result.index, freqs)
+    np.testing.assert_allclose(result.values, power.mean(axis=1).T)
+
+
+def test_welch_subchannel(doc, index):
+    channel = doc.channels[32]
+    whole = spectral.welch(channel, nperseg=128, index=index)
+    sub = spectral.welch(channel[2], nperseg=128, index=index)
+    assert list(sub.columns) == [channel[2].name]
+    np.testing.assert_allclose(sub.iloc[:, 0], whole.iloc[:, 2])
+
+
+def test_welch_workers(doc, index, monkeypatch):
+    # Small batches, so there are several in flight at once
+    monkeypatch.setattr(spectral, "BATCH_BLOCKS", 3)
+    monkeypatch.setattr(spectral, "BATCH_SEGMENTS", 4)
+    expected = spectral.welch(doc.channels[80], nperseg=64, index=index)
+    result = spectral.welch(doc.channels[80], nperseg=64, index=index, workers=3)
+    np.testing.assert_allclose(result.values, expected.values)
+
+
+def test_welch_time_strings(doc, index):
+    expected = spectral.welch(doc.channels[32], 2_000_000, 10_000_000, index=index)
+    result = spectral.welch(doc.channels[32], "0:02", "0:10", index=index)
+    assert result.equals(expected)
+
+
+def test_welch_errors(doc, index):
+    with pytest.raises(ValueError):
+        spectral.welch(doc.channels[32], nperseg=10**6, index=index)
+    with pytest.raises(ValueError):
+        spectral.welch(doc.channels[32], 10**12, None, index=index)
+    with pytest.raises(ValueError):
+        spectral.welch(doc.channels[32], overlap=1, index=index)
+    with pytest.raises(ValueError):
+        spectral.welch(doc.channels[32], window="nonexistent", index=index)
+    with pytest.raises(ValueError):
+        spectral.welch(doc.channels[32], scaling="bogus", index=index)
+
+
+def test_spectrogram(doc, index):
+    start, end = 1_000_000, 15_000_000
+    window = np.hanning(129)[:-1]
+    result = spectral.spectrogram(doc.channels[32], start, end, nperseg=128,
+                                  overlap=0.75, time_mode="seconds", index=index)
+    freqs, power = reference(doc, index, 32, start, end, 128, 32, window)
+
+    assert isinstance(result.columns, pd.MultiIndex)
+    assert len(result) == power.shape[1]
+    assert (np.diff(result.index) > 0).all()
+    assert start / 1e6 < result.index[0] < result.index[-1] < end / 1e6
+    name = doc.channels[32][1].name
+    np.testing.assert_allclose(result[name].columns, freqs)
+    np.testing.assert_allclose(result[name].values, power[1])
+
+
+def test_spectrogram_time_modes(doc, index):
+    sub = doc.channels[80][0]
+    seconds = spectral.spectrogram(sub, nperseg=256, time_mode="seconds", index=index)
+    dates = spectral.spectrogram(sub, nperseg=256, time_mode="datetime", index=index)
+    deltas = spectral.spectrogram(sub, nperseg=256, time_mode="timedelta", index=index)
+
+    assert isinstance(dates.index, pd.DatetimeIndex)
+    assert isinstance(deltas.index, pd.TimedeltaIndex)
+    assert dates.index[0] == pd.Timestamp(doc.lastUtcTime, unit='s') + deltas.index[0]
+    np.testing.assert_allclose(deltas.index.total_seconds(), seconds.index)
+
+    with pytest.raises(ValueError):
+        spectral.spectrogram(sub, time_mode="bogus", index=index)
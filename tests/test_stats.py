@@ -0,0 +1,124 @@
+import os.path
+import shutil
+
+import numpy as np
+import pytest
+
+from endaq.ide import files, info, stats
+
+
+IDE_FILENAME = os.path.join(os.path.dirname(__file__), "test.ide")
+
+
+@pytest.fixture
+def ide_copy(tmp_path):
+    filename = tmp_path / "test.ide"
+    shutil.copy(IDE_FILENAME, filename)
+    return str(filename)
+
+
+def brute_force(doc, channel_id, start, end):
+    """ Compute interval statistics by reading all the data. """
+    channel = doc.channels[channel_id]
+    data = channel.getSession().arraySlice()
+    t, values = data[0], data[1:]
+    keep = np.ones(len(t), dtype=bool)
+    if start is not None:
+        keep &= t >= start
+    if end is not None:
+        keep &= t < end
+    values = values[:, keep]
+    return (values.min(axis=1), values.mean(axis=1), values.max(axis=1),
+            np.sqrt((values ** 2).mean(axis=1)), values.shape[1])
+
+
+@pytest.mark.parametrize("channel_id", [32, 80, 36])
+@pytest.mark.parametrize("start, end", [(None, None),
+                                        (500_000, 2_000_000),
+                                        (1_234_567, 4_500_000)])
+def test_range(ide_copy, channel_id, start, end):
+    doc = files.get_doc(ide_copy)
+    result = stats.BlockStats(doc, cache=False).range(doc.channels[channel_id], start, end)
+    dmin, dmean, dmax, rms, count = brute_force(doc, channel_id, start, end)
+
+    np.testing.assert_allclose(result['min'], dmin)
+    np.testing.assert_allclose(result['mean'], dmean)
+    np.testing.assert_allclose(result['max'], dmax)
+    np.testing.assert_allclose(result['rms'], rms)
+    assert (result['count'] == count).all()
+
+
+def test_range_subchannel(ide_copy):
+    doc = files.get_doc(ide_copy)
+    bs = stats.BlockStats(doc, cache=False)
+    channel = doc.channels[32]
+    whole = bs.range(channel, "0:01", "0:02")
+    sub = bs.range(channel.subchannels[1], "0:01", "0:02")
+    assert len(sub) == 1
+    assert sub.index[0] == channel.subchannels[1].name
+    assert sub.iloc[0].equals(whole.iloc[1])
+
+
+def test_range_empty(ide_copy):
+    doc = files.get_doc(ide_copy)
+    result = stats.BlockStats(doc, cache=False).range(doc.channels[80], 10**12, None)
+    assert (result['count'] == 0).all()
+    assert result['mean'].isna().all()
+
+
+def test_sidecar(ide_copy):
+    sidecar = ide_copy + stats.SIDECAR_SUFFIX
+    doc = files.get_doc(ide_copy)
+    expected = stats.BlockStats(doc, cache=True).range(doc.channels[32])
+    assert os.path.isfile(sidecar)
+
+    # Cached statistics are used instead of recomputing them
+    bs = stats.BlockStats(files.get_doc(ide_copy), cache=True)
+    assert 32 in bs._stats
+    bs.compute = None
+    assert bs.range(bs.doc.channels[32]).equals(expected)
+
+    # A changed IDE file invalidates the sidecar
+    with open(ide_copy, 'ab') as f:
+        f.write(b'\x00')
+    bs = stats.BlockStats(files.get_doc(ide_copy), cache=True)
+    assert not bs._stats
+
+
+def test_cache_false(ide_copy):
+    doc = files.get_doc(ide_copy)
+    stats.BlockStats(doc, cache=False).range(doc.channels[32])
+    assert not os.path.exists(ide_copy + stats.SIDECAR_SUFFIX)
+
+    # Nothing is written next to the IDE file unless requested
+    stats.get_stats(doc).range(doc.channels[80])
+    assert not os.path.exists(ide_copy + stats.SIDECAR_SUFFIX)
+
+
+def test_cache_directory(ide_copy, tmp_path):
+    cachedir = tmp_path / "cache"
+    cachedir.mkdir()
+    doc = files.get_doc(ide_copy)
+    stats.BlockStats(doc, cache=str(cachedir)).range(doc.channels[32])
+    assert os.path.isfile(cachedir / ("test.ide" + stats.SIDECAR_SUFFIX))
+
+
+def test_get_stats(ide_copy):
+    doc = files.get_doc(ide_copy)
+    assert stats.get_stats(doc) is stats.get_stats(doc)
+
+
+def test_channel_table_stats(ide_copy):
+    doc = files.get_doc(ide_copy)
+    table = info.get_channel_table(doc, stats=True, formatting=False).data
+    for col in ('min', 'mean', 'max'):
+        assert col in table.columns
+
+    for _, row in table.iterrows():
+        sch = row['channel']
+        dmin, dmean, dmax, _rms, _count = brute_force(doc, sch.parent.id, 0, None)
+        assert row['min'] == pytest.approx(dmin[sch.id])
+        assert row['mean'] == pytest.approx(dmean[sch.id])
+        assert row['max'] == pytest.approx(dmax[sch.id])
+
+    assert 'min' not in info.get_channel_table(doc, formatting=False).data.columns
@@ -0,0 +1,147 @@
+from datetime import datetime, time, timedelta, timezone
+import os.path
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from endaq.ide import util
+
+
+T_START = datetime(2021, 7, 7, 0, 0)
+T1 = datetime(2021, 7, 8, 11, 28, 40, 800752)
+
+VALUES = ["11", "22:11", "3:22:11", "1d 3:22:11", "1s", " 5m ", "10D 1H",
+          "0:0:0:1:2", 42, 1.25, True,
+          timedelta(days=1, seconds=2345, microseconds=6789),
+          pd.Timedelta(seconds=3), T1, pd.Timestamp(T1)]
+
+
+def round_half_up(t):
+    return int(np.floor(t + 0.5))
+
+
+@pytest.mark.parametrize("datetime_start", [None, T_START])
+def test_parse_times_matches_parse_time(datetime_start):
+    expected = [round_half_up(util.parse_time(v, datetime_start)) for v in VALUES]
+    result = util.parse_times(VALUES, datetime_start)
+    assert result.dtype == np.int64
+    assert result.tolist() == expected
+
+    # Each type in bulk
+    for v in VALUES:
+        result = util.parse_times([v] * 3, datetime_start)
+        assert result.tolist() == [round_half_up(util.parse_time(v, datetime_start))] * 3
+
+
+def test_parse_times_rounding():
+    # Halves round up, so comparing integer times with the result selects
+    # the same samples as comparing them with `parse_time()`'s float
+    values = [0.5, 1.5, 2.5, -0.5, -1.5, 2.4999]
+    result = util.parse_times(values)
+    assert result.tolist() == [1, 2, 3, 0, -1, 2]
+    t = np.arange(-3, 5)
+    for v, r in zip(values[:-1], result):
+        assert ((t >= v) == (t >= r)).all()
+        assert ((t < v) == (t < r)).all()
+
+    # Out of the range of int64 (rather than becoming `MISSING_TIME`)
+    for bad in ([1e19], [-1e19], [np.inf], [1, float(-2**63)], ["200000000000 0:00:00"]):
+        with pytest.raises(ValueError, match="out of range"):
+            util.parse_times(bad)
+
+
+def test_parse_times_arrays():
+    td = pd.to_timedelta([1.5, 2, None], unit='s')
+    assert util.parse_times(td).tolist() == [1500000, 2000000, util.MISSING_TIME]
+    assert util.parse_times(pd.Series(td)).tolist() == [1500000, 2000000, util.MISSING_TIME]
+    assert util.parse_times(td.to_numpy()).tolist() == [1500000, 2000000, util.MISSING_TIME]
+
+    assert util.parse_times(np.array(["1:00", "2:00", ""])).tolist() == [60 * 10**6, 120 * 10**6,
+                                                                         util.MISSING_TIME]
+    assert util.parse_times(np.arange(3)).tolist() == [0, 1, 2]
+    assert util.parse_times(np.array([1.4, np.nan])).tolist() == [1, util.MISSING_TIME]
+    assert util.parse_times([None, "", np.nan, pd.NaT]).tolist() == [util.MISSING_TIME] * 4
+    assert util.parse_times("1:00").tolist() == [60 * 10**6]
+
+    dt = pd.Series(pd.date_range(T1, periods=3, freq="s"))
+    expected = [util.parse_time(T1 + timedelta(seconds=n), T_START) for n in range(3)]
+    assert util.parse_times(dt, T_START).tolist() == expected
+    assert util.parse_times(dt.to_numpy(), T_START).tolist() == expected
+
+
+def test_parse_times_timezones():
+    eastern = pd.Series(pd.date_range("2021-07-08 10:00", periods=2, freq="s", tz="US/Eastern"))
+    expected = [util.parse_time(datetime(2021, 7, 8, 14, 0, n), T_START) for n in range(2)]
+    assert util.parse_times(eastern, T_START).tolist() == expected
+    aware = [T1.replace(tzinfo=timezone.utc)]
+    assert util.parse_times(aware, T_START).tolist() == [util.parse_time(T1, T_START)]
+
+
+def test_parse_times_time_of_day():
+    start = datetime(2021, 7, 7, 0, 30)
+    assert util.parse_times([time(1, 0)], start).tolist() == [util.parse_time(time(1, 0), start)]
+    with pytest.raises(ValueError):
+        util.parse_times([time(1, 0)])
+
+
+def test_parse_times_bad():
+    with pytest.raises(ValueError):
+        util.parse_times(["1:00", "bogus"])
+    with pytest.raises(ValueError):
+        util.parse_times(["1.5"])
+    with pytest.raises(TypeError):
+        util.parse_times([1, [1]])
+    with pytest.raises(ValueError):
+        util.parse_times([[1, 2], [3, 4]])
+
+
+def test_expand_paths(tmp_path):
+    (tmp_path / "sub").mkdir()
+    for name in ("a.ide", "b.ide", os.path.join("sub", "c.ide")):
+        (tmp_path / name).touch()
+
+    assert len(util.expand_paths([str(tmp_path / "*.ide")])) == 2
+    assert len(util.expand_paths([str(tmp_path / "**" / "*.ide")])) == 3
+    assert len(util.expand_paths([str(tmp_path)])) == 3
+    assert util.expand_paths([str(tmp_path / "a.ide")] * 2) == [str(tmp_path / "a.ide")]
+
+
+def test_shared_file(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(bytes(range(256)))
+
+    f = util.SharedFile(path)
+    assert f.readable() and f.seekable()
+    assert f.seek(0, os.SEEK_END) == 256
+    assert f.seek(-6, os.SEEK_CUR) == 250
+    assert f.read() == bytes(range(250, 256))
+    assert f.read(10) == b""
+    f.seek(10)
+    assert f.read(3) == bytes([10, 11, 12])
+    assert f.tell() == 13
+    assert f.pread(2, 100) == bytes([100, 101])
+    assert f.tell() == 13
+
+    # Each thread's position is independent: a thread seeking between
+    # another's seek and read doesn't change what the other reads.
+    seeked = threading.Barrier(2)
+    results = {}
+
+    def reader(offset):
+        f.seek(offset)
+        seeked.wait()
+        seeked.wait()
+        results[offset] = f.read(4)
+
+    threads = [threading.Thread(target=reader, args=(offset,)) for offset in (20, 200)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == {20: bytes(range(20, 24)), 200: bytes(range(200, 204))}
+    assert f.tell() == 13
+
+    f.close()
+    assert f.closed